@@ -0,0 +1,80 @@
+import numpy as np
+
+# Per-instance layout: orbit (radius, phase, speed, height) + appearance (size, r, g, b)
+INSTANCE_FLOATS = 8
+MAX_SHADER_ANGLE = 2048.0   # radians the shader adds to a phase, float32 resolves about 2e-4 there
+REBASE_FRAMES = 15          # fewest updates between two epochs, unless the angle gets far too big
+
+class AsteroidBelt:
+    """
+    Belt of small bodies drawn with a single instanced draw call.
+    Orbits are propagated in the vertex shader relative to a recent epoch,
+    so the float32 time it sees stays small at any warp. The phase offsets
+    at the epoch are computed in double precision and are the only data
+    uploaded again when the epoch moves.
+    """
+
+    def __init__(self,
+                 name: str,
+                 count: int,
+                 inner_radius: float,
+                 outer_radius: float,
+                 orbit_speed: float,                 # radians per second at the inner edge
+                 thickness: float = 1.0,             # standard deviation of the height
+                 size: float = 0.05,
+                 tint: np.ndarray = np.array([0.6, 0.55, 0.5]),
+                 seed: int = None
+                 ):
+        self.name = name
+        self.count = count
+        self.inner_radius = inner_radius
+        self.outer_radius = outer_radius
+        self.vao = None
+        self.offset_vbo = None
+        self.program = None
+        self.time = 0.0
+        self.epoch = 0.0
+        self.dirty = False      # offsets changed since the last upload
+        self.frames_since_rebase = REBASE_FRAMES
+
+        rng = np.random.default_rng(seed)
+
+        # Uniform density over the annulus
+        radius = np.sqrt(rng.uniform(inner_radius ** 2, outer_radius ** 2, count))
+
+        self.instances = np.empty((count, INSTANCE_FLOATS), dtype=np.float32)
+        self.instances[:, 0] = radius
+        self.instances[:, 1] = rng.uniform(0.0, 2 * np.pi, count)
+        # Kepler's third law: angular speed falls with radius^1.5
+        self.instances[:, 2] = orbit_speed * (radius / inner_radius) ** -1.5
+        self.instances[:, 3] = rng.normal(0.0, thickness, count)
+        self.instances[:, 4] = size * rng.uniform(0.5, 1.5, count)
+        self.instances[:, 5:8] = np.clip(tint * rng.uniform(0.6, 1.2, (count, 1)), 0.0, 1.0)
+
+        # Angle covered up to the epoch, per instance
+        self.speeds = orbit_speed * (radius / inner_radius) ** -1.5
+        self.offsets = np.zeros(count, dtype=np.float32)
+
+    def update(self, time: float):
+        self.time = time
+        self.frames_since_rebase += 1
+
+        angle = self.speeds.max(initial=0.0) * abs(time - self.epoch)
+        if angle > MAX_SHADER_ANGLE and (self.frames_since_rebase >= REBASE_FRAMES or angle > 64 * MAX_SHADER_ANGLE):
+            self.rebase(time)
+
+    def rebase(self, time: float):
+        """Make the given time the new epoch."""
+        self.offsets[:] = np.remainder(self.speeds * time, 2 * np.pi)
+        self.epoch = time
+        self.dirty = True
+        self.frames_since_rebase = 0
+
+    def update_uniforms(self, point_scale):
+        """
+        Update the shader uniforms for this belt.
+        Assumes the belt program is bound.
+        """
+        # Small time since the epoch rather than the camera block time
+        self.program.set_float("beltTime", self.time - self.epoch)
+        self.program.set_float("pointScale", point_scale)
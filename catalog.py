@@ -0,0 +1,191 @@
+import os
+import numpy as np
+from registry import MINOR, NAME_LENGTH, encode_names
+
+GAUSSIAN_GRAVITY = 0.01720209895    # Earth's mean motion, radians per day
+UNITS_PER_AU = 35.0                 # Earth's orbit radius in the scene
+MEAN_MOTION_SCALE = 0.8 / GAUSSIAN_GRAVITY  # scene radians per second for one radian per day
+
+# Parsed catalog rows, also the layout of the .npy sidecar
+ELEMENTS = np.dtype([('name', f'S{NAME_LENGTH}'), ('id', '<i8'),
+                     ('semi_major_axis', '<f8'),        # AU
+                     ('eccentricity', '<f8'),
+                     ('inclination', '<f8'),            # radians
+                     ('ascending_node', '<f8'),         # radians
+                     ('argument_periapsis', '<f8'),     # radians
+                     ('mean_anomaly', '<f8'),           # radians at the epoch
+                     ('mean_motion', '<f8'),            # radians per day
+                     ('magnitude', '<f4'),              # absolute magnitude H
+                     ('epoch', '<f8')])                 # Julian date
+
+# MPCORB.DAT fixed-width columns, 0-based [start, stop)
+MPC_COLUMNS = {
+    'designation': (0, 7), 'magnitude': (8, 13), 'epoch': (20, 25), 'mean_anomaly': (26, 35),
+    'argument_periapsis': (37, 46), 'ascending_node': (48, 57), 'inclination': (59, 68),
+    'eccentricity': (70, 79), 'mean_motion': (80, 91), 'semi_major_axis': (92, 103), 'name': (166, 194),
+}
+MPC_WIDTH = 194
+UNNUMBERED_ID = 10 ** 9     # IDs of provisional designations start here
+
+def _column(table, start, stop):
+    """Fixed-width field of every row as a bytes array."""
+    return np.ascontiguousarray(table[:, start:stop]).view(f'S{stop - start}').ravel()
+
+def _floats(field):
+    field = np.char.strip(field)
+    return np.where(field == b'', b'nan', field).astype(float)
+
+def _packed_digits(chars):
+    """Decode MPC packed digits: 0-9, then A-Z for 10-35 and a-z for 36-61."""
+    chars = chars.astype(np.int64)
+    return np.select([chars <= ord('9'), chars <= ord('Z')],
+                     [chars - ord('0'), chars - ord('A') + 10], chars - ord('a') + 36)
+
+def _packed_epochs(table, start):
+    """Julian dates of packed epochs like K24AH (2024-10-17)."""
+    chars = table[:, start:start + 5].astype(np.int64)
+    year = _packed_digits(chars[:, 0]) * 100 + (chars[:, 1] - ord('0')) * 10 + (chars[:, 2] - ord('0'))
+    month = _packed_digits(chars[:, 3])
+    day = _packed_digits(chars[:, 4])
+
+    # Gregorian calendar to Julian date at 0h TT
+    a = (14 - month) // 12
+    y = year + 4800 - a
+    m = month + 12 * a - 3
+    return day + (153 * m + 2) // 5 + 365 * y + y // 4 - y // 100 + y // 400 - 32045 - 0.5
+
+def parse_mpcorb(path):
+    """Parse an MPCORB style fixed-width file into ELEMENTS rows."""
+    with open(path, 'rb') as file:
+        lines = file.read().split(b'\n')
+
+    # Data starts after the dashed line that closes the header, if any
+    for i, line in enumerate(lines[:100]):
+        if line.startswith(b'-----'):
+            lines = lines[i + 1:]
+            break
+
+    lines = [line.rstrip(b'\r') for line in lines if len(line) >= 103]
+    table = np.array(lines, dtype=f'S{MPC_WIDTH}').view(np.uint8).reshape(-1, MPC_WIDTH)
+
+    rows = np.zeros(len(table), dtype=ELEMENTS)
+    for field in ('semi_major_axis', 'eccentricity', 'magnitude'):
+        rows[field] = _floats(_column(table, *MPC_COLUMNS[field]))
+    for field in ('inclination', 'ascending_node', 'argument_periapsis', 'mean_anomaly', 'mean_motion'):
+        rows[field] = np.radians(_floats(_column(table, *MPC_COLUMNS[field])))
+    rows['epoch'] = _packed_epochs(table, MPC_COLUMNS['epoch'][0])
+
+    # Numbered bodies have a 5 character packed number, e.g. 00001 or A0001
+    designation = table[:, 0:7].astype(np.int64)
+    digits = designation[:, 1:5] - ord('0')
+    numbered = np.all(designation[:, 5:7] == ord(' '), axis=1) & np.all((digits >= 0) & (digits <= 9), axis=1)
+    number = _packed_digits(designation[:, 0]) * 10000 + digits @ np.array([1000, 100, 10, 1])
+    rows['id'] = np.where(numbered, number, UNNUMBERED_ID + np.arange(len(table)))
+
+    names = np.char.strip(_column(table, *MPC_COLUMNS['name']))
+    rows['name'] = encode_names(np.where(names == b'', np.char.strip(_column(table, 0, 7)), names))
+    return rows
+
+def parse_csv(path):
+    """
+    Parse a CSV catalog with a header row. Required columns: name, a, e, i,
+    node, peri, M (angles in degrees, a in AU). Optional: n (degrees per day),
+    H, id and epoch (Julian date).
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        header = [column.strip() for column in file.readline().split(',')]
+    index = {column: i for i, column in enumerate(header)}
+
+    missing = [column for column in ('name', 'a', 'e', 'i', 'node', 'peri', 'M') if column not in index]
+    if missing:
+        raise ValueError(f"{path} lacks the columns {', '.join(missing)}")
+
+    numeric = [column for column in ('a', 'e', 'i', 'node', 'peri', 'M', 'n', 'H', 'id', 'epoch') if column in index]
+    values = np.loadtxt(path, delimiter=',', skiprows=1, usecols=[index[c] for c in numeric], ndmin=2)
+    columns = dict(zip(numeric, values.T))
+    names = np.loadtxt(path, delimiter=',', skiprows=1, usecols=index['name'], dtype=str, ndmin=1)
+
+    rows = np.zeros(len(values), dtype=ELEMENTS)
+    rows['name'] = encode_names(np.char.strip(names))
+    rows['semi_major_axis'] = columns['a']
+    rows['eccentricity'] = columns['e']
+    rows['inclination'] = np.radians(columns['i'])
+    rows['ascending_node'] = np.radians(columns['node'])
+    rows['argument_periapsis'] = np.radians(columns['peri'])
+    rows['mean_anomaly'] = np.radians(columns['M'])
+    if 'n' in columns:
+        rows['mean_motion'] = np.radians(columns['n'])
+    else:
+        # Kepler's third law around the Sun
+        rows['mean_motion'] = GAUSSIAN_GRAVITY * np.abs(rows['semi_major_axis']) ** -1.5
+    rows['magnitude'] = columns.get('H', np.nan)
+    rows['id'] = columns['id'] if 'id' in columns else UNNUMBERED_ID + np.arange(len(rows))
+    rows['epoch'] = columns.get('epoch', np.nan)
+    return rows
+
+def load(path):
+    """
+    Parse a catalog, CSV by extension and MPCORB otherwise. The parsed rows
+    are cached in a .npy sidecar that is reused while newer than the source.
+    """
+    sidecar = path + ".npy"
+    if os.path.exists(sidecar) and os.path.getmtime(sidecar) >= os.path.getmtime(path):
+        rows = np.load(sidecar)
+        if rows.dtype == ELEMENTS:
+            return rows
+
+    rows = parse_csv(path) if path.lower().endswith(".csv") else parse_mpcorb(path)
+    try:
+        np.save(sidecar, rows)
+    except OSError:
+        pass    # read-only catalog folder, parse again next time
+    return rows
+
+def populate(elements, ephemeris, registry, parent: int = -1, epoch: float = None,
+             units_per_au: float = UNITS_PER_AU, mean_motion_scale: float = MEAN_MOTION_SCALE, radius: float = 0.05):
+    """
+    Append catalog bodies to an ephemeris and the matching registry and
+    return their rows. With an epoch (Julian date) mean anomalies are
+    propagated from the catalog epochs to that date. Open orbits (e >= 1)
+    and rows with missing or unparsable elements are skipped.
+    """
+    if len(ephemeris) != len(registry):
+        raise ValueError("Ephemeris and registry rows do not line up")
+
+    valid = elements['eccentricity'] < 1.0
+    for field in ('semi_major_axis', 'eccentricity', 'inclination', 'ascending_node',
+                  'argument_periapsis', 'mean_anomaly', 'mean_motion'):
+        valid &= np.isfinite(elements[field])
+    elements = elements[valid]
+
+    mean_anomaly = elements['mean_anomaly']
+    if epoch is not None:
+        elapsed = np.nan_to_num(epoch - elements['epoch'])
+        mean_anomaly = mean_anomaly + elements['mean_motion'] * elapsed
+
+    names = np.char.decode(elements['name'], 'utf-8').tolist()
+    rows = ephemeris.add_bodies(names, elements['semi_major_axis'] * units_per_au,
+                                elements['mean_motion'] * mean_motion_scale,
+                                np.remainder(mean_anomaly, 2 * np.pi), 0.0, parent, radius,
+                                elements['eccentricity'], elements['inclination'],
+                                elements['ascending_node'], elements['argument_periapsis'])
+    registry.add_bodies(elements['name'], MINOR, parent, radius, ids=elements['id'])
+    return rows
+
+class CatalogBodies:
+    """Catalog rows of an ephemeris drawn as points."""
+
+    def __init__(self, name, ephemeris, rows, point_size: float = 1.5):
+        self.name = name
+        self.ephemeris = ephemeris
+        self.rows = slice(int(rows[0]), int(rows[-1]) + 1) if len(rows) else slice(0, 0)
+        self.point_size = point_size
+        self.vao = None
+        self.vbo = None
+
+    def __len__(self):
+        return self.rows.stop - self.rows.start
+
+    @property
+    def positions(self):
+        return self.ephemeris.positions[self.rows]
@@ -0,0 +1,181 @@
+import argparse
+import os
+import numpy as np
+from ephemeris import Ephemeris, hierarchy_levels, resolve_parents
+
+MAGIC = b"SSCHEB01"
+DEGREE = 12
+SEGMENTS_PER_ORBIT = 8
+FIT_CHUNK = 1 << 16     # segments fitted at once
+
+# File layout: header, one record per body, then float64 coefficients
+# of shape (total segments, 3, degree + 1), similar to a JPL SPK file.
+HEADER = np.dtype([('magic', 'S8'), ('fingerprint', 'S8'), ('bodies', '<i4'), ('degree', '<i4'),
+                   ('start', '<f8'), ('end', '<f8')])
+BODY = np.dtype([('parent', '<i4'), ('segments', '<i4'), ('offset', '<i8'), ('segment_length', '<f8')])
+
+def clenshaw(coefficients, x):
+    """
+    Evaluate Chebyshev series with the Clenshaw recurrence.
+    coefficients has shape (..., degree + 1), x broadcasts against (...).
+    """
+    b1 = np.zeros(coefficients.shape[:-1])
+    b2 = np.zeros(coefficients.shape[:-1])
+    for j in range(coefficients.shape[-1] - 1, 0, -1):
+        b1, b2 = 2.0 * x * b1 - b2 + coefficients[..., j], b1
+    return x * b1 - b2 + coefficients[..., 0]
+
+def derivative(coefficients):
+    """Chebyshev coefficients of the derivative of a series, same shape."""
+    n = coefficients.shape[-1]
+    result = np.zeros(coefficients.shape)
+    for k in range(n - 1, 0, -1):
+        result[..., k - 1] = 2 * k * coefficients[..., k]
+        if k + 1 < n:
+            result[..., k - 1] += result[..., k + 1]
+    result[..., 0] *= 0.5
+    return result
+
+def build_cache(ephemeris: Ephemeris, path, start, end, degree=DEGREE, segments_per_orbit=SEGMENTS_PER_ORBIT):
+    """
+    Fit every body's parent relative position with Chebyshev segments over
+    [start, end] and write them to path. Segment length follows each
+    body's orbital period, so slow outer planets need few segments.
+    """
+    if not end > start:
+        raise ValueError("The cache must end after it starts")
+    span = end - start
+    count = len(ephemeris)
+    n = degree + 1
+
+    speed = np.abs(ephemeris.mean_motion)
+    period = np.where(speed > 0, 2 * np.pi / np.maximum(speed, 1e-300), np.inf)
+    segments = np.ceil(span / np.minimum(period / segments_per_orbit, span)).astype(np.int64)
+
+    bodies = np.zeros(count, dtype=BODY)
+    bodies['parent'] = ephemeris.parent
+    bodies['segments'] = segments
+    bodies['offset'] = np.cumsum(segments) - segments
+    bodies['segment_length'] = span / segments
+
+    header = np.zeros(1, dtype=HEADER)
+    header['magic'] = MAGIC
+    header['fingerprint'] = ephemeris.fingerprint()
+    header['bodies'] = count
+    header['degree'] = degree
+    header['start'] = start
+    header['end'] = end
+
+    with open(path, 'wb') as file:
+        file.write(header.tobytes())
+        file.write(bodies.tobytes())
+
+    total = int(segments.sum())
+    coefficients = np.memmap(path, dtype='<f8', mode='r+', offset=HEADER.itemsize + BODY.itemsize * count,
+                             shape=(total, 3, n))
+
+    # Chebyshev nodes of the first kind and the matching transform
+    theta = np.pi * (np.arange(n) + 0.5) / n
+    nodes = np.cos(theta)
+    transform = np.cos(np.outer(np.arange(n), theta)) * (2.0 / n)
+    transform[0] *= 0.5
+
+    # Every (body, segment) pair is fitted in one vectorized pass per chunk
+    owner = np.repeat(np.arange(count), segments)
+    for first in range(0, total, FIT_CHUNK):
+        rows = np.arange(first, min(first + FIT_CHUNK, total))
+        body = owner[rows]
+        length = bodies['segment_length'][body]
+        segment_start = start + (rows - bodies['offset'][body]) * length
+        times = segment_start[:, None] + (nodes[None, :] + 1.0) * 0.5 * length[:, None]
+
+        samples = ephemeris.local_positions_for(np.repeat(body, n), times.ravel()).reshape(len(rows), n, 3)
+        coefficients[rows] = np.einsum('jk,skc->scj', transform, samples)
+
+    coefficients.flush()
+    del coefficients
+
+def load_cache(path, ephemeris: Ephemeris = None):
+    """
+    Memory map a cache file. With an ephemeris, None is returned when the
+    file is missing or was built from different orbital elements.
+    """
+    if not os.path.exists(path):
+        return None
+
+    cache = ChebyshevEphemeris(path)
+    if ephemeris is not None and cache.fingerprint != ephemeris.fingerprint():
+        return None
+    return cache
+
+class ChebyshevEphemeris:
+    """Precomputed ephemeris memory mapped from a cache file."""
+
+    def __init__(self, path):
+        header = np.fromfile(path, dtype=HEADER, count=1)[0]
+        if header['magic'] != MAGIC:
+            raise ValueError(f"{path} is not an ephemeris cache file")
+
+        count = int(header['bodies'])
+        self.fingerprint = bytes(header['fingerprint'])
+        self.degree = int(header['degree'])
+        self.start = float(header['start'])
+        self.end = float(header['end'])
+
+        bodies = np.fromfile(path, dtype=BODY, count=count, offset=HEADER.itemsize)
+        self.parent = bodies['parent'].astype(np.int32)
+        self.segments = bodies['segments'].astype(np.int64)
+        self.offset = bodies['offset']
+        self.segment_length = bodies['segment_length']
+        self.levels = hierarchy_levels(self.parent)
+
+        self.coefficients = np.memmap(path, dtype='<f8', mode='r', offset=HEADER.itemsize + BODY.itemsize * count,
+                                      shape=(int(self.segments.sum()), 3, self.degree + 1))
+
+    def __len__(self):
+        return len(self.parent)
+
+    def covers(self, time):
+        return self.start <= time <= self.end
+
+    def _segments_at(self, time):
+        elapsed = time - self.start
+        segment = np.clip(np.floor(elapsed / self.segment_length), 0, self.segments - 1).astype(np.int64)
+
+        # Local coordinate inside the segment, from -1 to 1
+        x = 2.0 * (elapsed - segment * self.segment_length) / self.segment_length - 1.0
+        return self.coefficients[self.offset + segment], x[:, None]
+
+    def local_positions(self, time):
+        """Parent relative position of every body, shape (N,3)."""
+        coefficients, x = self._segments_at(time)
+        return clenshaw(coefficients, x)
+
+    def local_states(self, time):
+        """Parent relative positions and velocities of every body, shape (N,3) each."""
+        coefficients, x = self._segments_at(time)
+        # d/dt = d/dx * dx/dt
+        velocities = clenshaw(derivative(coefficients), x) * (2.0 / self.segment_length)[:, None]
+        return clenshaw(coefficients, x), velocities
+
+    def positions(self, time):
+        """World position of every body, shape (N,3)."""
+        return resolve_parents(self.local_positions(time), self.parent, self.levels)
+
+def main():
+    import scene
+
+    parser = argparse.ArgumentParser(description="Precompute a Chebyshev ephemeris cache for the scene bodies.")
+    parser.add_argument("path", nargs="?", default="ephemeris.bin")
+    parser.add_argument("--start", type=float, default=0.0, help="simulation seconds since the epoch")
+    parser.add_argument("--end", type=float, default=3600.0, help="simulation seconds since the epoch")
+    parser.add_argument("--degree", type=int, default=DEGREE)
+    parser.add_argument("--segments-per-orbit", type=int, default=SEGMENTS_PER_ORBIT)
+    args = parser.parse_args()
+
+    ephemeris = Ephemeris.from_planets(scene.create_planets())
+    build_cache(ephemeris, args.path, args.start, args.end, args.degree, args.segments_per_orbit)
+    print("Wrote {} ({:.1f} MB)".format(args.path, os.path.getsize(args.path) / 1e6))
+
+if __name__ == "__main__":
+    main()
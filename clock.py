@@ -0,0 +1,100 @@
+import math
+import time
+
+TICK = 1.0 / 60.0       # real seconds per simulation tick
+MIN_WARP = 1.0
+MAX_WARP = 1e6
+MAX_STEP = 60.0         # longest simulated sub-step, in seconds
+MAX_SUBSTEPS = 256      # sub-steps per tick before steps start growing
+MAX_TICKS_PER_FRAME = 5 # ticks consumed per frame before real time is dropped
+
+class SimulationClock:
+    """
+    Fixed timestep clock measuring simulation time in seconds since an epoch.
+    Real time is accumulated and consumed in fixed ticks, every tick
+    advances the simulation by tick * warp, split into sub-steps no longer
+    than max_step so listeners never jump over events.
+    """
+
+    def __init__(self,
+                 epoch: float = None,       # Unix time of simulation time 0
+                 tick: float = TICK,
+                 warp: float = 1.0,
+                 max_step: float = MAX_STEP
+                 ):
+        self.epoch = time.time() if epoch is None else epoch
+        self.tick = tick
+        self.warp = warp
+        self.max_step = max_step
+        self.time = 0.0
+        self.paused = False
+        self.accumulator = 0.0
+        self.last_real_time = None
+
+        # Called with the simulation time after every sub-step
+        self.listeners = []
+
+    @property
+    def absolute_time(self):
+        """Simulation time as a Unix timestamp."""
+        return self.epoch + self.time
+
+    @property
+    def alpha(self):
+        """Fraction of a tick left in the accumulator, for interpolation."""
+        return self.accumulator / self.tick
+
+    def set_warp(self, warp):
+        self.warp = min(max(warp, MIN_WARP), MAX_WARP)
+
+    def toggle_pause(self):
+        self.paused = not self.paused
+
+    def set_time(self, sim_time):
+        """Jump to a time relative to the epoch."""
+        self.time = sim_time
+        self.accumulator = 0.0
+        self._notify()
+
+    def advance(self, real_elapsed: float = None):
+        """
+        Consume elapsed real time and return the number of ticks run.
+        Without an argument the elapsed time is measured since the last call.
+        """
+        now = time.perf_counter()
+        if real_elapsed is None:
+            real_elapsed = 0.0 if self.last_real_time is None else now - self.last_real_time
+        self.last_real_time = now
+
+        if self.paused:
+            return 0
+
+        self.accumulator += real_elapsed
+        ticks = int(self.accumulator // self.tick)
+
+        if ticks > MAX_TICKS_PER_FRAME:
+            # Too far behind (window dragged, breakpoint...), drop the backlog
+            ticks = MAX_TICKS_PER_FRAME
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= ticks * self.tick
+
+        for _ in range(ticks):
+            self.step()
+
+        return ticks
+
+    def step(self):
+        """Run exactly one tick, also while paused (single stepping)."""
+        duration = self.tick * self.warp
+        substeps = min(max(1, math.ceil(duration / self.max_step)), MAX_SUBSTEPS)
+        start = self.time
+
+        for i in range(1, substeps + 1):
+            # Computed from the start to avoid accumulating rounding errors
+            self.time = start + duration * i / substeps
+            self._notify()
+
+    def _notify(self):
+        for listener in self.listeners:
+            listener(self.time)
@@ -0,0 +1,31 @@
+import numpy as np
+from lod import projected_radii
+
+MIN_PIXELS = 0.5    # spheres with a smaller radius on screen are not drawn
+
+def frustum_planes(view_projection):
+    """
+    Inward facing planes (a, b, c, d) of the frustum of a row-major
+    projection @ view matrix: left, right, bottom, top, near, far.
+    Planes are normalized so a x + b y + c z + d is a distance.
+    """
+    m = np.asarray(view_projection, dtype=float)
+    planes = np.array([m[3] + m[0], m[3] - m[0],
+                       m[3] + m[1], m[3] - m[1],
+                       m[3] + m[2], m[3] - m[2]])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+def spheres_in_frustum(planes, centers, radii):
+    """True for every sphere not entirely behind one of the planes."""
+    distances = np.asarray(centers, dtype=float) @ planes[:, :3].T + planes[:, 3]
+    return np.all(distances >= -np.asarray(radii, dtype=float)[:, None], axis=1)
+
+def visible_spheres(centers, radii, view_matrix, projection_matrix, viewport_height, min_pixels: float = MIN_PIXELS):
+    """Spheres that intersect the view frustum and cover at least min_pixels of radius."""
+    # Column vectors, so points go through the view matrix first
+    planes = frustum_planes(projection_matrix @ view_matrix)
+    eye = np.linalg.inv(view_matrix)[:3, 3]
+
+    visible = spheres_in_frustum(planes, centers, radii)
+    pixels = projected_radii(centers, radii, eye, projection_matrix, viewport_height)
+    return visible & (pixels >= min_pixels)
@@ -0,0 +1,371 @@
+import hashlib
+import numpy as np
+import geometry
+
+KEPLER_ITERATIONS = 6
+ELEMENTS = ('semi_major_axis', 'eccentricity', 'inclination', 'ascending_node', 'argument_periapsis',
+            'mean_anomaly', 'mean_motion', 'parent')
+
+def solve_kepler(mean_anomaly, eccentricity, iterations=KEPLER_ITERATIONS):
+    """
+    Solve Kepler's equation M = E - e*sin(E) for the eccentric anomaly.
+    Runs a fixed number of Newton steps over whole arrays at once,
+    six steps give 1e-10 accuracy up to e = 0.97.
+    """
+    M = np.remainder(mean_anomaly + np.pi, 2 * np.pi) - np.pi
+    e = eccentricity
+
+    # Danby's starting guess converges for every elliptical orbit
+    E = np.copysign(0.85, M)
+    E *= e
+    E += M
+
+    f = np.empty_like(E)
+    df = np.empty_like(E)
+    for _ in range(iterations):
+        # f = E - e*sin(E) - M, df = 1 - e*cos(E), computed in place
+        np.sin(E, out=f)
+        f *= e
+        np.subtract(E, f, out=f)
+        f -= M
+        np.cos(E, out=df)
+        df *= e
+        np.subtract(1.0, df, out=df)
+        f /= df
+        E -= f
+
+    return E
+
+def perifocal_basis(inclination, ascending_node, argument_periapsis):
+    """
+    Return the world space directions of periapsis (P) and of the
+    perpendicular in-plane axis (Q) for every orbit, shape (N,3) each.
+    The reference plane is XZ with Y up, matching the rest of the scene.
+    """
+    cos_o, sin_o = np.cos(ascending_node), np.sin(ascending_node)
+    cos_w, sin_w = np.cos(argument_periapsis), np.sin(argument_periapsis)
+    cos_i, sin_i = np.cos(inclination), np.sin(inclination)
+
+    # Ecliptic (x,y,z) maps to world (x,-z,y)
+    P = np.stack([cos_o * cos_w - sin_o * sin_w * cos_i,
+                  -(sin_w * sin_i),
+                  sin_o * cos_w + cos_o * sin_w * cos_i], axis=-1)
+    Q = np.stack([-cos_o * sin_w - sin_o * cos_w * cos_i,
+                  -(cos_w * sin_i),
+                  -sin_o * sin_w + cos_o * cos_w * cos_i], axis=-1)
+    return P, Q
+
+def orbit_positions(semi_major_axis, eccentricity, P, Q, mean_anomaly, out=None):
+    """
+    Position relative to the parent for every orbit, shape (N,3).
+    mean_anomaly may carry leading time axes, e.g. (T,N) gives (T,N,3).
+    """
+    E = solve_kepler(mean_anomaly, eccentricity)
+
+    x = semi_major_axis * (np.cos(E) - eccentricity)
+    y = semi_major_axis * np.sqrt(1.0 - eccentricity ** 2) * np.sin(E)
+
+    if out is None:
+        out = np.empty(np.shape(x) + (3,))
+    np.multiply(x[..., None], P, out=out)
+    out += y[..., None] * Q
+    return out
+
+def orbit_states(semi_major_axis, eccentricity, P, Q, mean_anomaly, mean_motion, out=None, velocities=None):
+    """
+    Positions and velocities relative to the parent for every orbit,
+    sharing one Kepler solve. Shapes as in orbit_positions.
+    """
+    E = solve_kepler(mean_anomaly, eccentricity)
+    cos_E, sin_E = np.cos(E), np.sin(E)
+    b = semi_major_axis * np.sqrt(1.0 - eccentricity ** 2)
+
+    x = semi_major_axis * (cos_E - eccentricity)
+    y = b * sin_E
+
+    # dE/dt from differentiating Kepler's equation
+    E_dot = mean_motion / (1.0 - eccentricity * cos_E)
+    vx = -semi_major_axis * sin_E * E_dot
+    vy = b * cos_E * E_dot
+
+    if out is None:
+        out = np.empty(np.shape(x) + (3,))
+    if velocities is None:
+        velocities = np.empty(np.shape(x) + (3,))
+    np.multiply(x[..., None], P, out=out)
+    out += y[..., None] * Q
+    np.multiply(vx[..., None], P, out=velocities)
+    velocities += vy[..., None] * Q
+    return out, velocities
+
+def orbit_accelerations(semi_major_axis, mean_motion, local_positions, out=None):
+    """
+    Gravitational acceleration towards the parent, -mu r / |r|^3 with
+    mu = n^2 a^3 from Kepler's third law. Zero for bodies at the origin.
+    """
+    mu = mean_motion ** 2 * semi_major_axis ** 3
+    distance = np.linalg.norm(local_positions, axis=-1)
+    scale = np.divide(-mu, distance ** 3, out=np.zeros_like(distance), where=distance > 0)
+
+    if out is None:
+        out = np.empty_like(local_positions)
+    np.multiply(local_positions, scale[..., None], out=out)
+    return out
+
+def hierarchy_levels(parent):
+    """Group body indices by depth in the parent hierarchy (roots first)."""
+    count = len(parent)
+    if np.any(parent >= count):
+        raise ValueError("Parent index out of range")
+
+    has_parent = parent >= 0
+    depth = np.zeros(count, dtype=np.int32)
+
+    # Each pass settles one more level of the hierarchy
+    for _ in range(count + 1):
+        new_depth = np.where(has_parent, depth[parent] + 1, 0)
+        if np.array_equal(new_depth, depth):
+            break
+        depth = new_depth
+    else:
+        raise ValueError("Cycle detected in parent hierarchy")
+
+    return [np.flatnonzero(depth == d) for d in range(int(depth.max(initial=0)) + 1)]
+
+def resolve_parents(local_positions, parent, levels, out=None):
+    """Turn parent relative positions (...,N,3) into world positions."""
+    if out is None:
+        out = np.empty_like(local_positions)
+    out[...] = local_positions
+
+    # Parents are always resolved before their children
+    for level in levels[1:]:
+        out[..., level, :] += out[..., parent[level], :]
+    return out
+
+class Ephemeris:
+    """
+    Structure-of-arrays table holding the orbital elements of every body.
+    All positions and spin angles are computed in one batched pass.
+    """
+
+    def __init__(self):
+        self.names = []
+
+        # Orbital elements
+        self.semi_major_axis = np.zeros(0)
+        self.eccentricity = np.zeros(0)
+        self.inclination = np.zeros(0)          # radians
+        self.ascending_node = np.zeros(0)       # radians
+        self.argument_periapsis = np.zeros(0)   # radians
+        self.mean_anomaly = np.zeros(0)         # radians at time 0
+        self.mean_motion = np.zeros(0)          # radians per second
+
+        self.spin_speed = np.zeros(0)       # radians per second
+        self.radius = np.zeros(0)
+        self.parent = np.zeros(0, dtype=np.int32)   # -1 for bodies without parent
+
+        # Orbit orientation derived from the elements
+        self.P = np.zeros((0, 3))
+        self.Q = np.zeros((0, 3))
+
+        # Current state, filled by update()
+        self.local_positions = np.zeros((0, 3))
+        self.positions = np.zeros((0, 3))
+        self.local_velocities = np.zeros((0, 3))
+        self.velocities = np.zeros((0, 3))
+        self.spin_angles = np.zeros(0)
+        self.time = 0.0
+
+        # Column-major model matrices ready for upload, see geometry.get_model_matrices
+        self.model_matrices = np.zeros((0, 4, 4), dtype=np.float32)
+
+        # Optional precomputed ephemeris, see chebyshev.py
+        self.cache = None
+        # Optional recorded world positions (trajectory.Playback), preferred over the cache
+        self.playback = None
+
+        # Bumped whenever bodies are added or elements change, cheap to poll every frame
+        self.version = 0
+
+        self._levels = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def add_bodies(self, names, semi_major_axis, mean_motion=0.0, mean_anomaly=0.0, spin_speed=0.0, parent=-1, radius=1.0,
+                   eccentricity=0.0, inclination=0.0, ascending_node=0.0, argument_periapsis=0.0):
+        """Append a batch of bodies and return their indices."""
+        count = len(names)
+        start = len(self.names)
+
+        def column(values, dtype=float):
+            return np.broadcast_to(np.asarray(values, dtype=dtype), (count,))
+
+        eccentricity = column(eccentricity)
+        if np.any((eccentricity < 0) | (eccentricity >= 1)):
+            raise ValueError("Only elliptical orbits (0 <= e < 1) are supported")
+
+        self.names.extend(names)
+        self.semi_major_axis = np.concatenate([self.semi_major_axis, column(semi_major_axis)])
+        self.eccentricity = np.concatenate([self.eccentricity, eccentricity])
+        self.inclination = np.concatenate([self.inclination, column(inclination)])
+        self.ascending_node = np.concatenate([self.ascending_node, column(ascending_node)])
+        self.argument_periapsis = np.concatenate([self.argument_periapsis, column(argument_periapsis)])
+        self.mean_anomaly = np.concatenate([self.mean_anomaly, column(mean_anomaly)])
+        self.mean_motion = np.concatenate([self.mean_motion, column(mean_motion)])
+        self.spin_speed = np.concatenate([self.spin_speed, column(spin_speed)])
+        self.radius = np.concatenate([self.radius, column(radius)])
+        self.parent = np.concatenate([self.parent, column(parent, np.int32)])
+
+        P, Q = perifocal_basis(self.inclination[start:], self.ascending_node[start:], self.argument_periapsis[start:])
+        self.P = np.concatenate([self.P, P])
+        self.Q = np.concatenate([self.Q, Q])
+
+        self.local_positions = np.concatenate([self.local_positions, np.zeros((count, 3))])
+        self.positions = np.concatenate([self.positions, np.zeros((count, 3))])
+        self.local_velocities = np.concatenate([self.local_velocities, np.zeros((count, 3))])
+        self.velocities = np.concatenate([self.velocities, np.zeros((count, 3))])
+        self.spin_angles = np.concatenate([self.spin_angles, np.zeros(count)])
+        self.model_matrices = np.concatenate([self.model_matrices, np.zeros((count, 4, 4), dtype=np.float32)])
+
+        self._levels = None
+        self.version += 1
+        return np.arange(start, start + count)
+
+    def add_body(self, name, semi_major_axis=0.0, mean_motion=0.0, mean_anomaly=0.0, spin_speed=0.0, parent=-1, radius=1.0,
+                 eccentricity=0.0, inclination=0.0, ascending_node=0.0, argument_periapsis=0.0):
+        """Append a single body and return its index."""
+        return int(self.add_bodies([name], semi_major_axis, mean_motion, mean_anomaly, spin_speed, parent, radius,
+                                   eccentricity, inclination, ascending_node, argument_periapsis)[0])
+
+    @classmethod
+    def from_planets(cls, planets):
+        """
+        Build a table from Planet objects and attach every planet to it.
+        The list order does not matter, parents are resolved by identity.
+        """
+        ephemeris = cls()
+        index_of = {id(p): i for i, p in enumerate(planets)}
+
+        parents = []
+        for p in planets:
+            if p.parent is None:
+                parents.append(-1)
+            elif id(p.parent) in index_of:
+                parents.append(index_of[id(p.parent)])
+            else:
+                raise ValueError(f"Parent of {p.name} is not part of the ephemeris")
+
+        ephemeris.add_bodies([p.name for p in planets],
+                             [p.orbit_radius for p in planets],
+                             [p.orbit_speed for p in planets],
+                             [p.orbit_angle for p in planets],
+                             [p.spin_speed for p in planets],
+                             parents,
+                             [p.radius for p in planets],
+                             [p.eccentricity for p in planets],
+                             [p.inclination for p in planets],
+                             [p.ascending_node for p in planets],
+                             [p.argument_periapsis for p in planets])
+
+        for i, p in enumerate(planets):
+            p.attach(ephemeris, i)
+
+        return ephemeris
+
+    def set_elements(self, bodies, **elements):
+        """Change orbital elements of existing bodies, e.g. set_elements([3], eccentricity=0.2)."""
+        for name in elements:
+            if name not in ELEMENTS:
+                raise ValueError(f"Unknown orbital element {name}")
+        if 'eccentricity' in elements:
+            eccentricity = np.asarray(elements['eccentricity'], dtype=float)
+            if np.any((eccentricity < 0) | (eccentricity >= 1)):
+                raise ValueError("Only elliptical orbits (0 <= e < 1) are supported")
+
+        for name, values in elements.items():
+            getattr(self, name)[bodies] = values
+
+        self.P[bodies], self.Q[bodies] = perifocal_basis(self.inclination[bodies], self.ascending_node[bodies],
+                                                         self.argument_periapsis[bodies])
+        if 'parent' in elements:
+            self._levels = None
+        self.version += 1
+
+    def levels(self):
+        """Group body indices by depth in the parent hierarchy (roots first)."""
+        if self._levels is None:
+            self._levels = hierarchy_levels(self.parent)
+        return self._levels
+
+    def fingerprint(self):
+        """Short hash of every element, used to validate cached ephemerides."""
+        digest = hashlib.sha1()
+        for column in (self.semi_major_axis, self.eccentricity, self.inclination, self.ascending_node,
+                       self.argument_periapsis, self.mean_anomaly, self.mean_motion, self.parent):
+            digest.update(np.ascontiguousarray(column).tobytes())
+        return digest.digest()[:8]
+
+    def local_positions_at(self, times, out=None):
+        """Parent relative positions at several times at once, shape (T,N,3)."""
+        times = np.asarray(times, dtype=float)
+        mean_anomaly = self.mean_anomaly + self.mean_motion * times[:, None]
+        return orbit_positions(self.semi_major_axis, self.eccentricity, self.P, self.Q, mean_anomaly, out=out)
+
+    def local_positions_for(self, bodies, times):
+        """Parent relative positions for matching (body, time) pairs, shape (K,3)."""
+        mean_anomaly = self.mean_anomaly[bodies] + self.mean_motion[bodies] * times
+        return orbit_positions(self.semi_major_axis[bodies], self.eccentricity[bodies],
+                               self.P[bodies], self.Q[bodies], mean_anomaly)
+
+    def positions_at(self, times, out=None):
+        """World positions at several times at once, shape (T,N,3)."""
+        local_positions = self.local_positions_at(times, out=out)
+        return resolve_parents(local_positions, self.parent, self.levels(), out=local_positions)
+
+    def states_at(self, times):
+        """World positions and velocities at several times at once, shape (T,N,3) each."""
+        times = np.asarray(times, dtype=float)
+        mean_anomaly = self.mean_anomaly + self.mean_motion * times[:, None]
+        positions, velocities = orbit_states(self.semi_major_axis, self.eccentricity, self.P, self.Q,
+                                             mean_anomaly, self.mean_motion)
+        levels = self.levels()
+        return (resolve_parents(positions, self.parent, levels, out=positions),
+                resolve_parents(velocities, self.parent, levels, out=velocities))
+
+    def accelerations(self):
+        """World acceleration of every body at the current time, shape (N,3)."""
+        local_accelerations = orbit_accelerations(self.semi_major_axis, self.mean_motion, self.local_positions)
+        return resolve_parents(local_accelerations, self.parent, self.levels(), out=local_accelerations)
+
+    def _to_local(self, world, out):
+        """Inverse of resolve_parents for a single time."""
+        has_parent = self.parent >= 0
+        out[:] = world
+        out[has_parent] -= world[self.parent[has_parent]]
+
+    def update(self, time: float):
+        """Update every position, velocity and spin angle for the given time."""
+        if self.playback is not None and self.playback.covers(time):
+            positions = self.positions
+            positions[:] = self.playback.positions(time)
+            self.velocities[:] = self.playback.velocities(time)
+            self._to_local(positions, self.local_positions)
+            self._to_local(self.velocities, self.local_velocities)
+        else:
+            if self.cache is not None and self.cache.covers(time):
+                self.local_positions[:], self.local_velocities[:] = self.cache.local_states(time)
+            else:
+                mean_anomaly = self.mean_anomaly + self.mean_motion * time
+                orbit_states(self.semi_major_axis, self.eccentricity, self.P, self.Q, mean_anomaly, self.mean_motion,
+                             out=self.local_positions, velocities=self.local_velocities)
+
+            levels = self.levels()
+            positions = resolve_parents(self.local_positions, self.parent, levels, out=self.positions)
+            resolve_parents(self.local_velocities, self.parent, levels, out=self.velocities)
+
+        np.multiply(self.spin_speed, time, out=self.spin_angles)
+        self.time = time
+
+        geometry.get_model_matrices(positions, self.spin_angles, self.radius, out=self.model_matrices)
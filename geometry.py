@@ -5,36 +5,116 @@ RADIUS = 1.0
 STACKS = 20     # vertical divisions
 SECTORS = 30    # horizontal divisions
 
-def get_sphere_vertices():
-
-    vertices = []
-
-    for i in range(STACKS + 1):
-        phi = np.pi * i / STACKS - np.pi / 2   # -90 to +90 degrees
-        y = RADIUS * np.sin(phi)
-        r = RADIUS * np.cos(phi)
-
-        for j in range(SECTORS + 1):
-            theta = 2 * np.pi * j / SECTORS  # 0 to 360 degrees
-
-            x = r * np.cos(theta)
-            z = r * np.sin(theta)
-            vertices.extend([x, y, z])
-
-    return np.array(vertices, dtype=np.float32)
-
-def get_sphere_indices():
-    indices = []
-
-    for i in range(STACKS):
-        for j in range(SECTORS + 1):
-            first  = i * (SECTORS + 1) + j
-            second = first + SECTORS + 1
-
-            indices.extend([first, second])
-
-    return np.array(indices, dtype=np.uint32)
-
+# Resolutions (stacks, sectors) kept ready for level of detail, coarse to fine
+SPHERE_LODS = [(8, 12), (STACKS, SECTORS), (48, 96), (128, 256), (512, 1024)]
+
+# Meshes built so far, keyed by kind and resolution
+_mesh_cache = {}
+
+def get_sphere_vertices(stacks=STACKS, sectors=SECTORS):
+    """UV-sphere positions as a flat float32 array, one ring of sectors + 1 vertices per stack."""
+    phi = np.pi * np.arange(stacks + 1) / stacks - np.pi / 2      # -90 to +90 degrees
+    theta = 2 * np.pi * np.arange(sectors + 1) / sectors           # 0 to 360 degrees
+
+    r = RADIUS * np.cos(phi)[:, None]
+    vertices = np.empty((stacks + 1, sectors + 1, 3), dtype=np.float32)
+    vertices[..., 0] = r * np.cos(theta)
+    vertices[..., 1] = (RADIUS * np.sin(phi))[:, None]
+    vertices[..., 2] = r * np.sin(theta)
+
+    return vertices.ravel()
+
+def get_sphere_indices(stacks=STACKS, sectors=SECTORS):
+    """
+    The whole sphere as a single triangle strip. The strips of consecutive
+    stacks are stitched with two repeated indices, which form degenerate
+    triangles that are never rasterized, so one draw call covers every stack.
+    """
+    first = np.arange(stacks)[:, None] * (sectors + 1) + np.arange(sectors + 1)
+    second = first + sectors + 1
+    strips = np.stack([first, second], axis=-1).reshape(stacks, -1)
+
+    # Stitch: repeat the last index of a strip and the first of the next one.
+    # Strips have an even length, so the winding order is kept.
+    indices = np.empty((stacks, strips.shape[1] + 2), dtype=np.uint32)
+    indices[:, 1:-1] = strips
+    indices[:, 0] = strips[:, 0]
+    indices[:, -1] = strips[:, -1]
+    return indices.ravel()[1:-1]
+
+def get_sphere_index_count(stacks=STACKS, sectors=SECTORS):
+    """Length of the stitched strip from get_sphere_indices."""
+    return stacks * (2 * (sectors + 1) + 2) - 2
+
+def get_icosphere(subdivisions=3):
+    """
+    Icosphere positions (V,3) float32 and triangle indices (F*3,) uint32.
+    Every subdivision splits each triangle in four.
+    """
+    t = (1.0 + math.sqrt(5.0)) / 2.0
+    vertices = np.array([[-1, t, 0], [1, t, 0], [-1, -t, 0], [1, -t, 0],
+                         [0, -1, t], [0, 1, t], [0, -1, -t], [0, 1, -t],
+                         [t, 0, -1], [t, 0, 1], [-t, 0, -1], [-t, 0, 1]], dtype=float)
+    faces = np.array([[0, 11, 5], [0, 5, 1], [0, 1, 7], [0, 7, 10], [0, 10, 11],
+                      [1, 5, 9], [5, 11, 4], [11, 10, 2], [10, 7, 6], [7, 1, 8],
+                      [3, 9, 4], [3, 4, 2], [3, 2, 6], [3, 6, 8], [3, 8, 9],
+                      [4, 9, 5], [2, 4, 11], [6, 2, 10], [8, 6, 7], [9, 8, 1]])
+
+    for _ in range(subdivisions):
+        # Each edge of every face, shared edges collapse to one midpoint
+        edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+        unique_edges, edge_of = np.unique(edges, axis=0, return_inverse=True)
+        midpoints = (vertices[unique_edges[:, 0]] + vertices[unique_edges[:, 1]]) / 2
+
+        a, b, c = faces.T
+        ab, bc, ca = (len(vertices) + edge_of.reshape(-1, 3)).T
+        vertices = np.concatenate([vertices, midpoints])
+        faces = np.concatenate([np.stack([a, ab, ca], axis=1), np.stack([b, bc, ab], axis=1),
+                                np.stack([c, ca, bc], axis=1), np.stack([ab, bc, ca], axis=1)])
+
+    vertices *= RADIUS / np.linalg.norm(vertices, axis=1, keepdims=True)
+    return vertices.astype(np.float32), faces.astype(np.uint32).ravel()
+
+def get_sphere_mesh(stacks=STACKS, sectors=SECTORS):
+    """Cached (vertices, stitched strip indices) of a UV-sphere, read-only."""
+    key = ("uv", stacks, sectors)
+    if key not in _mesh_cache:
+        _mesh_cache[key] = _freeze(get_sphere_vertices(stacks, sectors), get_sphere_indices(stacks, sectors))
+    return _mesh_cache[key]
+
+def get_icosphere_mesh(subdivisions=3):
+    """Cached (vertices, triangle indices) of an icosphere, read-only."""
+    key = ("ico", subdivisions)
+    if key not in _mesh_cache:
+        _mesh_cache[key] = _freeze(*get_icosphere(subdivisions))
+    return _mesh_cache[key]
+
+def get_sphere_lods():
+    """Meshes of every SPHERE_LODS resolution, coarse to fine."""
+    return [get_sphere_mesh(stacks, sectors) for stacks, sectors in SPHERE_LODS]
+
+def get_gradient_map(color_left, color_right, width, height):
+    """
+    Equirectangular RGBA8 map of the planet color gradient, bottom row first
+    like OpenGL. The gradient runs along the object space x axis, the same
+    as the color planet shader.
+    """
+    longitude = (np.arange(width) + 0.5) / width * 2 * np.pi - np.pi
+    latitude = ((np.arange(height) + 0.5) / height - 0.5) * np.pi
+    x = np.cos(latitude)[:, None] * np.cos(longitude)[None, :]
+
+    t = ((x + 1.0) * 0.5)[..., None]
+    rgb = (1.0 - t) * np.asarray(color_left) + t * np.asarray(color_right)
+
+    image = np.full((height, width, 4), 255, dtype=np.uint8)
+    image[..., :3] = np.round(np.clip(rgb, 0.0, 1.0) * 255)
+    return image
+
+def _freeze(*arrays):
+    # Cached meshes are shared, make accidental edits fail loudly
+    for array in arrays:
+        array.flags.writeable = False
+    return arrays
 
 def get_view_matrix(distance,pitch_degrees):
     pitch = np.radians(pitch_degrees) 
@@ -92,6 +172,39 @@ def get_model_matrix():
     ], dtype=np.float32)
     return model
 
+def get_model_matrices(positions, spin_angles, scales, out=None):
+    """
+    Build Translation * Rotation(Y) * Scale for every body at once.
+    The result has shape (N,4,4) and each matrix is stored column-major,
+    so it can be uploaded with glUniformMatrix4fv(..., GL_FALSE, ...) as is.
+    """
+    positions = np.asarray(positions)
+    count = len(positions)
+
+    if out is None:
+        out = np.zeros((count, 4, 4), dtype=np.float32)
+
+    cos_a = np.cos(spin_angles) * scales
+    sin_a = np.sin(spin_angles) * scales
+
+    # out[i] is the transpose of the usual row-major model matrix
+    out[:, 0, 0] = cos_a
+    out[:, 0, 1] = 0.0
+    out[:, 0, 2] = -sin_a
+    out[:, 0, 3] = 0.0
+    out[:, 1, 0] = 0.0
+    out[:, 1, 1] = scales
+    out[:, 1, 2] = 0.0
+    out[:, 1, 3] = 0.0
+    out[:, 2, 0] = sin_a
+    out[:, 2, 1] = 0.0
+    out[:, 2, 2] = cos_a
+    out[:, 2, 3] = 0.0
+    out[:, 3, :3] = positions
+    out[:, 3, 3] = 1.0
+
+    return out
+
 def get_background_vertices():
     vertices = [
         -1.0,  1.0, 0.0,
@@ -101,15 +214,6 @@ def get_background_vertices():
     ]
     return np.array(vertices, dtype=np.float32)
 
-def get_orbit_ring_vertices(radius, segments=100):
-    vertices = []
-    for i in range(segments + 1):
-        angle = 2 * np.pi * i / segments
-        x = radius * np.cos(angle)
-        z = radius * np.sin(angle)
-        vertices.extend([x, 0.0, z])
-    return np.array(vertices, dtype=np.float32)
-
 def get_ring_vertices(radius, segments=100):
     internal = []
     for i in range(segments + 1):
@@ -190,6 +294,22 @@ def calculate_turn_amout(coordinate):
     
     return amount
 
+def ray_sphere_distances(origin, direction, centers, radii):
+    """
+    Distance along a unit ray to the nearest hit of every sphere,
+    np.inf where the ray misses or the sphere is behind the origin.
+    """
+    L = origin - np.asarray(centers)
+    b = L @ direction
+    c = np.einsum('ij,ij->i', L, L) - np.asarray(radii) ** 2
+    discriminant = b * b - c
+
+    root = np.sqrt(np.maximum(discriminant, 0.0))
+    near = -b - root
+    far = -b + root
+    t = np.where(near > 0, near, far)
+    return np.where((discriminant >= 0) & (t > 0), t, np.inf)
+
 def get_ray_vertices(p1,p2):
     origin = p1.copy()
     origin[1] -= 0.1
@@ -0,0 +1,105 @@
+from OpenGL.GL import *
+
+class GLState:
+    """
+    Shadow copy of the GL bindings the renderer changes: program, vertex
+    array, buffers, textures, capabilities, blend function and depth mask.
+    Calls that would not change anything are dropped and counted.
+    Anything touching GL behind its back (QPainter, setup code) must be
+    followed by invalidate().
+    """
+
+    def __init__(self):
+        self.calls = 0      # GL calls made since the last end_frame
+        self.skipped = 0    # redundant calls dropped since the last end_frame
+        self.invalidate()
+
+    def invalidate(self):
+        """Forget every binding, the next call of each kind goes through."""
+        self.program = None
+        self.vertex_array = None
+        self.buffers = {}           # target -> buffer
+        self.active_texture = None
+        self.textures = {}          # (unit, target) -> texture
+        self.capabilities = {}      # capability -> enabled
+        self.blend = None           # (source, destination)
+        self.depth_write = None
+
+    def end_frame(self):
+        """Return (calls, skipped) for the frame and reset the counters."""
+        counts = self.calls, self.skipped
+        self.calls = 0
+        self.skipped = 0
+        return counts
+
+    def use_program(self, program):
+        if self.program == program:
+            self.skipped += 1
+            return
+        glUseProgram(program)
+        self.program = program
+        self.calls += 1
+
+    def bind_vertex_array(self, vertex_array):
+        if self.vertex_array == vertex_array:
+            self.skipped += 1
+            return
+        glBindVertexArray(vertex_array)
+        self.vertex_array = vertex_array
+        # The element buffer binding belongs to the vertex array
+        self.buffers.pop(GL_ELEMENT_ARRAY_BUFFER, None)
+        self.calls += 1
+
+    def bind_buffer(self, target, buffer):
+        if self.buffers.get(target) == buffer:
+            self.skipped += 1
+            return
+        glBindBuffer(target, buffer)
+        self.buffers[target] = buffer
+        self.calls += 1
+
+    def bind_texture(self, unit, target, texture):
+        """Bind a texture to a texture unit (0 for GL_TEXTURE0)."""
+        if self.textures.get((unit, target)) == texture:
+            self.skipped += 1
+            return
+        if self.active_texture != unit:
+            glActiveTexture(GL_TEXTURE0 + unit)
+            self.active_texture = unit
+            self.calls += 1
+        glBindTexture(target, texture)
+        self.textures[(unit, target)] = texture
+        self.calls += 1
+
+    def enable(self, capability, enabled=True):
+        if self.capabilities.get(capability) == enabled:
+            self.skipped += 1
+            return
+        if enabled:
+            glEnable(capability)
+        else:
+            glDisable(capability)
+        self.capabilities[capability] = enabled
+        self.calls += 1
+
+    def disable(self, capability):
+        self.enable(capability, False)
+
+    def blend_func(self, source, destination):
+        if self.blend == (source, destination):
+            self.skipped += 1
+            return
+        glBlendFunc(source, destination)
+        self.blend = (source, destination)
+        self.calls += 1
+
+    def depth_mask(self, enabled):
+        if self.depth_write == enabled:
+            self.skipped += 1
+            return
+        glDepthMask(GL_TRUE if enabled else GL_FALSE)
+        self.depth_write = enabled
+        self.calls += 1
+
+# The application renders into a single GL context
+state = GLState()
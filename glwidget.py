@@ -4,14 +4,38 @@ from PyQt5.QtCore import QTimer, Qt, pyqtSignal
 from PyQt5.QtGui import QPainter, QFont, QColor
 from OpenGL.GL import *
 import numpy as np
+import os
 import time
 import geometry
 import utility
 import time
 import math
+import scene
+import chebyshev
+import trajectory
+import catalog
 from planet import Planet
 from planet import Sun
 from planet import TexturedPlanet
+from ephemeris import Ephemeris
+from scenegraph import SceneGraph
+from registry import BodyRegistry, STAR, PLANET
+from belt import AsteroidBelt
+from clock import SimulationClock
+from lod import LODSelector
+from shader import ShaderProgram, CameraBuffer
+from glstate import state as gl_state
+from orbits import OrbitLines
+import culling
+
+EPHEMERIS_CACHE = "ephemeris.bin"
+TRAJECTORY_FILE = "trajectories.traj"
+CATALOG_FILE = "catalogs/MPCORB.DAT"     # MPCORB or .csv orbital elements, optional
+RING_SCALE = 1.4        # ring radius relative to the planet radius
+PLANET_MAP_SIZE = (2048, 1024)  # every planet map is resampled to this size
+PLANET_MAPS_UNIT = 2            # texture unit of the planet map array
+SPHERE_INSTANCE_FLOATS = 17     # column-major model matrix and map layer
+ORBIT_COLOR = (1.0, 1.0, 1.0, 0.5)  # rgba of the orbit lines
 
 MODE_NORMAL = 0
 MODE_FOLLOW = 1
@@ -32,6 +56,7 @@ class SolarSystemGL(QOpenGLWidget):
         super().__init__(parent)
 
         self.start_time = time.time()
+        self.clock = SimulationClock(epoch=self.start_time)
         self.setFocusPolicy(Qt.StrongFocus)
         self.setFocus() 
 
@@ -64,6 +89,16 @@ class SolarSystemGL(QOpenGLWidget):
         self.focusVerticalAngle = 20
         self.focusHorizontalAngle = 0
         self.ray_points = None
+        self.particle_systems = []
+        self.catalogs = []
+        self.lod = LODSelector()
+        # Per body visibility of the sphere, rings and orbit line, see cull_scene
+        self.body_visible = np.zeros(0, dtype=bool)
+        self.ring_visible = np.zeros(0, dtype=bool)
+        self.orbit_visible = np.zeros(0, dtype=bool)
+        self.belts = []
+        self.show_gl_stats = False
+        self.gl_stats = (0, 0)     # GL calls made and skipped last frame
 
     def wheelEvent(self, event):
 
@@ -95,20 +130,24 @@ class SolarSystemGL(QOpenGLWidget):
                 if self.planets[self.selectedPlanet].rings:
                     self.zoom += 15
 
+    def camera_target(self):
+        """World position of the camera anchor of the selected body."""
+        anchor = self.scene_graph.anchor_nodes[self.selectedPlanet]
+        return self.scene_graph.world_positions[anchor].copy()
+
     def toggleSelection(self,step):
+        # Cycle through stars and planets, moons are only selected by clicking
+        selectable = self.registry.of_kind(STAR, PLANET)
 
         if self.selectedPlanet is not None:
-            self.selectedPlanet += step
-
-            if self.selectedPlanet == 2: 
-                self.selectedPlanet += step #Do not focus on the moon
-
-            if self.selectedPlanet >= len(self.planets):
-                self.selectedPlanet = 0
-            elif self.selectedPlanet < 0: 
-                self.selectedPlanet = len(self.planets) - 1 
+            position = int(np.searchsorted(selectable, self.selectedPlanet))
+            if step > 0 and position < len(selectable) and selectable[position] == self.selectedPlanet:
+                position += 1
+            elif step < 0:
+                position -= 1
+            self.selectedPlanet = int(selectable[position % len(selectable)])
         else:
-            self.selectedPlanet = 1
+            self.selectedPlanet = int(selectable[min(1, len(selectable) - 1)])
 
         self.fix_zoom()
         self.fix_view_angles()
@@ -136,32 +175,13 @@ class SolarSystemGL(QOpenGLWidget):
         dir = dir / np.linalg.norm(dir)
         origin = eye_vector
 
-        a = np.dot(dir,dir)
-
+        # Nearest scene body along the ray, one vectorized test for all of them
+        count = len(self.planets)
+        distances = geometry.ray_sphere_distances(origin, dir, self.ephemeris.positions[:count],
+                                                  self.registry.radius[:count])
         planetHit = None
-        distance = 0
-
-        for p in self.planets:
-            center = p.position
-            L = origin - center
-
-            b = 2 * np.dot(dir,L)
-            c = np.dot(L,L) - math.pow(p.radius,2)
-
-            discriminant = math.pow(b,2) - (4 * a * c)
-
-            if discriminant >=0:
-                t1 = (-b + math.sqrt(discriminant)) / (2 * a)
-                t2 = (-b - math.sqrt(discriminant)) / (2 * a)
-
-                if(t1 > 0 or t2 > 0):
-
-                    t = min([t for t in [t1,t2] if t>0], default=None)
-
-                    if t > distance:
-
-                        planetHit = self.planets.index(p)
-                        distance = t
+        if len(distances) and np.isfinite(distances.min()):
+            planetHit = int(np.argmin(distances))
 
         points = geometry.get_ray_vertices(origin,dir)
         self.ray_points = points
@@ -173,7 +193,7 @@ class SolarSystemGL(QOpenGLWidget):
             if self.mode == MODE_NORMAL:
                 self.mode = MODE_FOLLOW
 
-            print("Planet {} was selected".format(self.planets[planetHit].name))
+            print("Planet {} was selected".format(self.registry[planetHit].name))
             
         else:
             self.selectedPlanet = None
@@ -194,6 +214,16 @@ class SolarSystemGL(QOpenGLWidget):
             self.toggleSelection(1)
         elif event.key() == Qt.Key_Left:
             self.toggleSelection(-1)
+        elif event.key() == Qt.Key_Space:
+            self.clock.toggle_pause()
+        elif event.key() == Qt.Key_Period:
+            self.clock.step()
+        elif event.key() in (Qt.Key_Plus, Qt.Key_Equal):
+            self.clock.set_warp(self.clock.warp * 10)
+        elif event.key() == Qt.Key_Minus:
+            self.clock.set_warp(self.clock.warp / 10)
+        elif event.key() == Qt.Key_G:
+            self.show_gl_stats = not self.show_gl_stats
         else:
             self.pressed_keys.add(event.key())
 
@@ -247,19 +277,13 @@ class SolarSystemGL(QOpenGLWidget):
             self.camera_pitch = math.degrees(math.atan2(direction[1], horizontal_dist))
 
             self.view_matrix = geometry.get_look_at_matrix(self.eye_position, target, up)
-       
-            # Update all programs' uniforms
-        
-            for p in self.planets:
-                self.setup_program_uniforms(p.program, self.view_matrix, self.projection_matrix, self.model_matrix)
-                self.setup_program_uniforms(self.program_orbit, self.view_matrix, self.projection_matrix, self.model_matrix)
             
             self.fix_navigation = False
             self.update()  # Request a redraw
             return
         
         if self.mode == MODE_FOCUS and self.selectedPlanet is not None:
-            target = self.planets[self.selectedPlanet].position
+            target = self.camera_target()
             up = np.array([0,1,0],dtype=np.float32)
             direction = None
             if self.planets[self.selectedPlanet].name != "Sun":
@@ -290,18 +314,12 @@ class SolarSystemGL(QOpenGLWidget):
 
 
             self.view_matrix = geometry.get_look_at_matrix(camera, target, up)
-       
-            # Update all programs' uniforms
-        
-            for p in self.planets:
-                self.setup_program_uniforms(p.program, self.view_matrix, self.projection_matrix, self.model_matrix)
-                self.setup_program_uniforms(self.program_orbit, self.view_matrix, self.projection_matrix, self.model_matrix)
             
             self.update()  # Request a redraw
             return
         
         if self.mode == MODE_FOLLOW and self.selectedPlanet is not None:
-            target = self.planets[self.selectedPlanet].position
+            target = self.camera_target()
             up = np.array([0,1,0],dtype=np.float32)
 
             if self.scrollAmount != 0:
@@ -320,12 +338,6 @@ class SolarSystemGL(QOpenGLWidget):
                 self.scrollAmount = 0
 
             self.view_matrix = geometry.get_look_at_matrix(self.eye_position, target, up)
-       
-            # Update all programs' uniforms
-        
-            for p in self.planets:
-                self.setup_program_uniforms(p.program, self.view_matrix, self.projection_matrix, self.model_matrix)
-                self.setup_program_uniforms(self.program_orbit, self.view_matrix, self.projection_matrix, self.model_matrix)
             
             self.update()  # Request a redraw
             return
@@ -383,205 +395,345 @@ class SolarSystemGL(QOpenGLWidget):
 
 
         self.view_matrix = geometry.get_look_at_matrix(self.eye_position,target,up)
-       
-        # Update all programs' uniforms
-        
-        for p in self.planets:
-            self.setup_program_uniforms(p.program, self.view_matrix, self.projection_matrix, self.model_matrix)
-            self.setup_program_uniforms(self.program_orbit, self.view_matrix, self.projection_matrix, self.model_matrix)
         self.update()  # Request a redraw
 
 
     @staticmethod
     def create_shader_program(vertex_shader_source, fragment_shader_source):
-        # Create a OpenGL program and shaders
-        program = glCreateProgram()
-        vertex_shader = glCreateShader(GL_VERTEX_SHADER)
-        fragment_shader = glCreateShader(GL_FRAGMENT_SHADER)
-
-        # Set shader source code
-        glShaderSource(vertex_shader, vertex_shader_source)
-        glShaderSource(fragment_shader, fragment_shader_source)
-
-        # Compile shaders
-
-        glCompileShader(vertex_shader)
-        if not glGetShaderiv(vertex_shader, GL_COMPILE_STATUS):
-            error = glGetShaderInfoLog(vertex_shader).decode()
-            print("Vertex shader compilation error:", error)
-            raise RuntimeError("Vertex shader compilation failed")
-        glCompileShader(fragment_shader)
-        if not glGetShaderiv(fragment_shader, GL_COMPILE_STATUS):
-            error = glGetShaderInfoLog(fragment_shader).decode()
-            print("Fragment shader compilation error:", error)
-            raise RuntimeError("Fragment shader compilation failed")
-        # Link shaders to the program
-
-        glAttachShader(program, vertex_shader)
-        glAttachShader(program, fragment_shader)
-        # Link the program
-        glLinkProgram(program)
-
-        if not glGetProgramiv(program,GL_LINK_STATUS):
-            print(glGetProgramInfoLog(program))
-            raise RuntimeError('Linking error')
-
-        # Get rid of the shaders 
-        glDetachShader(program, vertex_shader)
-        glDetachShader(program, fragment_shader)
+        program = ShaderProgram.link(vertex_shader_source, fragment_shader_source)
 
         #Set the default program for usage
-        glUseProgram(program)
+        program.use()
         return program
 
     def setup_buffer(self,program,data,index_data,line=False):
+        buffer, EBO = self.upload_mesh(data, index_data, GL_DYNAMIC_DRAW)
+        vao = self.setup_mesh_vao(program, buffer, EBO)
 
-        vao = glGenVertexArrays(1)
-        glBindVertexArray(vao)
+        if(line == True):
+            self.ray_vbo = buffer
+
+        return vao
 
+    @staticmethod
+    def upload_mesh(data,index_data,usage=GL_STATIC_DRAW):
+        """Upload vertex positions and optional indices, return (vbo, ebo or None)."""
         #Request buffer slot from GPU and set as current
         buffer = glGenBuffers(1)
-        glBindBuffer(GL_ARRAY_BUFFER, buffer)
+        gl_state.bind_buffer(GL_ARRAY_BUFFER, buffer)
 
         # Upload data to GPU
         # numpy provides the size in bytes of the array with nbytes
-        glBufferData(GL_ARRAY_BUFFER,data.nbytes,data,GL_DYNAMIC_DRAW)
+        glBufferData(GL_ARRAY_BUFFER,data.nbytes,data,usage)
+
+        EBO = None
+        if index_data is not None:
+            # Unbound vertex array, so the element buffer binding is not recorded anywhere
+            gl_state.bind_vertex_array(0)
+            EBO = glGenBuffers(1)
+            gl_state.bind_buffer(GL_ELEMENT_ARRAY_BUFFER, EBO)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, index_data.nbytes, index_data, GL_STATIC_DRAW)
+
+        return buffer, EBO
+
+    @staticmethod
+    def setup_mesh_vao(program,buffer,EBO=None):
+        """Vertex array reading positions from buffer, several vertex arrays may share one mesh."""
+        vao = glGenVertexArrays(1)
+        gl_state.bind_vertex_array(vao)
+        gl_state.bind_buffer(GL_ARRAY_BUFFER, buffer)
 
         stride = 3*4
         #offset for position is 0
         offset = ctypes.c_void_p(0)
         # Find the location for "position" and enable it
-        loc = glGetAttribLocation(program, "position")
+        loc = program.attribute("position")
         glEnableVertexAttribArray(loc)
         #tell OpenGL how to interpret the position attribute
         glVertexAttribPointer(loc, 3, GL_FLOAT, False, stride, offset)
 
-        if index_data is not None:
-            EBO = glGenBuffers(1)
-            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, EBO)
-            glBufferData(GL_ELEMENT_ARRAY_BUFFER, index_data.nbytes, index_data, GL_STATIC_DRAW)
-
-        if(line == True):
-            self.ray_vbo = buffer
+        if EBO is not None:
+            # Recorded in the vertex array
+            gl_state.bind_buffer(GL_ELEMENT_ARRAY_BUFFER, EBO)
 
-        glBindVertexArray(0)
+        gl_state.bind_vertex_array(0)
         return vao
 
-    @staticmethod
-    def setup_program_uniforms(program,view_matrix,projection_matrix,model_matrix):
+    def setup_point_buffer(self,program,data):
 
-        glUseProgram(program)
+        vao = glGenVertexArrays(1)
+        gl_state.bind_vertex_array(vao)
+
+        # Rewritten every frame with the new particle positions
+        buffer = glGenBuffers(1)
+        gl_state.bind_buffer(GL_ARRAY_BUFFER, buffer)
+        glBufferData(GL_ARRAY_BUFFER,data.nbytes,data,GL_STREAM_DRAW)
 
-        view_loc = glGetUniformLocation(program, "view")
-        glUniformMatrix4fv(view_loc, 1, GL_FALSE, view_matrix.T)
+        loc = program.attribute("position")
+        glEnableVertexAttribArray(loc)
+        glVertexAttribPointer(loc, 3, GL_FLOAT, False, 3*4, ctypes.c_void_p(0))
 
-        projection_loc = glGetUniformLocation(program, "projection")
-        glUniformMatrix4fv(projection_loc, 1, GL_FALSE, projection_matrix.T)
+        gl_state.bind_vertex_array(0)
+        return vao, buffer
+
+    def setup_instance_buffer(self,program,instances,offsets):
+
+        vao = glGenVertexArrays(1)
+        gl_state.bind_vertex_array(vao)
 
-        model_loc = glGetUniformLocation(program, "model")
-        glUniformMatrix4fv(model_loc, 1, GL_FALSE, model_matrix.T)
+        # A single vertex shared by every instance
+        vertex = np.zeros(3, dtype=np.float32)
+        buffer = glGenBuffers(1)
+        gl_state.bind_buffer(GL_ARRAY_BUFFER, buffer)
+        glBufferData(GL_ARRAY_BUFFER,vertex.nbytes,vertex,GL_STATIC_DRAW)
+
+        loc = program.attribute("position")
+        glEnableVertexAttribArray(loc)
+        glVertexAttribPointer(loc, 3, GL_FLOAT, False, 3*4, ctypes.c_void_p(0))
+
+        # Per instance data, uploaded once and advanced once per instance
+        instance_buffer = glGenBuffers(1)
+        gl_state.bind_buffer(GL_ARRAY_BUFFER, instance_buffer)
+        glBufferData(GL_ARRAY_BUFFER,instances.nbytes,instances,GL_STATIC_DRAW)
+
+        stride = instances.shape[1] * 4
+        for name, offset in (("orbit", 0), ("appearance", 4*4)):
+            loc = program.attribute(name)
+            glEnableVertexAttribArray(loc)
+            glVertexAttribPointer(loc, 4, GL_FLOAT, False, stride, ctypes.c_void_p(offset))
+            glVertexAttribDivisor(loc, 1)
+
+        # Phase offsets, rewritten whenever the epoch moves
+        offset_buffer = glGenBuffers(1)
+        gl_state.bind_buffer(GL_ARRAY_BUFFER, offset_buffer)
+        glBufferData(GL_ARRAY_BUFFER,offsets.nbytes,offsets,GL_DYNAMIC_DRAW)
+
+        loc = program.attribute("phaseOffset")
+        glEnableVertexAttribArray(loc)
+        glVertexAttribPointer(loc, 1, GL_FLOAT, False, 4, ctypes.c_void_p(0))
+        glVertexAttribDivisor(loc, 1)
+
+        gl_state.bind_vertex_array(0)
+        gl_state.bind_buffer(GL_ARRAY_BUFFER, 0)
+        return vao, offset_buffer
+
+    def add_particle_system(self,system):
+        """
+        Draw a gravity driven ParticleSystem next to the planets.
+        Needs the GL context to be current (e.g. call it from initializeGL).
+        """
+        vertices = system.positions.astype(np.float32)
+        system.vao, system.vbo = self.setup_point_buffer(self.program_orbit, vertices)
+        system.update(self.clock.time)
+        self.particle_systems.append(system)
+
+    @staticmethod
+    def setup_model_uniform(program,model_matrix):
+        # View and projection come from the camera uniform buffer
+        program.use()
+        program.set_mat4("model", model_matrix)
 
     def paint_background(self):
-        glDepthMask(GL_FALSE)
-        glUseProgram(self.program_background)
-        glBindVertexArray(self.background_vao)
-        glActiveTexture(GL_TEXTURE1)
-        glBindTexture(GL_TEXTURE_2D, self.texture_bg)
-        bg_texture_loc = glGetUniformLocation(self.program_background, "bgTexture")
-        glUniform1i(bg_texture_loc, 1)
+        gl_state.depth_mask(False)
+        self.program_background.use()
+        gl_state.bind_vertex_array(self.background_vao)
+        gl_state.bind_texture(1, GL_TEXTURE_2D, self.texture_bg)
+        self.program_background.set_int("bgTexture", 1)
 
         glDrawArrays(GL_TRIANGLE_FAN, 0, 4)
-        glBindVertexArray(0)
-        glDepthMask(GL_TRUE)
+        gl_state.depth_mask(True)
 
     
-    def draw_planet(self,object,delta_time):
-            #Use the sphere program
-            glUseProgram(object.program)
+    def select_lods(self):
+        """Pick a sphere level of detail for every scene body from its size in pixels."""
+        eye = np.linalg.inv(self.view_matrix)[:3, 3]
+        count = len(self.planets)
+        self.lod.select(self.ephemeris.positions[:count], self.ephemeris.radius[:count], eye,
+                        self.projection_matrix, self.height)
+
+    def cull_scene(self):
+        """
+        Test the bounding spheres of every body, ring and orbit line against
+        the view frustum and the pixel threshold in one pass.
+        """
+        count = len(self.planets)
+        positions = self.ephemeris.positions[:count]
+        radius = self.ephemeris.radius[:count]
+
+        # Rings reach twice the ring node scale, orbit lines reach the apoapsis around the origin
+        apoapsis = self.ephemeris.semi_major_axis[:count] * (1 + self.ephemeris.eccentricity[:count])
+        centers = np.concatenate([positions, positions, np.zeros((count, 3))])
+        radii = np.concatenate([radius, radius * RING_SCALE * 2, apoapsis])
+
+        visible = culling.visible_spheres(centers, radii, self.view_matrix, self.projection_matrix, self.height)
+        self.body_visible, self.ring_visible, self.orbit_visible = np.split(visible, 3)
+
+    def draw_planets(self):
+        """
+        Bodies, then orbits, then rings, so consecutive draws share their
+        program and vertex array. Culled parts cost no GL calls, see cull_scene.
+        """
+        for p in self.planets:
+            if isinstance(p, Sun) and self.body_visible[p.index]:
+                self.draw_body(p)
+        self.draw_spheres()
 
-            object.update(delta_time)
+        self.orbit_lines.update(self.ephemeris)
+        self.orbit_lines.draw(self.orbit_visible)
 
-            glBindVertexArray(object.vao)
-            model_loc = glGetUniformLocation(object.program, "model")
+        for p in self.planets:
+            if p.rings and self.ring_visible[p.index]:
+                self.draw_planet_rings(p)
 
+    def draw_body(self,object):
+            # The Sun keeps its procedural shader and is never an impostor
+            object.program.use()
+
+            # Mesh detail follows the size on screen, see select_lods
+            level = self.lod.levels[object.index]
+            gl_state.bind_vertex_array(object.lod_vaos[level])
             model_matrix = object.get_model_matrix()
-            self.setup_program_uniforms(object.program, self.view_matrix, self.projection_matrix, model_matrix)
+            self.setup_model_uniform(object.program, model_matrix)
 
             object.update_uniforms()
 
-            indices_per_strip = (geometry.SECTORS + 1) * 2
-
-            offset = 0
-            for i in range(geometry.STACKS):
-                glDrawElements(GL_TRIANGLE_STRIP,indices_per_strip,GL_UNSIGNED_INT,ctypes.c_void_p(offset * 4))
-                offset += indices_per_strip
+            # Every stack in one stitched strip, a single draw call per sphere
+            glDrawElements(GL_TRIANGLE_STRIP,self.sphere_index_counts[level],GL_UNSIGNED_INT,ctypes.c_void_p(0))
 
-            self.draw_orbit(object.orbit_radius)
+    def draw_spheres(self):
+        """
+        Every visible planet and moon with one instanced call per mesh level
+        in use, plus one for the tiny bodies drawn as impostors.
+        """
+        bodies = self.sphere_bodies[self.body_visible[self.sphere_bodies]]
+        if len(bodies) == 0:
+            return
 
-            if(object.rings):
-                self.draw_planet_rings(object)
+        impostors = self.lod.impostors[bodies]
+        meshes = bodies[~impostors]
+        levels = self.lod.levels[meshes]
+        order = np.argsort(levels, kind='stable')
+        instances = np.concatenate([meshes[order], bodies[impostors]])
+
+        # Mesh instances grouped by level, impostors last
+        data = self.sphere_instances[:len(instances)]
+        data[:, :16] = self.ephemeris.model_matrices[instances].reshape(-1, 16)
+        data[:, 16] = self.sphere_layers[instances]
+        gl_state.bind_buffer(GL_ARRAY_BUFFER, self.sphere_instance_vbo)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, data.nbytes, data)
+
+        gl_state.bind_texture(PLANET_MAPS_UNIT, GL_TEXTURE_2D_ARRAY, self.planet_maps)
+
+        self.program_spheres.use()
+        first = 0
+        for level, count in enumerate(np.bincount(levels, minlength=len(self.sphere_vaos))):
+            if count == 0:
+                continue
+            gl_state.bind_vertex_array(self.sphere_vaos[level])
+            self.point_sphere_instances(self.program_spheres, first)
+            glDrawElementsInstanced(GL_TRIANGLE_STRIP, self.sphere_index_counts[level], GL_UNSIGNED_INT,
+                                    ctypes.c_void_p(0), int(count))
+            first += count
+
+        if first < len(instances):
+            # Tiny bodies are a single ray-cast quad
+            self.program_impostor.use()
+            gl_state.bind_vertex_array(self.impostor_vao)
+            self.point_sphere_instances(self.program_impostor, first)
+            glDrawArraysInstanced(GL_TRIANGLE_STRIP, 0, 4, len(instances) - first)
+
+    def point_sphere_instances(self,program,first):
+        """Point the instance attributes of the bound vertex array at instance first."""
+        stride = SPHERE_INSTANCE_FLOATS * 4
+        offset = int(first) * stride
+        gl_state.bind_buffer(GL_ARRAY_BUFFER, self.sphere_instance_vbo)
+
+        # A mat4 attribute takes one location per column
+        model = program.attribute("model")
+        for column in range(4):
+            glVertexAttribPointer(model + column, 4, GL_FLOAT, False, stride, ctypes.c_void_p(offset + column * 4*4))
+        glVertexAttribPointer(program.attribute("layer"), 1, GL_FLOAT, False, stride, ctypes.c_void_p(offset + 16*4))
+
+    def setup_sphere_instances(self,program,vao):
+        """Add the per instance model matrix and map layer to a sphere or impostor vertex array."""
+        gl_state.bind_vertex_array(vao)
+        model = program.attribute("model")
+        for loc in [model, model + 1, model + 2, model + 3, program.attribute("layer")]:
+            glEnableVertexAttribArray(loc)
+            glVertexAttribDivisor(loc, 1)
+        self.point_sphere_instances(program, 0)
+        gl_state.bind_vertex_array(0)
 
     def draw_planet_rings(self,object):
-        glUseProgram(self.program_rings)
-        glBindVertexArray(self.ring_vao)
+        self.program_rings.use()
+        gl_state.bind_vertex_array(self.ring_vao)
             
-        model_matrix = object.get_ring_model_matrix(1.4)
+        model_matrix = self.scene_graph.model_matrix(self.scene_graph.ring_nodes[object.index])
 
-        self.setup_program_uniforms(self.program_rings,self.view_matrix,self.projection_matrix,model_matrix)
+        self.setup_model_uniform(self.program_rings, model_matrix)
         object.update_ring_uniforms()
 
         glDrawArrays(GL_TRIANGLE_STRIP, 0, 202)
-        glBindVertexArray(0)
-
-    def draw_orbit(self,radius):
-        glUseProgram(self.program_orbit)
-        glBindVertexArray(self.orbit_vao)
-        scaling_matrix = np.identity(4, dtype=np.float32)
-        scaling_matrix[0, 0] = radius
-        scaling_matrix[1, 1] = 1.0     
-        scaling_matrix[2, 2] = radius
-            
-        model_matrix = np.dot(self.model_matrix,scaling_matrix)
 
-        self.setup_program_uniforms(self.program_orbit,self.view_matrix,self.projection_matrix,model_matrix)
-        orbit_color = np.array([1.0, 1.0, 1.0], dtype=np.float32)
-        orbit_color_loc = glGetUniformLocation(self.program_orbit, "orbitColor")
-        glUniform3fv(orbit_color_loc, 1, orbit_color) 
-            
-        glDrawArrays(GL_LINE_STRIP, 0, 101)
-        glBindVertexArray(0)
+    def update_particle_systems(self,current_time):
+        """
+        Integrate the particle systems once per frame, after all clock
+        sub-steps, sharing one wall clock budget between them.
+        """
+        if not self.particle_systems:
+            return
+        deadline = time.perf_counter() + max(system.max_update_seconds for system in self.particle_systems)
+        for system in self.particle_systems:
+            system.update(current_time, deadline)
+
+    def draw_particles(self,system):
+        self.program_orbit.use()
+        gl_state.bind_vertex_array(system.vao)
+        self.setup_model_uniform(self.program_orbit, self.model_matrix)
+
+        vertices = system.positions.astype(np.float32)
+        gl_state.bind_buffer(GL_ARRAY_BUFFER, system.vbo)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, vertices.nbytes, vertices)
+
+        glPointSize(system.point_size)
+        glDrawArrays(GL_POINTS, 0, len(system))
+
+    def draw_belt(self,belt):
+        belt.program.use()
+        gl_state.bind_vertex_array(belt.vao)
+
+        # The epoch moved
+        if belt.dirty:
+            gl_state.bind_buffer(GL_ARRAY_BUFFER, belt.offset_vbo)
+            glBufferSubData(GL_ARRAY_BUFFER, 0, belt.offsets.nbytes, belt.offsets)
+            belt.dirty = False
+
+        # Pixels covered by one world unit at distance 1
+        point_scale = self.height / (2 * math.tan(math.radians(45) / 2))
+        belt.update_uniforms(point_scale)
+
+        glDrawArraysInstanced(GL_POINTS, 0, 1, belt.count)
 
     def draw_ray(self):
-        glUseProgram(self.program_orbit)
-        glBindVertexArray(self.ray_vao)
+        self.program_orbit.use()
+        gl_state.bind_vertex_array(self.ray_vao)
         model_matrix = np.identity(4, dtype=np.float32)
-        self.setup_program_uniforms(self.program_orbit,self.view_matrix,self.projection_matrix,model_matrix)
+        self.setup_model_uniform(self.program_orbit, model_matrix)
         orbit_color = np.array([1.0, 1.0, 1.0], dtype=np.float32)
-        orbit_color_loc = glGetUniformLocation(self.program_orbit, "orbitColor")
-        glUniform3fv(orbit_color_loc, 1, orbit_color) 
+        self.program_orbit.set_vec3("orbitColor", orbit_color)
 
-        glBindBuffer(GL_ARRAY_BUFFER,self.ray_vbo)
+        gl_state.bind_buffer(GL_ARRAY_BUFFER,self.ray_vbo)
         glBufferSubData(GL_ARRAY_BUFFER, 0, self.ray_points.nbytes, self.ray_points)
         
         glLineWidth(2.0)
         glDrawArrays(GL_LINES,0,2)
-        glBindVertexArray(0)
-        glUseProgram(0)
-        glBindBuffer(GL_ARRAY_BUFFER, 0)
-
-    def assignTextures(self,planet,texture_path,ring_texture_path):
-        texture_id = utility.load_texture_qt("textures/"+texture_path)
-        glActiveTexture(GL_TEXTURE0)
-        glBindTexture(GL_TEXTURE_2D, texture_id)
-        planet.texture_unit = 0
-        planet.texture_id = texture_id
-
-        if(ring_texture_path is not None):
-            ring_texture_id = utility.load_texture_qt("textures/"+ring_texture_path)
-            glActiveTexture(GL_TEXTURE1)
-            glBindTexture(GL_TEXTURE_2D,ring_texture_id)
-            planet.ring_texture_id = ring_texture_id
-            planet.ring_texture_unit = 1
+
+    def assignRingTexture(self,planet,ring_texture_path):
+        ring_texture_id = utility.load_texture_qt("textures/"+ring_texture_path)
+        glActiveTexture(GL_TEXTURE1)
+        glBindTexture(GL_TEXTURE_2D,ring_texture_id)
+        planet.ring_texture_id = ring_texture_id
+        planet.ring_texture_unit = 1
 
     def initializeGL(self):
         glEnable(GL_DEPTH_TEST)
@@ -589,52 +741,47 @@ class SolarSystemGL(QOpenGLWidget):
 
         #self.last_time = time.time()
 
-        # Vertex shader with color source code
-        vertex_shader_source = utility.load_shader_source("shaders/planet_vertex.glsl")
-        # Fragment shader with color source code
-        fragment_shader_source = utility.load_shader_source("shaders/planet_fragment.glsl")
+        # Instanced planets and moons, textured from the planet map array
+        sphere_vertex = utility.load_shader_source("shaders/sphere_vertex.glsl")
+        sphere_fragment = utility.load_shader_source("shaders/sphere_fragment.glsl")
 
         sun_vertex = utility.load_shader_source("shaders/sun_vertex.glsl")
         sun_fragment = utility.load_shader_source("shaders/sun_fragment.glsl")
 
-        textured_vertex = utility.load_shader_source("shaders/textured_vertex.glsl")
-        textured_fragment = utility.load_shader_source("shaders/textured_fragment.glsl")
-
         background_vertex = utility.load_shader_source("shaders/bg_vertex.glsl")
         background_fragment = utility.load_shader_source("shaders/bg_fragment.glsl")
 
         orbit_vertex = utility.load_shader_source("shaders/orbit_vertex.glsl")
         orbit_fragment = utility.load_shader_source("shaders/orbit_fragment.glsl")
 
+        orbit_lines_vertex = utility.load_shader_source("shaders/orbit_lines_vertex.glsl")
+        orbit_lines_fragment = utility.load_shader_source("shaders/orbit_lines_fragment.glsl")
+
         ring_vertex = utility.load_shader_source("shaders/ring_vertex.glsl")
         ring_fragment = utility.load_shader_source("shaders/ring_fragment.glsl")
 
+        belt_vertex = utility.load_shader_source("shaders/belt_vertex.glsl")
+        belt_fragment = utility.load_shader_source("shaders/belt_fragment.glsl")
+
         background_vertices = geometry.get_background_vertices()
-        orbit_vertices = geometry.get_orbit_ring_vertices(radius=1.0, segments=100)
         ring_vertices = geometry.get_ring_vertices(radius=1.0,segments=100)
 
         glEnable(GL_DEPTH_TEST)      # Enable depth testing
         glDepthFunc(GL_LESS)    # Specify depth test function
 
-        program = self.create_shader_program(vertex_shader_source, fragment_shader_source)
+        self.program_spheres = self.create_shader_program(sphere_vertex, sphere_fragment)
         program_sun = self.create_shader_program(sun_vertex, sun_fragment)
-        program_textured = self.create_shader_program(textured_vertex,textured_fragment)
         self.program_orbit = self.create_shader_program(orbit_vertex,orbit_fragment)
+        program_orbit_lines = self.create_shader_program(orbit_lines_vertex,orbit_lines_fragment)
         self.program_rings = self.create_shader_program(ring_vertex,ring_fragment)
-
-        self.orbit_vao = self.setup_buffer(self.program_orbit, orbit_vertices, None)
-
-        glUseProgram(self.program_orbit)
-        orbit_color = np.array([1.0, 1.0, 1.0], dtype=np.float32)
-        orbit_color_loc = glGetUniformLocation(self.program_orbit, "orbitColor")
-        glUniform3fv(orbit_color_loc, 1, orbit_color)
-        glUseProgram(0)
+        program_belt = self.create_shader_program(belt_vertex,belt_fragment)
+        self.program_impostor = self.create_shader_program(utility.load_shader_source("shaders/impostor_vertex.glsl"),
+                                                           utility.load_shader_source("shaders/impostor_fragment.glsl"))
 
         self.ring_vao = self.setup_buffer(self.program_rings, ring_vertices,None)
-        glUseProgram(self.program_rings)
+        self.program_rings.use()
         ring_color = np.array([1.0, 1.0, 1.0], dtype=np.float32)
-        ring_color_loc = glGetUniformLocation(self.program_rings, "ringColor")
-        glUniform3fv(ring_color_loc, 1, ring_color)
+        self.program_rings.set_vec3("ringColor", ring_color)
         glUseProgram(0)
 
         line_placeholder = np.array([0,0,0,0,0,0], dtype=np.float32)
@@ -647,16 +794,25 @@ class SolarSystemGL(QOpenGLWidget):
         self.texture_bg = utility.load_texture_qt("textures/space.jpg")
         glActiveTexture(GL_TEXTURE1)
         glBindTexture(GL_TEXTURE_2D, self.texture_bg)
-        bg_texture_loc = glGetUniformLocation(self.program_background, "bgTexture")
-        glUniform1i(bg_texture_loc, 1)
-
-        # Build vertex data for a sphere
-        data = geometry.get_sphere_vertices()
-
-        index_data = geometry.get_sphere_indices()
-
-        vao_planet = self.setup_buffer(program, data,index_data)
-        vao_sun = self.setup_buffer(program_sun, data,index_data)
+        self.program_background.set_int("bgTexture", 1)
+
+        # Upload every sphere level of detail once, the planet and Sun vertex arrays share it
+        self.sphere_vaos = []
+        vaos_sun = []
+        for stacks, sectors in geometry.SPHERE_LODS:
+            data, index_data = geometry.get_sphere_mesh(stacks, sectors)
+            buffer, EBO = self.upload_mesh(data, index_data)
+            self.sphere_vaos.append(self.setup_mesh_vao(self.program_spheres, buffer, EBO))
+            vaos_sun.append(self.setup_mesh_vao(program_sun, buffer, EBO))
+        # Camera facing quad for impostors
+        corners = np.array([-1, -1, 0, 1, -1, 0, -1, 1, 0, 1, 1, 0], dtype=np.float32)
+        self.impostor_vao = self.setup_buffer(self.program_impostor, corners, None)
+
+        self.sphere_index_counts = [geometry.get_sphere_index_count(stacks, sectors)
+                                    for stacks, sectors in geometry.SPHERE_LODS]
+
+        default_lod = geometry.SPHERE_LODS.index((geometry.STACKS, geometry.SECTORS))
+        vao_sun = vaos_sun[default_lod]
 
         target = np.array([0,0,0])
         eye = self.eye_position
@@ -666,112 +822,104 @@ class SolarSystemGL(QOpenGLWidget):
         projection_matrix = geometry.get_projection_matrix(math.radians(45), self.aspect, self.near_clipping,self.far_clipping)
         model_matrix = np.identity(4)
 
-        self.setup_program_uniforms(program,view_matrix,projection_matrix,model_matrix)
-        self.setup_program_uniforms(program_sun,view_matrix,projection_matrix,model_matrix)
-        self.setup_program_uniforms(program_textured,view_matrix,projection_matrix,model_matrix)
-        self.setup_program_uniforms(self.program_orbit,view_matrix,projection_matrix,model_matrix)
-        
+        # View, projection and time for every program, written once per frame
+        self.camera_buffer = CameraBuffer()
+
         self.model_matrix = model_matrix
         self.view_matrix = view_matrix
         self.projection_matrix = projection_matrix
 
         #Create planets
 
-        sun = Sun("Sun", radius=5.0, spin_speed=math.radians(20))
-        sun.vao = vao_sun
-        sun.program = program_sun
-
-        earth = TexturedPlanet("Earth", radius=1.3,
-                orbit_radius=35.0,
-                orbit_speed=0.8,
-                spin_speed=1.8)
-        earth.vao = vao_planet
-        earth.orbit_angle = math.radians(0)
-        earth.program = program_textured
-
-        moon = TexturedPlanet("Moon", radius=0.27, orbit_radius=2.1, orbit_speed=2.0, parent=earth)
-        moon.vao = vao_planet
-        moon.orbit_angle = math.radians(0)
-        moon.program = program_textured
-
-        self.assignTextures(moon,"moon.jpg",None)
-
-
-        self.assignTextures(earth,"flat_earth.jpg",None)
-
-        mercury = TexturedPlanet("Mercury", radius=0.5,
-                orbit_radius=16.0,
-                orbit_speed=0.9,
-                spin_speed=2)
-        mercury.vao = vao_planet
-        mercury.orbit_angle = math.radians(20)
-        mercury.program = program_textured
-
-        self.assignTextures(mercury,"mercury.jpg",None)
-
-        venus = TexturedPlanet("Venus", radius=1.2,
-                orbit_radius=25.6,
-                orbit_speed=1,
-                spin_speed=-1.5)
-        venus.vao = vao_planet
-        venus.orbit_angle = math.radians(180)
-        venus.program = program_textured
-
-        self.assignTextures(venus,"venus.jpg",None)
-
-        mars = TexturedPlanet("Mars", radius=1.0,
-                orbit_radius=49.0,
-                orbit_speed=0.73,
-                spin_speed=2.1)
-        mars.vao = vao_planet
-        mars.orbit_angle = math.radians(100)
-        mars.program = program_textured
-
-        self.assignTextures(mars,"mars.jpg",None)
-
-        jupiter = TexturedPlanet("Jupiter", radius=3.0,
-                orbit_radius=63.0,
-                orbit_speed=0.06,
-                spin_speed=2.5)
-        jupiter.vao = vao_planet
-        jupiter.orbit_angle = math.radians(270)
-        jupiter.program = program_textured
-
-        self.assignTextures(jupiter,"jupiter.jpg",None)
-
-        saturn = TexturedPlanet("Saturn", radius=2.5,
-                orbit_radius=78.0,
-                orbit_speed=0.18,
-                spin_speed=2)
-        saturn.vao = vao_planet
-        saturn.orbit_angle = math.radians(200)
-        saturn.program = program_textured
-        saturn.rings_program = self.program_rings
-        saturn.rings = True
-
-        self.assignTextures(saturn,"saturn.jpg","saturn_ring.png")
-
-        uranus = Planet("Uranus", radius=1.7,
-                color_left=np.array([0.65, 0.85, 0.95]),
-                color_right=np.array([0.45, 0.75, 0.95]),
-                orbit_radius=95.0,
-                orbit_speed=0.1,
-                spin_speed=-2.3)
-        uranus.vao = vao_planet
-        uranus.orbit_angle = math.radians(90)
-        uranus.program = program
-
-        neptune = TexturedPlanet("Neptune", radius=1.6,
-                orbit_radius=120.0,
-                orbit_speed=0.08,
-                spin_speed=2.0)
-        neptune.vao = vao_planet
-        neptune.orbit_angle = math.radians(140)
-        neptune.program = program_textured
-
-        self.assignTextures(neptune,"neptune.jpg",None)
-
-        self.planets = [sun,earth,moon,mercury,venus,mars,jupiter,saturn,uranus,neptune]
+        self.planets = scene.create_planets()
+
+        # Planet maps resampled into one texture array, color planets get a generated gradient
+        layers = []
+        for p in self.planets:
+            if isinstance(p, Sun):
+                p.vao = vao_sun
+                p.lod_vaos = vaos_sun
+                p.program = program_sun
+                continue
+
+            p.texture_layer = len(layers)
+            if isinstance(p, TexturedPlanet):
+                layers.append(utility.load_image_qt("textures/"+p.texture_path, *PLANET_MAP_SIZE))
+                if p.ring_texture_path is not None:
+                    p.rings_program = self.program_rings
+                    self.assignRingTexture(p,p.ring_texture_path)
+            else:
+                layers.append(geometry.get_gradient_map(p.color_left, p.color_right, *PLANET_MAP_SIZE))
+
+        self.planet_maps = utility.create_texture_array(layers)
+        for sphere_program in (self.program_spheres, self.program_impostor):
+            sphere_program.use()
+            sphere_program.set_int("surfaces", PLANET_MAPS_UNIT)
+
+        # Per instance data of every body but the Sun, refilled each frame
+        # Ephemeris rows follow the planet order
+        self.sphere_bodies = np.array([i for i, p in enumerate(self.planets) if p.texture_layer is not None],
+                                      dtype=np.intp)
+        self.sphere_layers = np.array([-1 if p.texture_layer is None else p.texture_layer for p in self.planets],
+                                      dtype=np.float32)
+        self.sphere_instances = np.zeros((len(self.planets), SPHERE_INSTANCE_FLOATS), dtype=np.float32)
+        self.sphere_instance_vbo = glGenBuffers(1)
+        gl_state.bind_buffer(GL_ARRAY_BUFFER, self.sphere_instance_vbo)
+        glBufferData(GL_ARRAY_BUFFER, self.sphere_instances.nbytes, None, GL_STREAM_DRAW)
+        for vao in self.sphere_vaos:
+            self.setup_sphere_instances(self.program_spheres, vao)
+        self.setup_sphere_instances(self.program_impostor, self.impostor_vao)
+
+        self.ephemeris = Ephemeris.from_planets(self.planets)
+        self.registry = BodyRegistry.from_planets(self.planets)
+
+        # Every orbit around a fixed center in one buffer, rebuilt when the elements change
+        orbit_colors = np.tile(ORBIT_COLOR, (len(self.planets), 1))
+        self.orbit_lines = OrbitLines(program_orbit_lines, len(self.planets), orbit_colors)
+
+        # Minor bodies from an orbital element catalog, drawn as points
+        self.catalogs = []
+        if os.path.exists(CATALOG_FILE):
+            rows = catalog.populate(catalog.load(CATALOG_FILE), self.ephemeris, self.registry)
+            minor_bodies = catalog.CatalogBodies("Catalog", self.ephemeris, rows)
+            self.catalogs.append(minor_bodies)
+
+        # Precomputed positions from "python chebyshev.py", ignored when stale
+        self.ephemeris.cache = chebyshev.load_cache(EPHEMERIS_CACHE, self.ephemeris)
+        # Recorded trajectories (headless.py --format store) replace the models while covered
+        self.ephemeris.playback = trajectory.load_playback(TRAJECTORY_FILE, self.ephemeris)
+        self.ephemeris.update(self.clock.time)
+
+        # Rings and camera anchors hang off the bodies in the scene graph
+        ring_scales = {p.index: RING_SCALE for p in self.planets if p.rings}
+        self.scene_graph = SceneGraph.from_ephemeris(self.ephemeris, ring_scales, len(self.planets))
+
+        for minor_bodies in self.catalogs:
+            minor_bodies.vao, minor_bodies.vbo = self.setup_point_buffer(self.program_orbit,
+                                                                         minor_bodies.positions.astype(np.float32))
+
+        #Create asteroid belts between Mars and Jupiter and beyond Neptune
+
+        main_belt = AsteroidBelt("Main Belt", 100_000, inner_radius=52.0, outer_radius=60.0,
+                orbit_speed=0.3, thickness=0.6, size=0.08,
+                tint=np.array([0.62, 0.56, 0.50]), seed=1)
+
+        kuiper_belt = AsteroidBelt("Kuiper Belt", 200_000, inner_radius=130.0, outer_radius=175.0,
+                orbit_speed=0.04, thickness=3.0, size=0.15,
+                tint=np.array([0.55, 0.60, 0.70]), seed=2)
+
+        for belt in [main_belt, kuiper_belt]:
+            belt.program = program_belt
+            belt.vao, belt.offset_vbo = self.setup_instance_buffer(program_belt, belt.instances, belt.offsets)
+
+        self.belts = [main_belt, kuiper_belt]
+
+        # Point sizes come from the belt vertex shader
+        glEnable(GL_PROGRAM_POINT_SIZE)
+        glEnable(GL_POINT_SPRITE)
+
+        # Setup bound textures and programs directly, start tracking from scratch
+        gl_state.invalidate()
 
 
     def resizeGL(self, w, h):
@@ -809,6 +957,20 @@ class SolarSystemGL(QOpenGLWidget):
         painter.setPen(Qt.white)
         painter.drawText(int(centered_x),int(centered_y),mode_text)
 
+        clock_text = "Paused" if self.clock.paused else "x{:g}".format(self.clock.warp)
+
+        painter.setPen(Qt.black)
+        painter.drawText(11,int(centered_y)+1,clock_text)
+
+        painter.setPen(Qt.white)
+        painter.drawText(10,int(centered_y),clock_text)
+
+        if self.show_gl_stats:
+            calls, skipped = self.gl_stats
+            stats_text = "GL calls: {} ({} redundant skipped)".format(calls, skipped)
+            painter.setPen(Qt.white)
+            painter.drawText(10, text_height + 5, stats_text)
+
         if self.selectedPlanet is not None:
 
             painter.setFont(QFont("Arial", 20))
@@ -830,31 +992,53 @@ class SolarSystemGL(QOpenGLWidget):
 
 
         painter.end()
+        # QPainter changed GL state behind the tracker's back
+        gl_state.invalidate()
 
     def paintGL(self):
 
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-        glEnable(GL_DEPTH_TEST)
-        glDepthMask(GL_TRUE)
+        gl_state.enable(GL_BLEND)
+        gl_state.blend_func(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        gl_state.enable(GL_DEPTH_TEST)
+        gl_state.depth_mask(True)
 
         self.updateCamera()
 
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
-        current_time = time.time()
-        #delta_time = current_time - self.last_time
-        #self.last_time = current_time
-        
+        # Simulation time relative to the epoch, keeps float precision
+        self.clock.advance()
+        current_time = self.clock.time
+        self.camera_buffer.update(self.view_matrix, self.projection_matrix, current_time)
+
+        self.ephemeris.update(current_time)
+        self.scene_graph.sync(self.ephemeris)
+        self.update_particle_systems(current_time)
+        self.select_lods()
+        self.cull_scene()
 
         self.paint_background()
 
-        for p in self.planets:
-            self.draw_planet(p,current_time)
+        self.draw_planets()
+
+        for system in self.particle_systems:
+            self.draw_particles(system)
+
+        for minor_bodies in self.catalogs:
+            self.draw_particles(minor_bodies)
+
+        for belt in self.belts:
+            belt.update(current_time)
+            self.draw_belt(belt)
 
         #if self.ray_points is not None:
         #    self.draw_ray()
 
+        # QPainter needs the default vertex array and program
+        gl_state.bind_vertex_array(0)
+        gl_state.use_program(0)
+        self.gl_stats = gl_state.end_frame()
+
         self.writeText()
 
         
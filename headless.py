@@ -0,0 +1,93 @@
+import argparse
+import sys
+import numpy as np
+import scene
+import trajectory
+from ephemeris import Ephemeris
+
+CHUNK_SIZE = 1024       # time samples per chunk
+
+# One record per body and time sample in binary output
+RECORD = np.dtype([('time', '<f8'), ('body', '<i4'), ('position', '<f8', 3), ('velocity', '<f8', 3)])
+
+def trajectory_chunks(ephemeris: Ephemeris, start, end, step, chunk_size: int = CHUNK_SIZE):
+    """
+    Yield (times, positions, velocities) for [start, end] in chunks of at
+    most chunk_size samples, shapes (T,), (T,N,3) and (T,N,3).
+    Memory use depends on the chunk size only, not on the time range.
+    """
+    count = int(np.floor((end - start) / step + 1e-9)) + 1
+
+    for first in range(0, count, chunk_size):
+        # Computed from the start to avoid accumulating rounding errors
+        times = start + step * np.arange(first, min(first + chunk_size, count))
+        positions, velocities = ephemeris.states_at(times)
+        yield times, positions, velocities
+
+def to_records(times, positions, velocities):
+    """Flatten a chunk into body major records per time sample."""
+    bodies = positions.shape[1]
+    records = np.empty(len(times) * bodies, dtype=RECORD)
+    records['time'] = np.repeat(times, bodies)
+    records['body'] = np.tile(np.arange(bodies, dtype=np.int32), len(times))
+    records['position'] = positions.reshape(-1, 3)
+    records['velocity'] = velocities.reshape(-1, 3)
+    return records
+
+def write_csv(output, names, chunk):
+    """Write a chunk as CSV lines, formatted with one % over the whole chunk."""
+    records = to_records(*chunk)
+    table = np.empty((len(records), 8), dtype=object)
+    table[:, 0] = np.asarray(names, dtype=object)[records['body']]
+    table[:, 1:] = np.column_stack([records['time'], records['position'], records['velocity']]).tolist()
+
+    # %r keeps the shortest round trip representation of every float
+    line = "%s" + ",%r" * 7 + "\n"
+    output.write(line * len(table) % tuple(table.ravel().tolist()))
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream body trajectories without opening a window.")
+    parser.add_argument("--start", type=float, default=0.0, help="simulation seconds since the epoch")
+    parser.add_argument("--end", type=float, default=60.0, help="simulation seconds since the epoch")
+    parser.add_argument("--step", type=float, default=1.0, help="seconds between samples")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="time samples per chunk")
+    parser.add_argument("--format", choices=["csv", "binary", "store"], default="csv")
+    parser.add_argument("-o", "--output", default="-", help="output file, - for stdout")
+    args = parser.parse_args()
+
+    if args.step <= 0 or args.end < args.start:
+        parser.error("need step > 0 and end >= start")
+
+    ephemeris = Ephemeris.from_planets(scene.create_planets())
+
+    if args.format == "store":
+        # Columnar trajectory file that the renderer can play back
+        if args.output == "-":
+            parser.error("the store format needs an output file")
+        with trajectory.TrajectoryWriter(args.output, ephemeris.names, args.chunk_size) as writer:
+            for times, positions, _ in trajectory_chunks(ephemeris, args.start, args.end, args.step, args.chunk_size):
+                writer.write(times, positions)
+        return
+
+    binary = args.format == "binary"
+    if args.output == "-":
+        output = sys.stdout.buffer if binary else sys.stdout
+    else:
+        output = open(args.output, "wb" if binary else "w")
+
+    try:
+        if not binary:
+            output.write("name,time,x,y,z,vx,vy,vz\n")
+
+        for chunk in trajectory_chunks(ephemeris, args.start, args.end, args.step, args.chunk_size):
+            if binary:
+                output.write(to_records(*chunk).tobytes())
+            else:
+                write_csv(output, ephemeris.names, chunk)
+            output.flush()
+    finally:
+        if output not in (sys.stdout, sys.stdout.buffer):
+            output.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import numpy as np
+import geometry
+
+TOLERANCE = 0.5     # largest silhouette error in pixels
+HYSTERESIS = 0.25   # relative size change needed before switching back
+IMPOSTOR_PIXELS = 6.0   # bodies smaller than this radius are drawn as impostors
+
+def projected_radii(positions, radii, eye, projection_matrix, viewport_height):
+    """Radius in pixels of every sphere on screen, for a perspective projection."""
+    distance = np.linalg.norm(np.asarray(positions) - eye, axis=-1)
+    radii = np.asarray(radii)
+
+    # Half the viewport height in pixels per unit of tan(angle)
+    focal = projection_matrix[1, 1] * viewport_height / 2
+    inside = distance <= radii
+    tangent = radii / np.sqrt(np.where(inside, 1.0, distance ** 2 - radii ** 2))
+    return np.where(inside, np.inf, focal * tangent)
+
+def required_sectors(pixel_radii, tolerance=TOLERANCE):
+    """
+    Sectors needed so the polygon silhouette stays within tolerance pixels
+    of the true circle: r * (1 - cos(pi / sectors)) <= tolerance.
+    """
+    pixel_radii = np.asarray(pixel_radii, dtype=float)
+    ratio = np.clip(1.0 - tolerance / np.maximum(pixel_radii, 1e-9), -1.0, 1.0)
+    with np.errstate(divide='ignore'):
+        return np.pi / np.arccos(ratio)
+
+class LODSelector:
+    """
+    Picks a mesh level per body from its size on screen. A body moves to a
+    finer level as soon as it needs it, but only drops to a coarser one once
+    it shrank by the hysteresis margin, so levels do not flicker.
+    """
+
+    def __init__(self,
+                 lods=geometry.SPHERE_LODS,     # (stacks, sectors), coarse to fine
+                 tolerance: float = TOLERANCE,
+                 hysteresis: float = HYSTERESIS,
+                 impostor_pixels: float = IMPOSTOR_PIXELS
+                 ):
+        self.lods = list(lods)
+        self.sectors = np.array([sectors for _, sectors in self.lods])
+        self.tolerance = tolerance
+        self.hysteresis = hysteresis
+        self.impostor_pixels = impostor_pixels
+        self.levels = np.zeros(0, dtype=np.intp)
+        self.impostors = np.zeros(0, dtype=bool)     # ray-cast quad instead of a mesh
+
+    def level_for(self, pixel_radii):
+        """Coarsest level meeting the tolerance, without hysteresis."""
+        levels = np.searchsorted(self.sectors, required_sectors(pixel_radii, self.tolerance))
+        return np.minimum(levels, len(self.lods) - 1)
+
+    def select(self, positions, radii, eye, projection_matrix, viewport_height):
+        """Update and return the level of every body."""
+        pixels = projected_radii(positions, radii, eye, projection_matrix, viewport_height)
+
+        # Refine as soon as needed, keep a finer level while it would still be
+        # needed by a body larger by the hysteresis margin
+        needed = self.level_for(pixels)
+        kept = self.level_for(pixels * (1.0 + self.hysteresis))
+
+        if len(self.levels) != len(pixels):
+            self.levels = needed
+            self.impostors = pixels < self.impostor_pixels
+        else:
+            self.levels = np.clip(self.levels, needed, kept)
+            # Same margin between the impostor and the mesh
+            self.impostors = np.where(self.impostors, pixels < self.impostor_pixels * (1.0 + self.hysteresis),
+                                      pixels < self.impostor_pixels)
+        return self.levels
@@ -6,6 +6,9 @@ from PyQt5.QtGui import QKeySequence, QSurfaceFormat
 
 format = QSurfaceFormat()
 format.setSamples(4)  # 4x MSAA
+# Shaders are GLSL 3.30 with the compatibility built-ins
+format.setVersion(3, 3)
+format.setProfile(QSurfaceFormat.CompatibilityProfile)
 QSurfaceFormat.setDefaultFormat(format)
 
 app = QtWidgets.QApplication([])
@@ -0,0 +1,442 @@
+import time as wall_clock
+import numpy as np
+
+TREE_DEPTH = 16     # octree levels, 3 bits of the Morton code each
+LEAF_SIZE = 8       # bodies per leaf before a cell is subdivided
+GROUP_SIZE = 32     # target bodies sharing one interaction list
+MAX_RUNG = 8        # finest sub-step is max_step / 2**MAX_RUNG
+
+def brute_force_accelerations(positions, masses, G=1.0, softening=0.0, targets=None):
+    """
+    Direct O(N^2) gravity sum, used as reference for the tree code.
+    Returns the acceleration of every target body, shape (len(targets),3).
+    """
+    positions = np.asarray(positions, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    if targets is None:
+        targets = np.arange(len(positions))
+
+    acc = np.zeros((len(targets), 3))
+    eps2 = softening ** 2
+    chunk = max(1, 4_000_000 // max(len(positions), 1))
+
+    for start in range(0, len(targets), chunk):
+        t = targets[start:start + chunk]
+        d = positions[None, :, :] - positions[t][:, None, :]
+        r2 = np.einsum('ijk,ijk->ij', d, d) + eps2
+        # No self interaction
+        r2[np.arange(len(t)), t] = np.inf
+        weights = masses / (r2 * np.sqrt(r2))
+        acc[start:start + chunk] = G * np.einsum('ij,ijk->ik', weights, d)
+
+    return acc
+
+def _spread_bits(v):
+    """Insert two zero bits between each of the lower 21 bits."""
+    v = v & np.uint64(0x1fffff)
+    v = (v | (v << np.uint64(32))) & np.uint64(0x1f00000000ffff)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x1f0000ff0000ff)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x100f00f00f00f00f)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x10c30c30c30c30c3)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x1249249249249249)
+    return v
+
+def _expand_ranges(starts, counts):
+    """Concatenate arange(s, s+c) for every (s, c) pair without a Python loop."""
+    total = int(counts.sum())
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(starts - offsets, counts) + np.arange(total)
+
+class Octree:
+    """
+    Linear octree built from sorted Morton codes.
+    Every node owns a contiguous range of the sorted bodies, so mass and
+    center of mass come straight from prefix sums. Targets are walked in
+    groups that share one interaction list, built once per theta and kept
+    when the bodies are moved with refit().
+    """
+
+    def __init__(self, positions, masses, depth=TREE_DEPTH, leaf_size=LEAF_SIZE, group_size=GROUP_SIZE):
+        positions = np.asarray(positions, dtype=float)
+        masses = np.asarray(masses, dtype=float)
+        count = len(positions)
+
+        lower = positions.min(axis=0)
+        size = max(float((positions.max(axis=0) - lower).max()), 1e-12) * (1 + 1e-9)
+
+        cells = 2 ** depth
+        grid = np.clip((positions - lower) / size * cells, 0, cells - 1).astype(np.uint64)
+        codes = (_spread_bits(grid[:, 0]) << np.uint64(2)) | (_spread_bits(grid[:, 1]) << np.uint64(1)) | _spread_bits(grid[:, 2])
+
+        self.order = np.argsort(codes, kind='stable')
+        self.rank = np.empty(count, dtype=np.int64)
+        self.rank[self.order] = np.arange(count)
+        codes = codes[self.order]
+        self.positions = positions[self.order]
+        self.masses = masses[self.order]
+
+        # Prefix sums give every node its mass, see _update_centers for the center
+        mass_sum = np.concatenate([[0.0], np.cumsum(self.masses)])
+
+        starts, ends, levels = [], [], []
+        for level in range(depth + 1):
+            keys = codes >> np.uint64(3 * (depth - level))
+            level_starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+            level_ends = np.concatenate([level_starts[1:], [count]])
+            starts.append(level_starts)
+            ends.append(level_ends)
+            levels.append(level)
+            if np.all(level_ends - level_starts <= leaf_size):
+                break
+
+        offsets = np.cumsum([0] + [len(s) for s in starts])
+        self.start = np.concatenate(starts)
+        self.end = np.concatenate(ends)
+        self.size = np.concatenate([np.full(len(s), size / 2 ** l) for s, l in zip(starts, levels)])
+
+        counts = self.end - self.start
+        self.leaf = counts <= leaf_size
+        self.leaf[offsets[-2]:] = True
+
+        # Children of a node are the nodes one level down inside its range
+        self.child_start = np.zeros(len(self.start), dtype=np.int64)
+        self.child_count = np.zeros(len(self.start), dtype=np.int64)
+        for l in range(len(starts) - 1):
+            first = np.searchsorted(starts[l + 1], starts[l])
+            last = np.searchsorted(starts[l + 1], ends[l])
+            self.child_start[offsets[l]:offsets[l + 1]] = offsets[l + 1] + first
+            self.child_count[offsets[l]:offsets[l + 1]] = last - first
+
+        self.mass = mass_sum[self.end] - mass_sum[self.start]
+
+        # Targets are walked in groups of group_size consecutive bodies, close in Morton order
+        self.group_start = np.arange(0, count, group_size)
+        self.group_end = np.minimum(self.group_start + group_size, count)
+        self.group_of = np.arange(count) // group_size
+
+        self._lists = {}    # theta -> interaction lists, see interaction_lists
+        self._update_centers()
+
+    def refit(self, positions):
+        """
+        Move the bodies without rebuilding the tree. Cells and interaction
+        lists are kept, centers of mass follow the bodies. Meant for the
+        small drifts between the sub-steps of one integration step.
+        """
+        self.positions = np.asarray(positions, dtype=float)[self.order]
+        self._update_centers()
+
+    def _update_centers(self):
+        moment_sum = np.concatenate([np.zeros((1, 3)), np.cumsum(self.positions * self.masses[:, None], axis=0)])
+        safe_mass = np.where(self.mass > 0, self.mass, 1.0)
+
+        # Node centers and bodies in one table, sources of both kinds are evaluated together
+        nodes = len(self.start)
+        self.source_positions = np.empty((nodes + len(self.positions), 3))
+        self.source_positions[:nodes] = (moment_sum[self.end] - moment_sum[self.start]) / safe_mass[:, None]
+        self.source_positions[nodes:] = self.positions
+        self.source_masses = np.concatenate([self.mass, self.masses])
+        self.center = self.source_positions[:nodes]
+
+        # Bounding sphere of every group around its center of mass
+        group_mass = np.add.reduceat(self.masses, self.group_start)
+        self.group_center = np.add.reduceat(self.positions * self.masses[:, None], self.group_start)
+        self.group_center /= np.where(group_mass > 0, group_mass, 1.0)[:, None]
+        offset = self.positions - self.group_center[self.group_of]
+        self.group_radius = np.maximum.reduceat(np.sqrt(np.einsum('ij,ij->i', offset, offset)), self.group_start)
+
+    def interaction_lists(self, theta):
+        """
+        Sources acting on every group as (offsets, sources), sources of group
+        g are sources[offsets[g]:offsets[g+1]]. A source below the node count
+        is a node used as point mass, the others are bodies (rank + nodes).
+        A node is far enough when size / distance < theta for every body
+        of the group, so one walk serves all its bodies.
+        """
+        if theta in self._lists:
+            return self._lists[theta]
+
+        nodes = len(self.start)
+        far_group, far_node, near_group, near_node = [], [], [], []
+        group = np.arange(len(self.group_start))
+        node = np.zeros(len(group), dtype=np.int64)
+
+        while len(group):
+            d = self.center[node] - self.group_center[group]
+            distance = np.sqrt(np.einsum('ij,ij->i', d, d)) - self.group_radius[group]
+            # Nodes holding bodies of the group are always opened
+            overlap = (self.start[node] < self.group_end[group]) & (self.group_start[group] < self.end[node])
+            far = ~overlap & (self.size[node] < theta * distance)
+            far_group.append(group[far])
+            far_node.append(node[far])
+
+            # Leaves that are too close are summed body by body
+            near = ~far & self.leaf[node]
+            near_group.append(group[near])
+            near_node.append(node[near])
+
+            # Everything else is opened
+            opened = ~far & ~self.leaf[node]
+            open_nodes = node[opened]
+            child_counts = self.child_count[open_nodes]
+            group = np.repeat(group[opened], child_counts)
+            node = _expand_ranges(self.child_start[open_nodes], child_counts)
+
+        near_node = np.concatenate(near_node)
+        leaf_counts = self.end[near_node] - self.start[near_node]
+        source_group = np.concatenate(far_group + [np.repeat(np.concatenate(near_group), leaf_counts)])
+        sources = np.concatenate(far_node + [nodes + _expand_ranges(self.start[near_node], leaf_counts)])
+
+        order = np.argsort(source_group, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(source_group, minlength=len(self.group_start)))])
+        self._lists[theta] = offsets, sources[order]
+        return self._lists[theta]
+
+    def accelerations(self, theta=0.5, G=1.0, softening=0.0, targets=None):
+        """
+        Barnes-Hut acceleration of every target body, shape (len(targets),3).
+        A node is used as a point mass when size / distance < theta,
+        theta = 0 opens every node and reproduces the direct sum.
+        """
+        if targets is None:
+            targets = np.arange(len(self.positions))
+        ranks = self.rank[np.asarray(targets)]
+        offsets, sources = self.interaction_lists(theta)
+
+        # Targets of one group share its sources, only groups with targets are evaluated
+        group = self.group_of[ranks]
+        order = np.argsort(group, kind='stable')
+        used, first = np.unique(group[order], return_index=True)
+        bounds = np.append(first, len(order))
+
+        acc = np.zeros((len(ranks), 3))
+        for g, start, stop in zip(used, bounds[:-1], bounds[1:]):
+            rows = order[start:stop]
+            acc[rows] = self._group_accelerations(g, ranks[rows], sources[offsets[g]:offsets[g + 1]], softening)
+
+        return G * acc
+
+    def _group_accelerations(self, group, ranks, sources, softening):
+        """Every source on every target of a group as dense (targets, sources) blocks."""
+        # Relative to the group keeps the expanded distances accurate
+        center = self.group_center[group]
+        t = self.positions[ranks] - center
+        s = self.source_positions[sources] - center
+
+        # |s - t|^2 + eps^2 = [-2t, |t|^2 + eps^2, 1] . [s, 1, |s|^2] as one matrix product
+        a = np.empty((len(t), 5))
+        a[:, :3] = -2.0 * t
+        a[:, 3] = np.einsum('ij,ij->i', t, t) + softening ** 2
+        a[:, 4] = 1.0
+        b = np.empty((5, len(s)))
+        b[:3] = s.T
+        b[3] = 1.0
+        b[4] = np.einsum('ij,ij->i', s, s)
+        r2 = a @ b
+        np.maximum(r2, 0.0, out=r2)
+
+        # No self interaction, the group's own bodies are among its sources
+        nodes = len(self.start)
+        own = np.flatnonzero((sources >= nodes + self.group_start[group]) & (sources < nodes + self.group_end[group]))
+        column = np.full(self.group_end[group] - self.group_start[group], -1)
+        column[sources[own] - nodes - self.group_start[group]] = own
+        column = column[ranks - self.group_start[group]]
+        r2[np.flatnonzero(column >= 0), column[column >= 0]] = np.inf
+
+        w = np.sqrt(r2)
+        w *= r2
+        np.divide(self.source_masses[sources], w, out=w)
+
+        # Sum of w (s - t) from one product with [s, 1]
+        weighted = w @ b[:4].T
+        return weighted[:, :3] - weighted[:, 3:] * t
+
+def assign_rungs(velocities, accelerations, dt, eta=0.02, softening=0.0, max_rung=MAX_RUNG):
+    """
+    Pick a power-of-two sub-step level for every body.
+    The preferred step eta*|v|/|a| is one orbit period times eta/(2*pi)
+    for a circular orbit, so fast inner bodies land on finer rungs.
+    Only the length of dt matters, backward steps get the same rungs.
+    """
+    a = np.linalg.norm(accelerations, axis=1)
+    v = np.linalg.norm(velocities, axis=1)
+    preferred = eta * v / np.maximum(a, 1e-300)
+    if softening > 0:
+        preferred = np.minimum(preferred, eta * np.sqrt(softening / np.maximum(a, 1e-300)))
+
+    with np.errstate(divide='ignore'):
+        rungs = np.ceil(np.log2(abs(dt) / np.maximum(preferred, 1e-300)))
+    return np.clip(rungs, 0, max_rung).astype(np.int32)
+
+def barnes_hut_accelerations(positions, masses, theta=0.5, G=1.0, softening=0.0, targets=None):
+    """Build an octree and evaluate the Barnes-Hut accelerations in O(N log N)."""
+    return Octree(positions, masses).accelerations(theta, G, softening, targets)
+
+class ParticleSystem:
+    """
+    Free-flying bodies (spacecraft, debris, asteroid swarms) moved by
+    gravity instead of prescribed orbits. Drawn as points next to the planets.
+    The force evaluation scales as O(N log N) to 100k+ bodies, but on one
+    core a step costs about 0.1 s at 10k bodies and 2 s at 100k. Only
+    swarms of a few thousand bodies keep up with the clock at frame rate,
+    bigger ones take one step per update and fall behind it.
+    """
+
+    def __init__(self,
+                 name: str,
+                 positions: np.ndarray,
+                 velocities: np.ndarray,
+                 masses: np.ndarray,
+                 G: float = 1.0,
+                 softening: float = 0.05,
+                 theta: float = 0.5,
+                 central_mass: float = 0.0,   # fixed attractor at the origin (the Sun)
+                 max_step: float = 0.01,
+                 tree_threshold: int = 512,   # below this many bodies the direct sum is cheaper
+                 eta: float = 0.02,           # sub-step accuracy, smaller is finer
+                 max_rung: int = MAX_RUNG
+                 ):
+        self.name = name
+        self.positions = np.array(positions, dtype=float)
+        self.velocities = np.array(velocities, dtype=float)
+        self.masses = np.array(masses, dtype=float)
+        self.G = G
+        self.softening = softening
+        self.theta = theta
+        self.central_mass = central_mass
+        self.max_step = max_step
+        self.max_steps_per_update = 8
+        self.max_update_seconds = 0.05  # wall clock budget of one frame, at least one step is taken
+        self.tree_threshold = tree_threshold
+        self.eta = eta
+        self.max_rung = max_rung
+        self.rungs = np.zeros(len(self.positions), dtype=np.int32)
+        self.time = None
+
+        # Tree built at the start of a step and refitted after the sub-step drifts
+        self._tree = None
+        self._tree_stale = False
+        # Kick accelerations per rung, valid until the next drift
+        self._kicks = {}
+        # Accelerations at the end of the last step and the positions they belong to
+        self._end_accelerations = None
+        self._end_positions = None
+
+        self.vao = None
+        self.vbo = None
+        self.point_size = 2.0
+
+    def __len__(self):
+        return len(self.positions)
+
+    def accelerations(self, targets=None):
+        """Mutual gravity plus the central attractor for the target bodies."""
+        if len(self) < self.tree_threshold:
+            acc = brute_force_accelerations(self.positions, self.masses, self.G, self.softening, targets)
+        else:
+            if self._tree is None:
+                self._tree = Octree(self.positions, self.masses)
+            elif self._tree_stale:
+                self._tree.refit(self.positions)
+            self._tree_stale = False
+            acc = self._tree.accelerations(self.theta, self.G, self.softening, targets)
+
+        if self.central_mass:
+            r = self.positions if targets is None else self.positions[targets]
+            r2 = np.einsum('ij,ij->i', r, r) + self.softening ** 2
+            acc -= self.G * self.central_mass * r / (r2 * np.sqrt(r2))[:, None]
+
+        return acc
+
+    def energy(self):
+        """Total kinetic plus potential energy, used to check the integrator."""
+        kinetic = 0.5 * np.sum(self.masses * np.einsum('ij,ij->i', self.velocities, self.velocities))
+
+        d = self.positions[:, None, :] - self.positions[None, :, :]
+        r = np.sqrt(np.einsum('ijk,ijk->ij', d, d) + self.softening ** 2)
+        np.fill_diagonal(r, np.inf)
+        potential = -0.5 * self.G * np.sum(self.masses[:, None] * self.masses[None, :] / r)
+
+        if self.central_mass:
+            r = np.sqrt(np.einsum('ij,ij->i', self.positions, self.positions) + self.softening ** 2)
+            potential -= self.G * self.central_mass * np.sum(self.masses / r)
+
+        return kinetic + potential
+
+    def step(self, dt):
+        """
+        Advance one multirate kick-drift-kick leapfrog step.
+        Every body is kicked on its own power-of-two sub-step (its rung),
+        while all bodies stay synchronized at the end of the step.
+        """
+        self._tree = None
+        if self._end_positions is not None and np.array_equal(self._end_positions, self.positions):
+            # The closing kicks of the last step ran at these positions
+            acc = self._end_accelerations
+        else:
+            acc = self.accelerations()
+        self.rungs = assign_rungs(self.velocities, acc, dt, self.eta, self.softening, self.max_rung)
+
+        # Every kick before the first drift reuses these
+        self._kicks = {rung: acc[self.rungs == rung] for rung in np.unique(self.rungs)}
+        self._substep(0, dt)
+
+        # After the last drift every rung kicked once more, together that is a full evaluation
+        self._end_accelerations = np.empty_like(self.positions)
+        for rung, kick in self._kicks.items():
+            self._end_accelerations[self.rungs == rung] = kick
+        self._end_positions = self.positions.copy()
+        self._kicks = {}
+
+    def _kick_accelerations(self, rung, active):
+        # The closing kick of a sub-step and the opening kick of the next share positions
+        if rung not in self._kicks:
+            self._kicks[rung] = self.accelerations(active)
+        return self._kicks[rung]
+
+    def _substep(self, rung, dt):
+        active = np.flatnonzero(self.rungs == rung)
+
+        if len(active):
+            self.velocities[active] += 0.5 * dt * self._kick_accelerations(rung, active)
+
+        if np.any(self.rungs > rung):
+            self._substep(rung + 1, 0.5 * dt)
+            self._substep(rung + 1, 0.5 * dt)
+        else:
+            # Drifts only happen on the finest rung in use
+            self.positions += dt * self.velocities
+            self._kicks = {}
+            self._tree_stale = True
+
+        if len(active):
+            self.velocities[active] += 0.5 * dt * self._kick_accelerations(rung, active)
+
+    def update(self, time: float, deadline: float = None):
+        """
+        Integrate towards the given time in steps no longer than max_step.
+        Meant to be called once per frame. At most max_steps_per_update
+        steps, and no more once the deadline (a perf_counter time, by
+        default max_update_seconds from now) has passed, are taken per
+        call. The rest of the interval is carried over, so self.time is
+        always the time the bodies were actually integrated to.
+        """
+        if self.time is None:
+            self.time = time
+            return
+
+        elapsed = time - self.time
+        steps = int(np.ceil(abs(elapsed) / self.max_step))
+        if deadline is None:
+            deadline = wall_clock.perf_counter() + self.max_update_seconds
+        taken = 0
+        while taken < min(steps, self.max_steps_per_update):
+            self.step(elapsed / steps)
+            taken += 1
+            if wall_clock.perf_counter() > deadline:
+                break
+
+        if taken == steps:
+            self.time = time
+        else:
+            self.time += taken * (elapsed / steps)
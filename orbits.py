@@ -0,0 +1,118 @@
+import numpy as np
+from OpenGL.GL import *
+from glstate import state as gl_state
+from ephemeris import ELEMENTS, hierarchy_levels
+
+ORBIT_SEGMENTS = 128    # line segments per orbit path
+VERTEX_FLOATS = 7       # position xyz, color rgba
+
+def fixed_bodies(parent, semi_major_axis):
+    """True for bodies that never move: no orbit and no moving parent."""
+    fixed = np.zeros(len(parent), dtype=bool)
+    for level in hierarchy_levels(parent):
+        fixed_parent = np.where(parent[level] >= 0, fixed[parent[level]], True)
+        fixed[level] = fixed_parent & (semi_major_axis[level] == 0)
+    return fixed
+
+def static_orbits(ephemeris, count=None):
+    """
+    Indices of the first count bodies whose orbit path stays put in world
+    space, i.e. bodies orbiting the origin or a body that never moves.
+    The parents of these bodies must be among the first count as well.
+    """
+    count = len(ephemeris) if count is None else count
+    parent = ephemeris.parent[:count]
+    semi_major_axis = ephemeris.semi_major_axis[:count]
+    fixed = fixed_bodies(parent, semi_major_axis)
+    fixed_parent = np.where(parent >= 0, fixed[parent], True)
+    return np.flatnonzero(fixed_parent & (semi_major_axis > 0))
+
+def orbit_path_vertices(ephemeris, bodies, colors, segments: int = ORBIT_SEGMENTS):
+    """
+    Closed world space paths of the given bodies as one interleaved float32
+    array, shape (len(bodies) * (segments + 1), VERTEX_FLOATS). The paths
+    are sampled evenly in eccentric anomaly, which puts more vertices where
+    an eccentric orbit bends the most.
+    """
+    a = ephemeris.semi_major_axis[bodies][:, None]
+    e = ephemeris.eccentricity[bodies][:, None]
+    E = np.linspace(0.0, 2 * np.pi, segments + 1)[None, :]
+
+    # Static parents sit at the origin, so parent relative is world space
+    x = a * (np.cos(E) - e)
+    y = a * np.sqrt(1.0 - e ** 2) * np.sin(E)
+    positions = x[..., None] * ephemeris.P[bodies][:, None] + y[..., None] * ephemeris.Q[bodies][:, None]
+
+    vertices = np.empty((len(bodies), segments + 1, VERTEX_FLOATS), dtype=np.float32)
+    vertices[..., :3] = positions
+    vertices[..., 3:] = np.asarray(colors, dtype=np.float32)[:, None]
+    return vertices.reshape(-1, VERTEX_FLOATS)
+
+class OrbitLines:
+    """
+    Orbit paths of every body with a fixed center baked into one world
+    space vertex buffer, drawn with a single glMultiDrawArrays. The buffer
+    is rebuilt only when the elements of the first count bodies change,
+    so catalog rows further down the ephemeris never trigger a rebuild.
+    Bodies orbiting a moving parent have no fixed path and are left out.
+    """
+
+    def __init__(self, program, count: int, colors, segments: int = ORBIT_SEGMENTS):
+        self.program = program
+        self.count = count                  # leading ephemeris rows considered
+        self.colors = np.asarray(colors)    # rgba per body, shape (count, 4)
+        self.segments = segments
+        self.bodies = np.zeros(0, dtype=np.intp)
+        self.first = np.zeros(0, dtype=np.int32)
+        self.counts = np.zeros(0, dtype=np.int32)
+        self._version = None
+        self._elements = None
+
+        self.vao = glGenVertexArrays(1)
+        self.vbo = glGenBuffers(1)
+        gl_state.bind_vertex_array(self.vao)
+        gl_state.bind_buffer(GL_ARRAY_BUFFER, self.vbo)
+
+        stride = VERTEX_FLOATS * 4
+        for name, size, offset in (("position", 3, 0), ("color", 4, 3 * 4)):
+            loc = program.attribute(name)
+            glEnableVertexAttribArray(loc)
+            glVertexAttribPointer(loc, size, GL_FLOAT, False, stride, ctypes.c_void_p(offset))
+
+        gl_state.bind_vertex_array(0)
+
+    def update(self, ephemeris):
+        """Rebuild the paths if the orbital elements changed since the last call."""
+        if ephemeris.version == self._version:
+            return
+        self._version = ephemeris.version
+
+        # Something changed, but maybe only further down the table
+        elements = [getattr(ephemeris, name)[:self.count].copy() for name in ELEMENTS]
+        if self._elements is not None and all(map(np.array_equal, elements, self._elements)):
+            return
+        self._elements = elements
+
+        self.bodies = static_orbits(ephemeris, self.count)
+        vertices = orbit_path_vertices(ephemeris, self.bodies, self.colors[self.bodies], self.segments)
+
+        stride = self.segments + 1
+        self.first = (np.arange(len(self.bodies)) * stride).astype(np.int32)
+        self.counts = np.full(len(self.bodies), stride, dtype=np.int32)
+
+        gl_state.bind_buffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
+
+    def draw(self, visible=None):
+        """Draw the orbits of the bodies flagged in visible (all by default)."""
+        if visible is None:
+            first, counts = self.first, self.counts
+        else:
+            shown = visible[self.bodies]
+            first, counts = self.first[shown], self.counts[shown]
+        if len(first) == 0:
+            return
+
+        self.program.use()
+        gl_state.bind_vertex_array(self.vao)
+        glMultiDrawArrays(GL_LINE_STRIP, first, counts, len(first))
@@ -0,0 +1,80 @@
+import copy
+import os
+import numpy as np
+from multiprocessing import Pool
+from multiprocessing import shared_memory
+from ephemeris import Ephemeris
+
+CHUNK_SIZE = 256        # time samples per task
+
+# Set in every worker process by _init_worker
+_worker = None
+
+def _init_worker(ephemeris, memory_name, times_name, shape):
+    global _worker
+    _worker = (ephemeris, memory_name, times_name, shape)
+
+def _run_chunk(bounds):
+    ephemeris, memory_name, times_name, shape = _worker
+    start, stop = bounds
+
+    # Attached per chunk so every handle is closed again
+    memory = shared_memory.SharedMemory(name=memory_name)
+    times_memory = shared_memory.SharedMemory(name=times_name)
+    try:
+        output = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+        times = np.ndarray(shape[:1], dtype=np.float64, buffer=times_memory.buf)
+        ephemeris.positions_at(times[start:stop], out=output[start:stop])
+        # The views must be gone before the buffers can be released
+        del output, times
+    finally:
+        memory.close()
+        times_memory.close()
+    return stop - start
+
+def generate_positions(ephemeris: Ephemeris, times, processes: int = None, chunk_size: int = CHUNK_SIZE, out=None):
+    """
+    World position of every body at every time, shape (T,N,3).
+    Time chunks are spread over a process pool. Workers write straight
+    into a shared memory block, so only chunk bounds travel through pipes.
+    The result is copied out of that block, which needs memory for the
+    result twice; pass out (e.g. a memory mapped array) to copy into it
+    instead of a new array.
+    """
+    times = np.ascontiguousarray(times, dtype=np.float64)
+    shape = (len(times), len(ephemeris), 3)
+    processes = processes or os.cpu_count()
+
+    if processes <= 1 or len(times) <= chunk_size:
+        if out is None:
+            return ephemeris.positions_at(times)
+        return ephemeris.positions_at(times, out=out)
+
+    # Workers only need the analytic elements, not a memory mapped cache or recording
+    ephemeris = copy.copy(ephemeris)
+    ephemeris.cache = None
+    ephemeris.playback = None
+
+    memory = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * 8))
+    times_memory = shared_memory.SharedMemory(create=True, size=max(1, times.nbytes))
+    try:
+        np.ndarray(times.shape, dtype=np.float64, buffer=times_memory.buf)[:] = times
+
+        bounds = [(start, min(start + chunk_size, len(times))) for start in range(0, len(times), chunk_size)]
+        with Pool(processes, initializer=_init_worker,
+                  initargs=(ephemeris, memory.name, times_memory.name, shape)) as pool:
+            for _ in pool.imap_unordered(_run_chunk, bounds):
+                pass
+
+        result = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+        if out is None:
+            out = result.copy()
+        else:
+            out[:] = result
+        del result
+        return out
+    finally:
+        memory.close()
+        memory.unlink()
+        times_memory.close()
+        times_memory.unlink()
@@ -1,5 +1,8 @@
 import numpy as np
 from OpenGL.GL import *
+import geometry
+from glstate import state as gl_state
+from ephemeris import perifocal_basis, orbit_states
 
 class Planet:
     def __init__(self,
@@ -10,129 +13,160 @@ class Planet:
                  spin_speed: float = 0.0,
                  color_left: np.ndarray = np.array([1.0, 1.0, 0.0]),   # horizontal gradient start
                  color_right: np.ndarray = np.array([1.0, 0.5, 0.0]),  # vertical gradient bright
-                 parent: 'Planet' = None 
+                 parent: 'Planet' = None,
+                 eccentricity: float = 0.0,
+                 inclination: float = 0.0,         # radians
+                 ascending_node: float = 0.0,      # radians
+                 argument_periapsis: float = 0.0   # radians
                  ):
         self.name = name
         self.radius = radius
-        self.orbit_radius = orbit_radius
+        self.orbit_radius = orbit_radius    # semi-major axis
         self.orbit_speed = orbit_speed      # radians per second
+        self.eccentricity = eccentricity
+        self.inclination = inclination
+        self.ascending_node = ascending_node
+        self.argument_periapsis = argument_periapsis
         self.spin_speed = spin_speed        # radians per second
         self.color_left = color_left
         self.color_right = color_right
         self.vao = None
+        self.lod_vaos = None     # one vao per geometry.SPHERE_LODS level
+        self.texture_layer = None   # layer in the planet map array of the renderer
         self.program = None
         self.parent = parent
         self.rings = False
 
-        # Current angles for orbit and spin
+        # Shared ephemeris table, see attach()
+        self.ephemeris = None
+        self.index = None
+
+        # Orbit angle (mean anomaly) at time 0 and current spin
         self.orbit_angle = 0.0
-        self.spin_angle = 0.0
+        self._spin_angle = 0.0
 
         # Current position in world space
-        self.position = np.array([self.orbit_radius, 0.0, 0.0], dtype=float)
-        self.previous_position = np.array([self.orbit_radius, 0.0, 0.0], dtype=float)
-        self.time = 0.0
+        self._position = np.array([self.orbit_radius, 0.0, 0.0], dtype=float)
+        self._velocity = np.zeros(3)
+        self._time = 0.0
+
+    def attach(self, ephemeris, index):
+        """Read position, spin and time from a row of a shared Ephemeris."""
+        self.ephemeris = ephemeris
+        self.index = index
+
+    @property
+    def position(self):
+        if self.ephemeris is not None:
+            return self.ephemeris.positions[self.index]
+        return self._position
+
+    @position.setter
+    def position(self, value):
+        self._position = value
+
+    @property
+    def velocity(self):
+        if self.ephemeris is not None:
+            return self.ephemeris.velocities[self.index]
+        return self._velocity
+
+    @velocity.setter
+    def velocity(self, value):
+        self._velocity = value
+
+    @property
+    def spin_angle(self):
+        if self.ephemeris is not None:
+            return self.ephemeris.spin_angles[self.index]
+        return self._spin_angle
+
+    @spin_angle.setter
+    def spin_angle(self, value):
+        self._spin_angle = value
+
+    @property
+    def time(self):
+        if self.ephemeris is not None:
+            return self.ephemeris.time
+        return self._time
+
+    @time.setter
+    def time(self, value):
+        self._time = value
 
     def update(self, time: float):
-        """Update orbit and spin angles based on elapsed time."""
-        self.orbit_angle = self.orbit_speed * time
+        """
+        Update orbit and spin angles based on elapsed time.
+        Only used for planets that are not attached to an Ephemeris.
+        """
+        mean_anomaly = self.orbit_angle + self.orbit_speed * time
         self.spin_angle = self.spin_speed * time
 
         # Update planet position based on orbit
-        x = self.orbit_radius * np.cos(self.orbit_angle)
-        z = self.orbit_radius * np.sin(self.orbit_angle)
-        local_position = np.array([x, 0.0, z])
+        P, Q = perifocal_basis(self.inclination, self.ascending_node, self.argument_periapsis)
+        local_position, local_velocity = orbit_states(np.array([self.orbit_radius]), np.array([self.eccentricity]),
+                                                      P[None], Q[None], np.array([mean_anomaly]),
+                                                      np.array([self.orbit_speed]))
 
         if self.parent is not None:
-            self.previous_position = self.position
-            self.position = self.parent.position + local_position
+            self.position = self.parent.position + local_position[0]
+            self.velocity = self.parent.velocity + local_velocity[0]
         else:
-            self.previous_position = self.position
-            self.position = local_position
+            self.position = local_position[0]
+            self.velocity = local_velocity[0]
 
         self.time = time
 
     def get_model_matrix(self):
         """Return a model matrix for rendering this planet (numpy 4x4)."""
-        # Translation
-        T = np.identity(4)
-        T[:3, 3] = self.position
-
-        # Scaling
-        S = np.identity(4)
-        S[0, 0] = self.radius
-        S[1, 1] = self.radius
-        S[2, 2] = self.radius
-
-        # Spin rotation around Y
-        cos_a = np.cos(self.spin_angle)
-        sin_a = np.sin(self.spin_angle)
-        R = np.identity(4)
-        R[0, 0] = cos_a
-        R[0, 2] = sin_a
-        R[2, 0] = -sin_a
-        R[2, 2] = cos_a
-
-        # Model matrix: Translation * Rotation * Scale
-        model = T @ R @ S
-        return model
-    
+        if self.ephemeris is not None:
+            # View into the batched column-major buffer
+            return self.ephemeris.model_matrices[self.index].T
+
+        return geometry.get_model_matrices([self.position], [self.spin_angle], [self.radius])[0].T
+
     def get_ring_model_matrix(self,scale):
-        # Translation
-        T = np.identity(4)
-        T[:3, 3] = self.position
-
-        # Scaling
-        S = np.identity(4)
-        S[0, 0] = self.radius * scale
-        S[1, 1] = self.radius * scale
-        S[2, 2] = self.radius * scale
-
-        # Spin rotation around Y
-        cos_a = np.cos(self.spin_angle)
-        sin_a = np.sin(self.spin_angle)
-        R = np.identity(4)
-        R[0, 0] = cos_a
-        R[0, 2] = sin_a
-        R[2, 0] = -sin_a
-        R[2, 2] = cos_a
-
-        # Model matrix: Translation * Rotation * Scale
-        model = T @ R @ S
-        return model
-    
-    def get_velocity_vector(self):
+        return geometry.get_model_matrices([self.position], [self.spin_angle], [self.radius * scale])[0].T
 
-        vector = self.position - self.previous_position
-        normalized = vector / np.linalg.norm(vector)
+    def get_velocity_vector(self):
+        """Unit direction of motion, or +Z for bodies that do not move."""
+        vector = self.velocity
+        length = np.linalg.norm(vector)
+        if length < 1e-12:
+            return np.array([0.0, 0.0, 1.0])
 
-        return normalized
+        return vector / length
 
-    def update_uniforms(self):
+    def update_uniforms(self, program=None):
         """
         Update the shader uniforms for this planet.
-        Assumes shader_program is bound.
+        Assumes the program (by default self.program) is bound.
         """
-        # Colors
-        color_left_loc = glGetUniformLocation(self.program, "color_left")
-        color_right_loc = glGetUniformLocation(self.program, "color_right")
+        program = program or self.program
 
-        glUniform3fv(color_left_loc, 1, self.color_left)
-        glUniform3fv(color_right_loc, 1, self.color_right)
+        # Colors
+        program.set_vec3("color_left", self.color_left)
+        program.set_vec3("color_right", self.color_right)
 
 class Sun(Planet):
     def __init__(self, name, radius=1.0, orbit_radius=0.0, orbit_speed=0.0, spin_speed=0.0):
         super().__init__(name, radius, orbit_radius, orbit_speed, spin_speed)
         
 
-    def update_uniforms(self):
-        time_loc = glGetUniformLocation(self.program, "time")
-        glUniform1f(time_loc,self.time)
+    def update_uniforms(self, program=None):
+        # The Sun shader reads the time from the camera block
+        pass
 
 class TexturedPlanet(Planet):
-    def __init__(self, name, radius=1.0, orbit_radius=0.0, orbit_speed=0.0, spin_speed=0.0, parent: 'Planet' = None ):
-        super().__init__(name, radius, orbit_radius, orbit_speed, spin_speed, parent=parent)
-
+    def __init__(self, name, radius=1.0, orbit_radius=0.0, orbit_speed=0.0, spin_speed=0.0, parent: 'Planet' = None,
+                 eccentricity=0.0, inclination=0.0, ascending_node=0.0, argument_periapsis=0.0):
+        super().__init__(name, radius, orbit_radius, orbit_speed, spin_speed, parent=parent,
+                         eccentricity=eccentricity, inclination=inclination,
+                         ascending_node=ascending_node, argument_periapsis=argument_periapsis)
+
+        self.texture_path = None
+        self.ring_texture_path = None
         self.texture_unit = None
         self.texture_id = None
         self.ring_texture_id = None
@@ -140,32 +174,17 @@ class TexturedPlanet(Planet):
         self.rings_program = None
         
 
-    def update_uniforms(self):
-        #time_loc = glGetUniformLocation(shader_program, "time")
-        #glUniform1f(time_loc,self.time)
+    def update_uniforms(self, program=None):
+        gl_state.bind_texture(self.texture_unit, GL_TEXTURE_2D, self.texture_id)
 
-        glActiveTexture(GL_TEXTURE0 + self.texture_unit)
-        glBindTexture(GL_TEXTURE_2D, self.texture_id)  
-
-        uTexture_loc = glGetUniformLocation(self.program, "texture")
-        glUniform1i(uTexture_loc, self.texture_unit)
+        (program or self.program).set_int("surface", self.texture_unit)
 
     def update_ring_uniforms(self):
-        glActiveTexture(GL_TEXTURE0 + self.ring_texture_unit)
-        glBindTexture(GL_TEXTURE_2D, self.ring_texture_id) 
-
-        uTexture_loc = glGetUniformLocation(self.rings_program, "texture")
-        glUniform1i(uTexture_loc, self.ring_texture_unit)
-
-        uInner_loc = glGetUniformLocation(self.rings_program,"inner_radius")
-        glUniform1f(uInner_loc,1)
-
-        uInner_loc = glGetUniformLocation(self.rings_program,"outer_radius")
-        glUniform1f(uInner_loc,2)
-
-        uPlanetRadius_loc = glGetUniformLocation(self.rings_program,"planetRadius")
-        glUniform1f(uPlanetRadius_loc,self.radius)
+        gl_state.bind_texture(self.ring_texture_unit, GL_TEXTURE_2D, self.ring_texture_id)
 
-        uPlanetCenter_loc = glGetUniformLocation(self.rings_program,"planetCenter")
-        glUniform3fv(uPlanetCenter_loc,1,self.position)
+        self.rings_program.set_int("surface", self.ring_texture_unit)
+        self.rings_program.set_float("inner_radius", 1)
+        self.rings_program.set_float("outer_radius", 2)
+        self.rings_program.set_float("planetRadius", self.radius)
+        self.rings_program.set_vec3("planetCenter", self.position)
 
@@ -0,0 +1,181 @@
+import numpy as np
+
+# Body kinds
+STAR = 0
+PLANET = 1
+MOON = 2
+MINOR = 3       # asteroids, comets and other catalog bodies
+
+NAME_LENGTH = 24
+
+def encode_name(name):
+    """UTF-8 name cut to NAME_LENGTH bytes on a character boundary."""
+    return name.encode("utf-8")[:NAME_LENGTH].decode("utf-8", errors="ignore").encode("utf-8")
+
+def encode_names(names):
+    """
+    encode_name for a whole array of names at once, str or UTF-8 bytes.
+    Returns an S{NAME_LENGTH} array.
+    """
+    names = np.asarray(names)
+    if names.dtype.kind != 'S':
+        names = np.char.encode(names.astype(str), "utf-8")
+    if len(names) == 0:
+        return np.zeros(0, dtype=f'S{NAME_LENGTH}')
+
+    # One byte more than kept shows whether the cut splits a character
+    width = NAME_LENGTH + 1
+    raw = np.ascontiguousarray(names.astype(f'S{max(width, names.dtype.itemsize)}'))
+    data = raw.view(np.uint8).reshape(len(raw), -1)[:, :width].copy()
+
+    # Continuation bytes look like 10xxxxxx, a character starts at any other byte
+    starts = (data[:, :NAME_LENGTH] & 0xC0) != 0x80
+    last_start = NAME_LENGTH - 1 - np.argmax(starts[:, ::-1], axis=1)
+    split = (data[:, NAME_LENGTH] & 0xC0) == 0x80
+    cut = np.where(split, last_start, NAME_LENGTH)
+
+    data[np.arange(width) >= cut[:, None]] = 0
+    return np.ascontiguousarray(data[:, :NAME_LENGTH]).view(f'S{NAME_LENGTH}').ravel()
+
+class Body:
+    """Lightweight handle to one row of a BodyRegistry."""
+    __slots__ = ('registry', 'index')
+
+    def __init__(self, registry, index):
+        self.registry = registry
+        self.index = index
+
+    @property
+    def name(self):
+        return self.registry.names[self.index].decode("utf-8")
+
+    @property
+    def id(self):
+        return int(self.registry.ids[self.index])
+
+    @property
+    def kind(self):
+        return int(self.registry.kind[self.index])
+
+    @property
+    def radius(self):
+        return float(self.registry.radius[self.index])
+
+    @property
+    def parent(self):
+        parent = self.registry.parent[self.index]
+        return None if parent < 0 else Body(self.registry, int(parent))
+
+    def children(self):
+        return [Body(self.registry, int(i)) for i in self.registry.children(self.index)]
+
+    def __eq__(self, other):
+        return isinstance(other, Body) and other.registry is self.registry and other.index == self.index
+
+    def __hash__(self):
+        return hash((id(self.registry), self.index))
+
+    def __repr__(self):
+        return f"Body({self.name!r}, id={self.id})"
+
+class BodyRegistry:
+    """
+    Typed arrays describing every body, about 40 bytes per body.
+    Row indices match the Ephemeris rows. Name, ID, kind and parent
+    indexes are built on first use and dropped whenever bodies are added.
+    """
+
+    def __init__(self):
+        self.names = np.zeros(0, dtype=f"S{NAME_LENGTH}")   # utf-8, truncated
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.kind = np.zeros(0, dtype=np.int8)
+        self.parent = np.zeros(0, dtype=np.int32)           # -1 for bodies without parent
+        self.radius = np.zeros(0, dtype=np.float32)
+
+        self._by_name = None
+        self._by_id = None
+        self._by_kind = {}
+        self._children = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        return Body(self, index % len(self))
+
+    def add_bodies(self, names, kind, parent=-1, radius=1.0, ids=None):
+        """Append bodies and return their indices. IDs default to the row index."""
+        count = len(names)
+        start = len(self)
+
+        def column(values, dtype):
+            return np.broadcast_to(np.asarray(values, dtype=dtype), (count,)).copy()
+
+        if ids is None:
+            ids = np.arange(start, start + count)
+
+        self.names = np.concatenate([self.names, encode_names(names)])
+        self.ids = np.concatenate([self.ids, column(ids, np.int64)])
+        self.kind = np.concatenate([self.kind, column(kind, np.int8)])
+        self.parent = np.concatenate([self.parent, column(parent, np.int32)])
+        self.radius = np.concatenate([self.radius, column(radius, np.float32)])
+
+        self._by_name = None
+        self._by_id = None
+        self._by_kind = {}
+        self._children = None
+        return np.arange(start, start + count)
+
+    @classmethod
+    def from_planets(cls, planets):
+        """Registry for the scene bodies, in the same order as Ephemeris.from_planets."""
+        from planet import Sun
+
+        index_of = {id(p): i for i, p in enumerate(planets)}
+        kinds = [STAR if isinstance(p, Sun) else MOON if p.parent is not None else PLANET for p in planets]
+        parents = [-1 if p.parent is None else index_of[id(p.parent)] for p in planets]
+
+        registry = cls()
+        registry.add_bodies([p.name for p in planets], kinds, parents, [p.radius for p in planets])
+        return registry
+
+    def index_of_name(self, name):
+        """Row of a body by name, or None."""
+        if self._by_name is None:
+            self._by_name = {name: i for i, name in enumerate(self.names.tolist())}
+        return self._by_name.get(encode_name(name))
+
+    def index_of_id(self, body_id):
+        """Row of a body by ID, or None."""
+        if self._by_id is None:
+            self._by_id = dict(zip(self.ids.tolist(), range(len(self))))
+        return self._by_id.get(body_id)
+
+    def by_name(self, name):
+        index = self.index_of_name(name)
+        return None if index is None else Body(self, index)
+
+    def by_id(self, body_id):
+        index = self.index_of_id(body_id)
+        return None if index is None else Body(self, index)
+
+    def of_kind(self, *kinds):
+        """Sorted rows of every body of the given kinds."""
+        key = tuple(sorted(kinds))
+        if key not in self._by_kind:
+            self._by_kind[key] = np.flatnonzero(np.isin(self.kind, key))
+        return self._by_kind[key]
+
+    def children(self, index):
+        """Rows of the direct children of a body."""
+        if self._children is None:
+            # Rows grouped by parent, parents without children get empty ranges
+            order = np.argsort(self.parent, kind='stable')
+            counts = np.bincount(self.parent[self.parent >= 0], minlength=len(self))
+            roots = np.count_nonzero(self.parent < 0)
+            self._children = (order[roots:], np.concatenate([[0], np.cumsum(counts)]))
+
+        rows, offsets = self._children
+        return rows[offsets[index]:offsets[index + 1]]
@@ -0,0 +1,79 @@
+import math
+import numpy as np
+from planet import Planet
+from planet import Sun
+from planet import TexturedPlanet
+
+def create_planets():
+    """
+    Create the bodies of the solar system scene.
+    No GL resources are touched, so the same bodies can be used by the
+    renderer and by offline tools.
+    """
+
+    sun = Sun("Sun", radius=5.0, spin_speed=math.radians(20))
+
+    earth = TexturedPlanet("Earth", radius=1.3,
+            orbit_radius=35.0,
+            orbit_speed=0.8,
+            spin_speed=1.8)
+    earth.orbit_angle = math.radians(0)
+    earth.texture_path = "flat_earth.jpg"
+
+    moon = TexturedPlanet("Moon", radius=0.27, orbit_radius=2.1, orbit_speed=2.0, parent=earth)
+    moon.orbit_angle = math.radians(0)
+    moon.texture_path = "moon.jpg"
+
+    mercury = TexturedPlanet("Mercury", radius=0.5,
+            orbit_radius=16.0,
+            orbit_speed=0.9,
+            spin_speed=2)
+    mercury.orbit_angle = math.radians(20)
+    mercury.texture_path = "mercury.jpg"
+
+    venus = TexturedPlanet("Venus", radius=1.2,
+            orbit_radius=25.6,
+            orbit_speed=1,
+            spin_speed=-1.5)
+    venus.orbit_angle = math.radians(180)
+    venus.texture_path = "venus.jpg"
+
+    mars = TexturedPlanet("Mars", radius=1.0,
+            orbit_radius=49.0,
+            orbit_speed=0.73,
+            spin_speed=2.1)
+    mars.orbit_angle = math.radians(100)
+    mars.texture_path = "mars.jpg"
+
+    jupiter = TexturedPlanet("Jupiter", radius=3.0,
+            orbit_radius=63.0,
+            orbit_speed=0.06,
+            spin_speed=2.5)
+    jupiter.orbit_angle = math.radians(270)
+    jupiter.texture_path = "jupiter.jpg"
+
+    saturn = TexturedPlanet("Saturn", radius=2.5,
+            orbit_radius=78.0,
+            orbit_speed=0.18,
+            spin_speed=2)
+    saturn.orbit_angle = math.radians(200)
+    saturn.rings = True
+    saturn.texture_path = "saturn.jpg"
+    saturn.ring_texture_path = "saturn_ring.png"
+
+    uranus = Planet("Uranus", radius=1.7,
+            color_left=np.array([0.65, 0.85, 0.95]),
+            color_right=np.array([0.45, 0.75, 0.95]),
+            orbit_radius=95.0,
+            orbit_speed=0.1,
+            spin_speed=-2.3)
+    uranus.orbit_angle = math.radians(90)
+
+    neptune = TexturedPlanet("Neptune", radius=1.6,
+            orbit_radius=120.0,
+            orbit_speed=0.08,
+            spin_speed=2.0)
+    neptune.orbit_angle = math.radians(140)
+    neptune.texture_path = "neptune.jpg"
+
+    return [sun,earth,moon,mercury,venus,mars,jupiter,saturn,uranus,neptune]
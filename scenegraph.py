@@ -0,0 +1,205 @@
+import numpy as np
+import geometry
+from ephemeris import hierarchy_levels
+
+# Node kinds
+BARYCENTER = 0
+PLANET = 1
+MOON = 2
+RING = 3
+CAMERA_ANCHOR = 4
+
+class SceneGraph:
+    """
+    Array backed scene graph. Every node has a translation relative to its
+    parent plus its own spin and scale, which are not inherited.
+    World positions and model matrices are cached and only recomputed for
+    nodes that are dirty or have a dirty ancestor. The setters only flag
+    nodes whose values actually changed, and update() walks down from the
+    flagged nodes, so the cost follows what changed, not the graph size.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.kind = np.zeros(0, dtype=np.int8)
+        self.parent = np.zeros(0, dtype=np.int32)   # -1 for the roots
+
+        # Local state
+        self.translation = np.zeros((0, 3))
+        self.spin = np.zeros(0)             # radians around Y
+        self.scale = np.zeros(0)
+
+        # Cached world state
+        self.world_positions = np.zeros((0, 3))
+        self.model_matrices = np.zeros((0, 4, 4), dtype=np.float32)  # column-major
+
+        # Moved nodes invalidate their subtree, spin and scale only the node itself
+        self.dirty = np.zeros(0, dtype=bool)
+        self.shape_dirty = np.zeros(0, dtype=bool)
+
+        # Nodes created by from_ephemeris, indexed by body
+        self.body_nodes = np.zeros(0, dtype=np.intp)
+        self.anchor_nodes = np.zeros(0, dtype=np.intp)
+        self.ring_nodes = {}
+
+        self._levels = None
+        self._depth = None
+        self._children = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def add_nodes(self, names, kind, parent=-1, translation=0.0, spin=0.0, scale=1.0):
+        """Append nodes and return their indices. Parents may be added later on."""
+        count = len(names)
+        start = len(self.names)
+
+        def column(values, dtype=float):
+            return np.broadcast_to(np.asarray(values, dtype=dtype), (count,)).copy()
+
+        self.names.extend(names)
+        self.kind = np.concatenate([self.kind, column(kind, np.int8)])
+        self.parent = np.concatenate([self.parent, column(parent, np.int32)])
+        self.translation = np.concatenate([self.translation, np.broadcast_to(translation, (count, 3))])
+        self.spin = np.concatenate([self.spin, column(spin)])
+        self.scale = np.concatenate([self.scale, column(scale)])
+
+        self.world_positions = np.concatenate([self.world_positions, np.zeros((count, 3))])
+        self.model_matrices = np.concatenate([self.model_matrices, np.zeros((count, 4, 4), dtype=np.float32)])
+        self.dirty = np.concatenate([self.dirty, np.ones(count, dtype=bool)])
+        self.shape_dirty = np.concatenate([self.shape_dirty, np.ones(count, dtype=bool)])
+
+        self._levels = None
+        return np.arange(start, start + count)
+
+    def levels(self):
+        if self._levels is None:
+            self._levels = hierarchy_levels(self.parent)
+            self._depth = np.zeros(len(self), dtype=np.intp)
+            for depth, level in enumerate(self._levels):
+                self._depth[level] = depth
+
+            # Children grouped by parent: children[start[p]:start[p + 1]]
+            order = np.argsort(self.parent, kind='stable')
+            roots = np.searchsorted(self.parent[order], 0)
+            start = np.searchsorted(self.parent[order][roots:], np.arange(len(self) + 1))
+            self._children = (order[roots:], start)
+        return self._levels
+
+    def subtrees(self, nodes):
+        """The given nodes and all their descendants, each once, parents before children."""
+        self.levels()
+        children, start = self._children
+        parts = [np.asarray(nodes, dtype=np.intp)]
+        while len(parts[-1]):
+            frontier = parts[-1]
+            first, counts = start[frontier], start[frontier + 1] - start[frontier]
+            # Concatenated ranges first[i]:first[i] + counts[i]
+            ranges = np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            parts.append(children[ranges])
+
+        # A dirty node may also sit below another dirty node
+        nodes = np.unique(np.concatenate(parts))
+        return nodes[np.argsort(self._depth[nodes], kind='stable')]
+
+    def set_translation(self, nodes, translation):
+        """Set local translations, only nodes that actually moved become dirty."""
+        nodes = np.asarray(nodes)
+        translation = np.asarray(translation, dtype=float)
+        moved = np.any(self.translation[nodes] != translation, axis=-1)
+        self.translation[nodes[moved]] = translation[moved]
+        self.dirty[nodes[moved]] = True
+
+    def set_spin(self, nodes, spin):
+        nodes = np.asarray(nodes)
+        spin = np.broadcast_to(np.asarray(spin, dtype=float), nodes.shape)
+        changed = self.spin[nodes] != spin
+        self.spin[nodes[changed]] = spin[changed]
+        self.shape_dirty[nodes[changed]] = True
+
+    def set_scale(self, nodes, scale):
+        nodes = np.asarray(nodes)
+        scale = np.broadcast_to(np.asarray(scale, dtype=float), nodes.shape)
+        changed = self.scale[nodes] != scale
+        self.scale[nodes[changed]] = scale[changed]
+        self.shape_dirty[nodes[changed]] = True
+
+    def update(self):
+        """Refresh the cached world state and return the number of nodes recomputed."""
+        dirty = np.flatnonzero(self.dirty)
+        shape_dirty = np.flatnonzero(self.shape_dirty)
+        self.dirty[dirty] = False
+        self.shape_dirty[shape_dirty] = False
+
+        # Only the subtrees below moved nodes, one depth at a time
+        moved = self.subtrees(dirty)
+        depth = self._depth[moved]
+        bounds = np.flatnonzero(np.diff(depth)) + 1
+        for changed in np.split(moved, bounds):
+            if len(changed) == 0:
+                continue
+            parent = self.parent[changed]
+            root = parent < 0
+            self.world_positions[changed[root]] = self.translation[changed[root]]
+            inner = changed[~root]
+            self.world_positions[inner] = self.world_positions[self.parent[inner]] + self.translation[inner]
+
+        refresh = np.union1d(moved, shape_dirty)
+        if len(refresh):
+            self.model_matrices[refresh] = geometry.get_model_matrices(self.world_positions[refresh],
+                                                                       self.spin[refresh], self.scale[refresh])
+
+        return len(refresh)
+
+    def model_matrix(self, node):
+        """Row-major 4x4 model matrix of a node (a view into the cache)."""
+        return self.model_matrices[node].T
+
+    @classmethod
+    def from_ephemeris(cls, ephemeris, ring_scales=None, count: int = None):
+        """
+        Build a graph mirroring an ephemeris: a barycenter root, one planet
+        or moon node per body, a camera anchor per body and ring nodes for
+        the bodies in ring_scales ({body index: ring radius / body radius}).
+        Only the first count bodies are included when count is given.
+        """
+        graph = cls()
+        ring_scales = ring_scales or {}
+        count = len(ephemeris) if count is None else count
+        names = list(ephemeris.names[:count])
+        body_parent = ephemeris.parent[:count]
+        radius = ephemeris.radius[:count]
+
+        root = graph.add_nodes(["Barycenter"], BARYCENTER)[0]
+
+        # Body nodes follow the root in body order, so parents map directly
+        first = len(graph)
+        parent = np.where(body_parent >= 0, first + body_parent, root)
+        kind = np.where(body_parent >= 0, MOON, PLANET)
+        graph.body_nodes = graph.add_nodes(names, kind, parent, scale=radius)
+
+        graph.anchor_nodes = graph.add_nodes([name + " anchor" for name in names], CAMERA_ANCHOR,
+                                             graph.body_nodes, scale=0.0)
+
+        bodies = sorted(ring_scales)
+        rings = graph.add_nodes([names[i] + " rings" for i in bodies], RING, graph.body_nodes[bodies],
+                                scale=[radius[i] * ring_scales[i] for i in bodies])
+        graph.ring_nodes = dict(zip(bodies, rings))
+
+        graph.sync(ephemeris)
+        return graph
+
+    def sync(self, ephemeris):
+        """Pull the current body state from an ephemeris and update."""
+        count = len(self.body_nodes)
+        self.set_translation(self.body_nodes, ephemeris.local_positions[:count])
+        self.set_spin(self.body_nodes, ephemeris.spin_angles[:count])
+        self.set_scale(self.body_nodes, ephemeris.radius[:count])
+
+        if self.ring_nodes:
+            bodies = np.fromiter(self.ring_nodes.keys(), dtype=np.intp)
+            rings = np.fromiter(self.ring_nodes.values(), dtype=np.intp)
+            # Rings turn with their planet
+            self.set_spin(rings, ephemeris.spin_angles[bodies])
+
+        return self.update()
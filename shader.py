@@ -0,0 +1,163 @@
+from OpenGL.GL import *
+import numpy as np
+from glstate import state as gl_state
+
+# Binding points of the uniform blocks shared by every program
+CAMERA_BINDING = 0
+UNIFORM_BLOCKS = {"Camera": CAMERA_BINDING}
+
+# std140 layout of the Camera block in shaders/camera.glsl, matrices column-major
+CAMERA_BLOCK = np.dtype([('view', '<f4', (4, 4)),
+                         ('projection', '<f4', (4, 4)),
+                         ('view_projection', '<f4', (4, 4)),
+                         ('camera_position', '<f4', (4,)),
+                         ('time', '<f4'),
+                         ('padding', '<f4', (3,))])   # blocks are padded to 16 bytes
+
+def compile_program(vertex_shader_source, fragment_shader_source):
+    """Compile and link a vertex and fragment shader, return the GL program name."""
+    program = glCreateProgram()
+    vertex_shader = glCreateShader(GL_VERTEX_SHADER)
+    fragment_shader = glCreateShader(GL_FRAGMENT_SHADER)
+
+    # Set shader source code
+    glShaderSource(vertex_shader, vertex_shader_source)
+    glShaderSource(fragment_shader, fragment_shader_source)
+
+    # Compile shaders
+    glCompileShader(vertex_shader)
+    if not glGetShaderiv(vertex_shader, GL_COMPILE_STATUS):
+        error = glGetShaderInfoLog(vertex_shader).decode()
+        print("Vertex shader compilation error:", error)
+        raise RuntimeError("Vertex shader compilation failed")
+    glCompileShader(fragment_shader)
+    if not glGetShaderiv(fragment_shader, GL_COMPILE_STATUS):
+        error = glGetShaderInfoLog(fragment_shader).decode()
+        print("Fragment shader compilation error:", error)
+        raise RuntimeError("Fragment shader compilation failed")
+
+    # Link shaders to the program
+    glAttachShader(program, vertex_shader)
+    glAttachShader(program, fragment_shader)
+    glLinkProgram(program)
+
+    if not glGetProgramiv(program, GL_LINK_STATUS):
+        print(glGetProgramInfoLog(program))
+        raise RuntimeError('Linking error')
+
+    # Shared uniform blocks the program declares read from fixed binding points
+    for block, binding in UNIFORM_BLOCKS.items():
+        index = glGetUniformBlockIndex(program, block)
+        if index != GL_INVALID_INDEX:
+            glUniformBlockBinding(program, index, binding)
+
+    # Get rid of the shaders
+    glDetachShader(program, vertex_shader)
+    glDetachShader(program, fragment_shader)
+    glDeleteShader(vertex_shader)
+    glDeleteShader(fragment_shader)
+    return program
+
+class ShaderProgram:
+    """
+    A linked program with the locations of its active uniforms and
+    attributes. The setters remember the last value of every uniform and
+    skip the upload when it did not change. Like glUniform they act on the
+    program in use, so call use() first.
+    """
+
+    def __init__(self, program: int, uniforms: dict, attributes: dict):
+        self.id = program
+        self.uniforms = uniforms        # name -> location
+        self.attributes = attributes    # name -> location
+        self._values = {}
+
+    @classmethod
+    def link(cls, vertex_shader_source, fragment_shader_source):
+        """Build a program and look up its active uniforms and attributes once."""
+        program = compile_program(vertex_shader_source, fragment_shader_source)
+
+        uniforms = {}
+        for i in range(glGetProgramiv(program, GL_ACTIVE_UNIFORMS)):
+            name, size, kind = glGetActiveUniform(program, i)
+            # Arrays are reported as name[0], uniform block members have no location
+            name = name.decode().split("[")[0]
+            location = glGetUniformLocation(program, name)
+            if location >= 0:
+                uniforms[name] = location
+
+        attributes = {}
+        for i in range(glGetProgramiv(program, GL_ACTIVE_ATTRIBUTES)):
+            name, size, kind = glGetActiveAttrib(program, i)
+            name = name.decode()
+            attributes[name] = glGetAttribLocation(program, name)
+
+        return cls(program, uniforms, attributes)
+
+    def use(self):
+        gl_state.use_program(self.id)
+
+    def attribute(self, name):
+        """Location of an attribute, -1 when the shader does not use it."""
+        return self.attributes.get(name, -1)
+
+    def changed(self, name, value):
+        """
+        Record a uniform value and tell whether it needs uploading: False for
+        unknown uniforms and for values equal to the last one recorded.
+        """
+        if name not in self.uniforms:
+            return False
+        last = self._values.get(name)
+        if last is not None and np.array_equal(last, value):
+            return False
+        self._values[name] = np.array(value, copy=True)
+        return True
+
+    def set_int(self, name, value):
+        if self.changed(name, value):
+            glUniform1i(self.uniforms[name], int(value))
+
+    def set_float(self, name, value):
+        if self.changed(name, value):
+            glUniform1f(self.uniforms[name], float(value))
+
+    def set_vec3(self, name, value):
+        if self.changed(name, value):
+            glUniform3fv(self.uniforms[name], 1, np.asarray(value, dtype=np.float32))
+
+    def set_mat4(self, name, value):
+        """Upload a row-major 4x4 matrix."""
+        if self.changed(name, value):
+            glUniformMatrix4fv(self.uniforms[name], 1, GL_TRUE, np.asarray(value, dtype=np.float32))
+
+def pack_camera(view_matrix, projection_matrix, time, out=None):
+    """Camera block contents for row-major view and projection matrices."""
+    block = np.zeros((), dtype=CAMERA_BLOCK) if out is None else out
+    # A transposed row-major matrix is laid out column-major
+    block['view'] = view_matrix.T
+    block['projection'] = projection_matrix.T
+    block['view_projection'] = (projection_matrix @ view_matrix).T
+    block['camera_position'][:3] = np.linalg.inv(view_matrix)[:3, 3]
+    block['camera_position'][3] = 1.0
+    block['time'] = time
+    return block
+
+class CameraBuffer:
+    """
+    Uniform buffer holding the Camera block, written once per frame and
+    read by every program through CAMERA_BINDING.
+    """
+
+    def __init__(self):
+        self.id = glGenBuffers(1)
+        self.data = np.zeros((), dtype=CAMERA_BLOCK)
+
+        gl_state.bind_buffer(GL_UNIFORM_BUFFER, self.id)
+        glBufferData(GL_UNIFORM_BUFFER, CAMERA_BLOCK.itemsize, None, GL_DYNAMIC_DRAW)
+        glBindBufferBase(GL_UNIFORM_BUFFER, CAMERA_BINDING, self.id)
+
+    def update(self, view_matrix, projection_matrix, time):
+        pack_camera(view_matrix, projection_matrix, time, out=self.data)
+        gl_state.bind_buffer(GL_UNIFORM_BUFFER, self.id)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, CAMERA_BLOCK.itemsize, self.data.tobytes())
@@ -0,0 +1,12 @@
+#version 330 compatibility
+varying vec3 tint;
+
+void main() {
+
+    // Round sprite instead of a square
+    vec2 p = gl_PointCoord * 2.0 - 1.0;
+    if (dot(p, p) > 1.0)
+        discard;
+
+    gl_FragColor = vec4(tint, 1.0);
+}
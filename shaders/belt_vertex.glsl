@@ -0,0 +1,24 @@
+#version 330 compatibility
+#include "camera.glsl"
+attribute vec3 position;    // single shared vertex
+attribute vec4 orbit;       // radius, phase, speed, height (per instance)
+attribute vec4 appearance;  // size, tint rgb (per instance)
+attribute float phaseOffset;// angle covered up to the epoch (per instance)
+uniform float pointScale;   // pixels per world unit at distance 1
+uniform float beltTime;     // seconds since the phase epoch, see belt.py
+varying vec3 tint;
+
+void main(){
+
+    // Circular orbit propagated on the GPU
+    float angle = orbit.y + phaseOffset + orbit.z * beltTime;
+    vec3 world_pos = position + vec3(orbit.x * cos(angle), orbit.w, orbit.x * sin(angle));
+
+    vec4 eye_pos = view * vec4(world_pos, 1.0);
+    gl_Position = projection * eye_pos;
+
+    // Never smaller than one pixel so distant rocks do not flicker
+    gl_PointSize = max(1.0, appearance.x * pointScale / max(-eye_pos.z, 0.001));
+
+    tint = appearance.yzw;
+}
@@ -1,3 +1,4 @@
+#version 330 compatibility
 precision mediump float;
 
 uniform sampler2D bgTexture;
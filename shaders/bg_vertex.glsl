@@ -1,3 +1,4 @@
+#version 330 compatibility
 attribute vec3 position;
 varying vec2 vUv;
 
@@ -0,0 +1,8 @@
+// Camera data shared by every program, written once per frame (see shader.CameraBuffer)
+layout(std140) uniform Camera {
+    mat4 view;
+    mat4 projection;
+    mat4 view_projection;   // projection * view
+    vec4 camera_position;   // world space eye, w = 1
+    float time;             // simulation time
+};
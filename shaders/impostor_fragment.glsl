@@ -0,0 +1,42 @@
+#version 330 compatibility
+#include "camera.glsl"
+uniform sampler2DArray surfaces;
+varying vec3 world_pos;
+varying vec3 center;
+varying float radius;
+varying vec3 eye;
+varying mat3 rotation;
+varying float vLayer;
+
+#define PI 3.14159265359
+
+#include "lambert.glsl"
+
+void main() {
+
+    // Intersect the ray through this fragment with the sphere
+    vec3 dir = normalize(world_pos - eye);
+    vec3 L = eye - center;
+    float b = dot(dir, L);
+    float c = dot(L, L) - radius * radius;
+    float discriminant = b * b - c;
+    if (discriminant < 0.0) {
+        discard;
+    }
+
+    vec3 hit = eye + dir * (-b - sqrt(discriminant));
+    vec3 n = (hit - center) / radius;
+
+    // Object space point, as the mesh shaders see it
+    vec3 coord = transpose(rotation) * n;
+
+    float u = 0.5 + atan(coord.z, coord.x) / (2.0 * PI); // longitude
+    float v = 0.5 + asin(clamp(coord.y, -1.0, 1.0)) / PI;  // latitude, north up
+    vec3 color = texture(surfaces, vec3(u, v, vLayer)).rgb;
+
+    // Depth of the sphere surface, not of the quad
+    vec4 clip = view_projection * vec4(hit, 1.0);
+    gl_FragDepth = 0.5 * clip.z / clip.w + 0.5;
+
+    gl_FragColor = vec4(lambert(color, n, hit),1.0);
+}
@@ -0,0 +1,37 @@
+#version 330 compatibility
+#include "camera.glsl"
+attribute vec3 position;    // quad corner, x and y from -1 to 1
+attribute mat4 model;       // per instance
+attribute float layer;      // per instance, layer of the planet map array
+varying vec3 world_pos;     // point on the quad
+varying vec3 center;
+varying float radius;
+varying vec3 eye;
+varying mat3 rotation;      // object to world, without the scale
+varying float vLayer;
+
+void main(){
+
+    center = (model * vec4(0.0, 0.0, 0.0, 1.0)).xyz;
+    radius = length(model[1].xyz);
+    rotation = mat3(model) / radius;
+    vLayer = layer;
+
+    // Camera axes from the view matrix
+    eye = camera_position.xyz;
+    vec3 right = vec3(view[0][0], view[1][0], view[2][0]);
+    vec3 up = vec3(view[0][1], view[1][1], view[2][1]);
+
+    // Tight bounds of the perspective silhouette: per screen axis, the two
+    // lines from the eye tangent to the sphere, as slopes over the depth
+    vec3 c = (view * vec4(center, 1.0)).xyz;
+    float depth = max(-c.z, radius * 1.01);
+    vec2 t = sqrt(max(c.xy * c.xy + depth * depth - radius * radius, 1e-12));
+    vec2 low = (c.xy * t - depth * radius) / max(c.xy * radius + depth * t, 1e-6);
+    vec2 high = (c.xy * t + depth * radius) / max(depth * t - c.xy * radius, 1e-6);
+
+    // Corner on the plane through the center, facing the camera
+    vec2 corner = mix(low, high, position.xy * 0.5 + 0.5) * depth;
+    world_pos = center + right * (corner.x - c.x) + up * (corner.y - c.y);
+    gl_Position = view_projection * vec4(world_pos, 1.0);
+}
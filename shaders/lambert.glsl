@@ -0,0 +1,15 @@
+// Lambert lighting from the Sun at the origin, shared by the planet shaders
+vec3 lambert(vec3 color, vec3 n, vec3 world_pos) {
+
+    vec3 lightDir = normalize(vec3(0.0)-world_pos);
+    // Lambert lighting
+    float light = dot(n,lightDir);
+    //Force it to be between 0 and 1
+    light = clamp(light, 0.0, 1.0);
+
+    return mix(
+        color * 0.6,                // shadow
+        mix(color, vec3(1.0), 0.4), // highlight
+        light
+    );
+}
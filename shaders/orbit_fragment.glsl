@@ -1,3 +1,4 @@
+#version 330 compatibility
 precision mediump float;
 uniform vec3 color;
 void main() {
@@ -0,0 +1,6 @@
+#version 330 compatibility
+precision mediump float;
+varying vec4 vColor;
+void main() {
+    gl_FragColor = vColor;
+}
@@ -0,0 +1,9 @@
+#version 330 compatibility
+#include "camera.glsl"
+attribute vec3 position;    // world space, see orbits.py
+attribute vec4 color;
+varying vec4 vColor;
+void main() {
+    vColor = color;
+    gl_Position = view_projection * vec4(position, 1.0);
+}
@@ -1,7 +1,7 @@
+#version 330 compatibility
+#include "camera.glsl"
 attribute vec3 position;
 uniform mat4 model;
-uniform mat4 view;
-uniform mat4 projection;
 void main() {
-    gl_Position = projection * view * model * vec4(position, 1.0);
+    gl_Position = view_projection * model * vec4(position, 1.0);
 }
\ No newline at end of file
@@ -1,9 +1,12 @@
+#version 330 compatibility
 uniform vec3 color_left;
 uniform vec3 color_right;
 varying vec3 normal; //World space normal
 varying vec3 coord; //Object space coordinate
 varying vec3 world_pos; //World space position
 
+#include "lambert.glsl"
+
 void main() {
 
     vec3 n = normalize(normal);
@@ -11,18 +14,5 @@ void main() {
     float t = (coord.x + 1.0) * 0.5;
     vec3 base_color = mix(color_left,color_right,t);
 
-    vec3 lightDir = normalize(vec3(0.0)-world_pos);
-    // Lambert lighting
-    float light = dot(n,lightDir);
-    //Force it to be between 0 and 1
-    light = clamp(light, 0.0, 1.0);
-
-
-    vec3 shadedColor = mix(
-        base_color * 0.6,                // shadow
-        mix(base_color, vec3(1.0), 0.4), // highlight
-        light
-    );
-
-    gl_FragColor = vec4(shadedColor,1.0);
-}
\ No newline at end of file
+    gl_FragColor = vec4(lambert(base_color, n, world_pos),1.0);
+}
@@ -1,5 +1,6 @@
+#version 330 compatibility
 precision mediump float;
-uniform sampler2D texture;
+uniform sampler2D surface;
 
 uniform vec3 planetCenter;
 uniform float planetRadius;
@@ -41,7 +42,7 @@ void main() {
     //At the edges -> 0
     float shadowFactor = clamp(penetration, 0.0, 1.0);
 
-    vec4 color = texture(texture, vTextCoord);
+    vec4 color = texture(surface, vTextCoord);
 
     float alpha = color.a;
     if(alpha < 0.1)
@@ -1,7 +1,7 @@
+#version 330 compatibility
+#include "camera.glsl"
 attribute vec3 position;
 uniform mat4 model;
-uniform mat4 view;
-uniform mat4 projection;
 
 uniform float inner_radius;
 uniform float outer_radius;
@@ -26,5 +26,5 @@ void main() {
 
     vTextCoord = vec2(u,v);
 
-    gl_Position = projection * view * model * vec4(position, 1.0);
+    gl_Position = view_projection * model * vec4(position, 1.0);
 }
\ No newline at end of file
@@ -0,0 +1,17 @@
+#version 330 compatibility
+uniform sampler2DArray surfaces;
+varying vec3 normal; //World space normal
+varying vec3 world_pos; //World space position
+varying vec2 vTexCoord;
+varying float vLayer;
+
+#include "lambert.glsl"
+
+void main() {
+
+    vec3 n = normalize(normal);
+
+    vec3 color = texture(surfaces, vec3(vTexCoord, vLayer)).rgb;
+
+    gl_FragColor = vec4(lambert(color, n, world_pos),1.0);
+}
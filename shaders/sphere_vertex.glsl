@@ -0,0 +1,26 @@
+#version 330 compatibility
+#include "camera.glsl"
+attribute vec3 position;
+attribute mat4 model;       // per instance
+attribute float layer;      // per instance, layer of the planet map array
+varying vec3 normal;
+varying vec3 world_pos;
+varying vec2 vTexCoord;
+varying float vLayer;
+
+#define PI 3.14159265359
+
+void main(){
+
+    world_pos = (model * vec4(position, 1.0)).xyz;
+    gl_Position = view_projection * vec4(world_pos, 1.0);
+
+    // Bodies are scaled uniformly, the model rotation is enough for normals
+    normal = mat3(model) * position;
+
+    float u = 0.5 + atan(position.z, position.x) / (2.0 * PI); // longitude
+    float v = 0.5 + asin(position.y) / PI;                  // latitude, north up
+    vTexCoord = vec2(u, v);
+
+    vLayer = layer;
+}
@@ -1,6 +1,7 @@
+#version 330 compatibility
+#include "camera.glsl"
 varying vec3 normal; // world space normal
 varying vec3 coord;  // object space coordinate
-uniform float time;
 
 // Simple pseudo-random function for noise
 float rand(vec2 co){
@@ -1,26 +1,17 @@
+#version 330 compatibility
 varying vec3 normal; //World space normal
 varying vec3 coord; //Object space coordinate
 varying vec3 world_pos; //World space position
 varying vec2 vTexCoord;
-uniform sampler2D texture;
+uniform sampler2D surface;
+
+#include "lambert.glsl"
 
 void main() {
 
     vec3 n = normalize(normal);
 
-    vec3 color = texture2D(texture, vTexCoord).rgb;
-
-    vec3 lightDir = normalize(vec3(0.0)-world_pos);
-    // Lambert lighting
-    float light = dot(n,lightDir);
-    //Force it to be between 0 and 1
-    light = clamp(light, 0.0, 1.0);
-
-    vec3 shadedColor = mix(
-        color * 0.6,                // shadow
-        mix(color, vec3(1.0), 0.4), // highlight
-        light
-    );
+    vec3 color = texture(surface, vTexCoord).rgb;
 
-    gl_FragColor = vec4(shadedColor,1.0);
-}
\ No newline at end of file
+    gl_FragColor = vec4(lambert(color, n, world_pos),1.0);
+}
@@ -1,6 +1,6 @@
+#version 330 compatibility
+#include "camera.glsl"
 attribute vec3 position;
-uniform mat4 view;
-uniform mat4 projection;
 uniform mat4 model;
 varying vec3 normal;
 varying vec3 coord;
@@ -11,7 +11,7 @@ varying vec2 vTexCoord;
 
 void main(){
 
-    vec4 transformed = projection * view * model * vec4(position,1.0);
+    vec4 transformed = view_projection * model * vec4(position,1.0);
     gl_Position = transformed;
 
     mat3 N = transpose(inverse(mat3(model)));
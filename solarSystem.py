@@ -10,46 +10,13 @@ import math
 from planet import Planet
 from planet import Sun
 from planet import TexturedPlanet
+from shader import ShaderProgram, CameraBuffer
 
 def create_shader_program(vertex_shader_source, fragment_shader_source):
-    # Create a OpenGL program and shaders
-    program = glCreateProgram()
-    vertex_shader = glCreateShader(GL_VERTEX_SHADER)
-    fragment_shader = glCreateShader(GL_FRAGMENT_SHADER)
-
-    # Set shader source code
-    glShaderSource(vertex_shader, vertex_shader_source)
-    glShaderSource(fragment_shader, fragment_shader_source)
-
-    # Compile shaders
-
-    glCompileShader(vertex_shader)
-    if not glGetShaderiv(vertex_shader, GL_COMPILE_STATUS):
-        error = glGetShaderInfoLog(vertex_shader).decode()
-        print("Vertex shader compilation error:", error)
-        raise RuntimeError("Vertex shader compilation failed")
-    glCompileShader(fragment_shader)
-    if not glGetShaderiv(fragment_shader, GL_COMPILE_STATUS):
-        error = glGetShaderInfoLog(fragment_shader).decode()
-        print("Fragment shader compilation error:", error)
-        raise RuntimeError("Fragment shader compilation failed")
-    # Link shaders to the program
-
-    glAttachShader(program, vertex_shader)
-    glAttachShader(program, fragment_shader)
-    # Link the program
-    glLinkProgram(program)
-
-    if not glGetProgramiv(program,GL_LINK_STATUS):
-        print(glGetProgramInfoLog(program))
-        raise RuntimeError('Linking error')
-
-    # Get rid of the shaders 
-    glDetachShader(program, vertex_shader)
-    glDetachShader(program, fragment_shader)
+    program = ShaderProgram.link(vertex_shader_source, fragment_shader_source)
 
     #Set the default program for usage
-    glUseProgram(program)
+    program.use()
     return program
 
 def setup_buffer(program,data,index_data):
@@ -69,7 +36,7 @@ def setup_buffer(program,data,index_data):
     #offset for position is 0
     offset = ctypes.c_void_p(0)
     # Find the location for "position" and enable it
-    loc = glGetAttribLocation(program, "position")
+    loc = program.attribute("position")
     glEnableVertexAttribArray(loc)
     #tell OpenGL how to interpret the position attribute
     glVertexAttribPointer(loc, 3, GL_FLOAT, False, stride, offset)
@@ -81,39 +48,24 @@ def setup_buffer(program,data,index_data):
     glBindVertexArray(0)
     return vao
 
-def setup_program_uniforms(program,view_matrix,projection_matrix,model_matrix):
-
-    glUseProgram(program)
-
-    view_loc = glGetUniformLocation(program, "view")
-    glUniformMatrix4fv(view_loc, 1, GL_FALSE, view_matrix.T)
-
-    projection_loc = glGetUniformLocation(program, "projection")
-    glUniformMatrix4fv(projection_loc, 1, GL_FALSE, projection_matrix.T)
-
-    model_loc = glGetUniformLocation(program, "model")
-    glUniformMatrix4fv(model_loc, 1, GL_FALSE, model_matrix.T)
+def setup_model_uniform(program,model_matrix):
+    # View and projection come from the camera uniform buffer
+    program.use()
+    program.set_mat4("model", model_matrix)
 
 def draw_planet(object,delta_time):
         #Use the sphere program
-        glUseProgram(object.program)
+        object.program.use()
 
         object.update(delta_time)
 
         glBindVertexArray(object.vao)
-        model_loc = glGetUniformLocation(object.program, "model")
-
-        model_matrix = object.get_model_matrix()
-        glUniformMatrix4fv(model_loc, 1, GL_FALSE, model_matrix.T)
+        object.program.set_mat4("model", object.get_model_matrix())
 
         object.update_uniforms()
 
-        indices_per_strip = (geometry.SECTORS + 1) * 2
-
-        offset = 0
-        for i in range(geometry.STACKS):
-            glDrawElements(GL_TRIANGLE_STRIP,indices_per_strip,GL_UNSIGNED_INT,ctypes.c_void_p(offset * 4))
-            offset += indices_per_strip
+        # Every stack in one stitched strip, a single draw call per sphere
+        glDrawElements(GL_TRIANGLE_STRIP,geometry.get_sphere_index_count(),GL_UNSIGNED_INT,ctypes.c_void_p(0))
 
         glBindVertexArray(0)
 
@@ -132,6 +84,10 @@ def main():
     textured_fragment = utility.load_shader_source("shaders/textured_fragment.glsl")
 
     pygame.init()
+    # Shaders are GLSL 3.30 with the compatibility built-ins
+    pygame.display.gl_set_attribute(pygame.GL_CONTEXT_MAJOR_VERSION, 3)
+    pygame.display.gl_set_attribute(pygame.GL_CONTEXT_MINOR_VERSION, 3)
+    pygame.display.gl_set_attribute(pygame.GL_CONTEXT_PROFILE_MASK, pygame.GL_CONTEXT_PROFILE_COMPATIBILITY)
     pygame.display.set_mode((800, 600), DOUBLEBUF | OPENGL)
     pygame.display.set_caption("Solar System Simulation")
 
@@ -142,10 +98,8 @@ def main():
     program_sun = create_shader_program(sun_vertex, sun_fragment)
     program_textured = create_shader_program(textured_vertex,textured_fragment)
 
-    # Build vertex data for a sphere
-    data = geometry.get_sphere_vertices()
-
-    index_data = geometry.get_sphere_indices()
+    # Build vertex data for a sphere (cached, shared by every planet)
+    data, index_data = geometry.get_sphere_mesh()
 
     vao_planet = setup_buffer(program, data,index_data)
     vao_sun = setup_buffer(program_sun, data,index_data)
@@ -155,9 +109,12 @@ def main():
     projection_matrix = geometry.get_projection_matrix(math.radians(45), aspect, 0.1, 150.0)
     model_matrix = np.identity(4)
 
-    setup_program_uniforms(program,view_matrix,projection_matrix,model_matrix)
-    setup_program_uniforms(program_sun,view_matrix,projection_matrix,model_matrix)
-    setup_program_uniforms(program_textured,view_matrix,projection_matrix,model_matrix)
+    setup_model_uniform(program,model_matrix)
+    setup_model_uniform(program_sun,model_matrix)
+    setup_model_uniform(program_textured,model_matrix)
+
+    camera_buffer = CameraBuffer()
+    elapsed = 0.0
 
     #Create planets
 
@@ -255,6 +212,7 @@ def main():
         current_time = time.time()
         delta_time = current_time - last_time
         last_time = current_time
+        elapsed += delta_time
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -266,6 +224,8 @@ def main():
         #Clear the screen
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
+        camera_buffer.update(view_matrix, projection_matrix, elapsed)
+
         for p in planets:
             draw_planet(p,delta_time)
 
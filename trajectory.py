@@ -0,0 +1,202 @@
+import os
+import numpy as np
+
+MAGIC = b"SSTRAJ01"
+CHUNK_SIZE = 1024       # time samples per chunk
+ALIGNMENT = 64
+
+# File layout: header, body names, then fixed size chunks. Every chunk holds
+# its time index followed by one x, y and z column per body, so a body's
+# samples inside a chunk are contiguous. The last chunk is padded.
+HEADER = np.dtype([('magic', 'S8'), ('bodies', '<i4'), ('chunk_size', '<i4'), ('samples', '<i8'),
+                   ('dtype', 'S4'), ('names_size', '<i4')])
+
+def _chunk_dtype(bodies, chunk_size, dtype):
+    return np.dtype([('times', '<f8', (chunk_size,)), ('positions', dtype, (bodies, 3, chunk_size))])
+
+def _data_offset(names_size):
+    return -(-(HEADER.itemsize + names_size) // ALIGNMENT) * ALIGNMENT
+
+class TrajectoryWriter:
+    """
+    Streams positions into a trajectory file one block at a time.
+    Only a single chunk is held in memory.
+    """
+
+    def __init__(self, path, names, chunk_size: int = CHUNK_SIZE, dtype=np.float32):
+        self.names = list(names)
+        self.chunk_size = chunk_size
+        self.dtype = np.dtype(dtype).newbyteorder('<')
+        self.samples = 0
+        self.file = open(path, 'wb')
+
+        self.chunk = np.zeros(1, dtype=_chunk_dtype(len(self.names), chunk_size, self.dtype))[0]
+        self.filled = 0
+
+        encoded = "\n".join(self.names).encode("utf-8")
+        self.file.write(self._header(len(encoded)).tobytes())
+        self.file.write(encoded)
+        self.file.write(b"\0" * (_data_offset(len(encoded)) - HEADER.itemsize - len(encoded)))
+        self.names_size = len(encoded)
+
+    def _header(self, names_size):
+        header = np.zeros(1, dtype=HEADER)
+        header['magic'] = MAGIC
+        header['bodies'] = len(self.names)
+        header['chunk_size'] = self.chunk_size
+        header['samples'] = self.samples
+        header['dtype'] = self.dtype.str
+        header['names_size'] = names_size
+        return header
+
+    def write(self, times, positions):
+        """Append samples, times (T,) must be increasing, positions (T,N,3)."""
+        times = np.asarray(times, dtype=float)
+        done = 0
+        while done < len(times):
+            count = min(self.chunk_size - self.filled, len(times) - done)
+            window = slice(self.filled, self.filled + count)
+            self.chunk['times'][window] = times[done:done + count]
+            self.chunk['positions'][:, :, window] = np.transpose(positions[done:done + count], (1, 2, 0))
+
+            self.filled += count
+            self.samples += count
+            done += count
+            if self.filled == self.chunk_size:
+                self._flush()
+
+    def _flush(self):
+        self.file.write(self.chunk.tobytes())
+        self.chunk['positions'] = 0
+        self.chunk['times'] = 0
+        self.filled = 0
+
+    def close(self):
+        if self.filled:
+            self._flush()
+        # Now that the length is known, patch the header
+        self.file.seek(0)
+        self.file.write(self._header(self.names_size).tobytes())
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class TrajectoryStore:
+    """
+    Memory mapped reader for trajectory files.
+    Slices are views into the file whenever they stay inside one chunk.
+    """
+
+    def __init__(self, path):
+        header = np.fromfile(path, dtype=HEADER, count=1)[0]
+        if header['magic'] != MAGIC:
+            raise ValueError(f"{path} is not a trajectory file")
+
+        self.chunk_size = int(header['chunk_size'])
+        self.samples = int(header['samples'])
+        self.dtype = np.dtype(header['dtype'].decode())
+        bodies = int(header['bodies'])
+        names_size = int(header['names_size'])
+
+        with open(path, 'rb') as file:
+            file.seek(HEADER.itemsize)
+            self.names = file.read(names_size).decode("utf-8").split("\n") if bodies else []
+
+        chunks = -(-self.samples // self.chunk_size)
+        self.chunks = np.memmap(path, dtype=_chunk_dtype(bodies, self.chunk_size, self.dtype), mode='r',
+                                offset=_data_offset(names_size), shape=(chunks,))
+
+        # The time index is small compared with the positions, keep it in memory
+        self.times = np.asarray(self.chunks['times']).reshape(-1)[:self.samples]
+
+    def __len__(self):
+        return self.samples
+
+    @property
+    def start(self):
+        return float(self.times[0])
+
+    @property
+    def end(self):
+        return float(self.times[-1])
+
+    def covers(self, time):
+        return self.samples > 1 and self.start <= time <= self.end
+
+    def read(self, bodies=slice(None), start=None, end=None):
+        """Positions of the given bodies for times in [start, end], shape (T,n,3)."""
+        first = 0 if start is None else int(np.searchsorted(self.times, start, 'left'))
+        last = self.samples if end is None else int(np.searchsorted(self.times, end, 'right'))
+        if last <= first:
+            count = len(np.arange(len(self.names))[bodies])
+            return np.zeros((0, count, 3), dtype=self.dtype)
+
+        first_chunk = first // self.chunk_size
+        last_chunk = (last - 1) // self.chunk_size
+        block = self.chunks['positions'][first_chunk:last_chunk + 1][:, bodies]
+
+        # (chunks, n, 3, samples) -> (chunks * samples, n, 3)
+        block = np.moveaxis(block, -1, 1)
+        if len(block) > 1:
+            block = block.reshape((-1,) + block.shape[2:])
+        else:
+            block = block[0]
+
+        offset = first_chunk * self.chunk_size
+        return block[first - offset:last - offset]
+
+    def sample(self, index, bodies=slice(None)):
+        """Positions at one sample index, shape (n,3)."""
+        chunk, row = divmod(index, self.chunk_size)
+        return self.chunks['positions'][chunk, bodies, :, row]
+
+    def _interval(self, time):
+        index = int(np.clip(np.searchsorted(self.times, time, 'right') - 1, 0, self.samples - 2))
+        return index, self.times[index], self.times[index + 1]
+
+    def positions(self, time, bodies=slice(None)):
+        """Positions linearly interpolated between samples, shape (n,3)."""
+        index, t0, t1 = self._interval(time)
+        weight = (time - t0) / (t1 - t0) if t1 > t0 else 0.0
+
+        before = self.sample(index, bodies).astype(float)
+        after = self.sample(index + 1, bodies).astype(float)
+        return before + (after - before) * weight
+
+    def velocities(self, time, bodies=slice(None)):
+        """Velocities matching the interpolated positions, shape (n,3)."""
+        index, t0, t1 = self._interval(time)
+        if t1 <= t0:
+            return np.zeros(self.sample(index, bodies).shape)
+        return (self.sample(index + 1, bodies).astype(float) - self.sample(index, bodies)) / (t1 - t0)
+
+class Playback:
+    """Plays a trajectory file back for the bodies of an ephemeris, matched by name."""
+
+    def __init__(self, store: TrajectoryStore, bodies):
+        self.store = store
+        self.bodies = bodies
+
+    def covers(self, time):
+        return self.store.covers(time)
+
+    def positions(self, time):
+        return self.store.positions(time, self.bodies)
+
+    def velocities(self, time):
+        return self.store.velocities(time, self.bodies)
+
+def load_playback(path, ephemeris):
+    """Playback for the ephemeris bodies, None when the file is missing or lacks a body."""
+    if not os.path.exists(path):
+        return None
+
+    store = TrajectoryStore(path)
+    lookup = {name: i for i, name in enumerate(store.names)}
+    if any(name not in lookup for name in ephemeris.names):
+        return None
+    return Playback(store, np.array([lookup[name] for name in ephemeris.names], dtype=np.intp))
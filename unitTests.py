@@ -1,6 +1,27 @@
 import unittest
 import numpy as np
 import geometry
+from ephemeris import Ephemeris, solve_kepler, perifocal_basis
+from planet import Planet
+import io
+import os
+import tempfile
+import catalog
+import chebyshev
+import culling
+import orbits
+import headless
+import lod
+import parallel
+import scene
+from shader import ShaderProgram, CAMERA_BLOCK, pack_camera
+from glstate import GLState
+import trajectory
+from scenegraph import SceneGraph
+from registry import BodyRegistry, STAR, PLANET, MOON, MINOR, NAME_LENGTH, encode_name, encode_names
+from clock import SimulationClock
+from belt import AsteroidBelt, MAX_SHADER_ANGLE, REBASE_FRAMES
+from nbody import ParticleSystem, Octree, assign_rungs, brute_force_accelerations, barnes_hut_accelerations
 
 class TestGeometry(unittest.TestCase):
     def test_look_at_origin(self):
@@ -63,7 +84,724 @@ class TestGeometry(unittest.TestCase):
 
         result = geometry.get_ndc(50,100)
         np.testing.assert_equal(result,0)
+
+    def test_model_matrices(self):
+        positions = np.array([[1.0, 2.0, 3.0], [-4.0, 0.5, 6.0]])
+        angles = np.array([0.3, -2.0])
+        scales = np.array([1.3, 0.27])
+
+        result = geometry.get_model_matrices(positions, angles, scales)
+
+        for i in range(2):
+            T = np.identity(4)
+            T[:3, 3] = positions[i]
+            R = np.identity(4)
+            R[0, 0] = R[2, 2] = np.cos(angles[i])
+            R[0, 2] = np.sin(angles[i])
+            R[2, 0] = -np.sin(angles[i])
+            S = np.diag([scales[i], scales[i], scales[i], 1.0])
+            # Stored column-major
+            np.testing.assert_allclose(result[i].T, T @ R @ S, atol=1e-6)
     
 
+    def test_sphere_mesh(self):
+        vertices = geometry.get_sphere_vertices(2, 4).reshape(-1, 3)
+        self.assertEqual(len(vertices), 3 * 5)
+        np.testing.assert_allclose(vertices[0], [0, -1, 0], atol=1e-7)
+        np.testing.assert_allclose(vertices[5 + 1], [0, 0, 1], atol=1e-7)
+        indices = geometry.get_sphere_indices(2, 4)
+        self.assertEqual(len(indices), geometry.get_sphere_index_count(2, 4))
+        # First stack, two degenerate indices, second stack
+        np.testing.assert_array_equal(indices[:12], [0, 5, 1, 6, 2, 7, 3, 8, 4, 9, 9, 5])
+        np.testing.assert_array_equal(indices[12:14], [5, 10])
+
+        # Cached meshes are shared and read-only
+        mesh = geometry.get_sphere_mesh(64, 128)
+        self.assertIs(mesh, geometry.get_sphere_mesh(64, 128))
+        self.assertFalse(mesh[0].flags.writeable)
+
+    def test_icosphere(self):
+        vertices, indices = geometry.get_icosphere(3)
+        triangles = indices.reshape(-1, 3)
+        self.assertEqual(len(vertices), 642)
+        self.assertEqual(len(triangles), 1280)
+        np.testing.assert_allclose(np.linalg.norm(vertices, axis=1), 1.0, rtol=1e-6)
+
+        # Every triangle faces outwards
+        a, b, c = (vertices[triangles[:, k]] for k in range(3))
+        normals = np.cross(b - a, c - a)
+        self.assertTrue(np.all(np.einsum('ij,ij->i', normals, a + b + c) > 0))
+
+    def test_gradient_map(self):
+        image = geometry.get_gradient_map([1.0, 0.0, 0.0], [0.0, 0.0, 1.0], 64, 32)
+        self.assertEqual(image.shape, (32, 64, 4))
+        self.assertEqual(image.dtype, np.uint8)
+        self.assertTrue(np.all(image[..., 3] == 255))
+        # Longitude 0 on the equator faces +x, longitude -pi faces -x
+        np.testing.assert_allclose(image[16, 32, :3], [0, 0, 255], atol=2)
+        np.testing.assert_allclose(image[16, 0, :3], [255, 0, 0], atol=2)
+
+
+class TestLOD(unittest.TestCase):
+
+    def test_projected_radius(self):
+        projection = geometry.get_projection_matrix(np.radians(90), 1.0, 0.1, 100.0)
+        # tan(45) = 1, so a sphere seen under 45 degrees fills half the 800 px viewport
+        distance = np.sqrt(2.0)
+        pixels = lod.projected_radii([[0.0, 0.0, -distance]], [1.0], np.zeros(3), projection, 800)
+        np.testing.assert_allclose(pixels, [400.0])
+
+    def test_hysteresis(self):
+        selector = lod.LODSelector(lods=[(4, 8), (8, 16), (16, 32)], tolerance=0.5, hysteresis=0.25)
+        projection = geometry.get_projection_matrix(np.radians(45), 1.0, 0.1, 1000.0)
+
+        def select(distance):
+            return int(selector.select([[0.0, 0.0, -distance]], [1.0], np.zeros(3), projection, 800)[0])
+
+        far, near = select(500.0), select(5.0)
+        self.assertEqual(far, 0)
+        self.assertEqual(near, 2)
+
+        # Backing off a little keeps the finer mesh, backing off a lot drops it
+        threshold = next(d for d in np.arange(5.0, 500.0, 0.5) if selector.level_for(
+            lod.projected_radii([[0, 0, -d]], [1.0], np.zeros(3), projection, 800))[0] < 2)
+        self.assertEqual(select(threshold * 1.1), 2)
+        self.assertLess(select(threshold * 2.0), 2)
+
+    def test_impostor_switch(self):
+        selector = lod.LODSelector(impostor_pixels=6.0, hysteresis=0.25)
+        selector.select([[0.0, 0.0, 0.0]], [1.0], np.array([0.0, 0.0, 1000.0]), np.identity(4), 800)
+        self.assertTrue(selector.impostors[0])
+
+        # 7 px: still an impostor thanks to the margin, 8 px: a mesh again
+        for pixels, impostor in [(7.0, True), (8.0, False), (6.5, False), (5.5, True)]:
+            selector.select([[0.0, 0.0, 0.0]], [1.0], np.array([0.0, 0.0, 400.0 / pixels]), np.identity(4), 800)
+            self.assertEqual(bool(selector.impostors[0]), impostor, pixels)
+
+class TestCulling(unittest.TestCase):
+
+    def setUp(self):
+        # Camera at z = 10 looking at the origin
+        self.view = geometry.get_look_at_matrix(np.array([0.0, 0.0, 10.0]), np.zeros(3), np.array([0.0, 1.0, 0.0]))
+        self.projection = geometry.get_projection_matrix(np.radians(90), 1.0, 0.1, 100.0)
+
+    def test_frustum_planes(self):
+        planes = culling.frustum_planes(self.projection @ self.view)
+        # Every plane keeps the point straight ahead inside
+        self.assertTrue(np.all(planes[:, :3] @ [0.0, 0.0, 0.0] + planes[:, 3] > 0))
+        # The near plane sits 0.1 in front of the eye
+        np.testing.assert_allclose(planes[4], [0.0, 0.0, -1.0, 9.9], atol=1e-5)
+
+    def test_sphere_visibility(self):
+        centers = [[0.0, 0.0, 0.0],     # ahead
+                   [0.0, 0.0, 20.0],    # behind the camera
+                   [30.0, 0.0, 0.0],    # far to the right
+                   [11.5, 0.0, 0.0],    # just outside the right plane, radius reaches in
+                   [0.0, 0.0, -200.0]]  # beyond the far plane
+        radii = [1.0, 1.0, 1.0, 2.0, 1.0]
+        visible = culling.visible_spheres(centers, radii, self.view, self.projection, 800, min_pixels=0.0)
+        np.testing.assert_array_equal(visible, [True, False, False, True, False])
+
+    def test_small_features(self):
+        centers = [[0.0, 0.0, 0.0], [0.0, 0.0, -80.0]]
+        visible = culling.visible_spheres(centers, [1.0, 0.01], self.view, self.projection, 800)
+        np.testing.assert_array_equal(visible, [True, False])
+
+class TestOrbits(unittest.TestCase):
+
+    def setUp(self):
+        self.ephemeris = Ephemeris()
+        self.ephemeris.add_body("Sun")
+        self.ephemeris.add_body("Comet", 10.0, 0.5, parent=0, eccentricity=0.5, inclination=0.3)
+        self.ephemeris.add_body("Moon", 1.5, 3.0, parent=1)
+        self.ephemeris.add_body("Rogue", 4.0, 1.0)
+
+    def test_static_orbits(self):
+        # The Sun has no path and the Moon follows a moving parent
+        np.testing.assert_array_equal(orbits.static_orbits(self.ephemeris), [1, 3])
+        np.testing.assert_array_equal(orbits.static_orbits(self.ephemeris, count=3), [1])
+
+    def test_path_vertices(self):
+        colors = [[1.0, 0.0, 0.0, 0.5], [0.0, 1.0, 0.0, 1.0]]
+        vertices = orbits.orbit_path_vertices(self.ephemeris, np.array([1, 3]), colors, segments=16)
+        self.assertEqual(vertices.shape, (2 * 17, orbits.VERTEX_FLOATS))
+        np.testing.assert_allclose(vertices[:17, 3:], np.tile(colors[0], (17, 1)))
+
+        # Closed paths starting at periapsis, matching the ephemeris positions
+        comet = vertices[:17, :3]
+        np.testing.assert_allclose(comet[0], comet[-1], atol=1e-5)
+        np.testing.assert_allclose(comet[0], 5.0 * self.ephemeris.P[1], atol=1e-5)
+        self.ephemeris.update(0.0)
+        np.testing.assert_allclose(comet[0], self.ephemeris.positions[1], atol=1e-5)
+        self.assertAlmostEqual(np.linalg.norm(vertices[17, :3]), 4.0, places=5)
+
+    def test_element_version(self):
+        version = self.ephemeris.version
+        self.ephemeris.set_elements([3], inclination=0.5, eccentricity=0.1)
+        self.assertGreater(self.ephemeris.version, version)
+        P, Q = perifocal_basis(np.array([0.5]), np.zeros(1), np.zeros(1))
+        np.testing.assert_allclose(self.ephemeris.P[3], P[0])
+        with self.assertRaises(ValueError):
+            self.ephemeris.set_elements([3], eccentricity=1.5)
+        with self.assertRaises(ValueError):
+            self.ephemeris.set_elements([3], radius=2.0)
+
+        # Catalog rows past the orbit bodies do not change their paths
+        version = self.ephemeris.version
+        self.ephemeris.add_bodies(["Rock"], 7.0, 0.1, parent=0)
+        self.assertGreater(self.ephemeris.version, version)
+        np.testing.assert_array_equal(orbits.static_orbits(self.ephemeris, count=4), [1, 3])
+
+class TestShaderProgram(unittest.TestCase):
+
+    def test_skips_unchanged_values(self):
+        # Locations as introspected at link time, no GL context needed
+        program = ShaderProgram(1, {"model": 0, "time": 1}, {"position": 0})
+
+        self.assertTrue(program.changed("time", 1.0))
+        self.assertFalse(program.changed("time", 1.0))
+        self.assertTrue(program.changed("time", 2.0))
+
+        matrix = np.identity(4)
+        self.assertTrue(program.changed("model", matrix))
+        matrix[0, 3] = 5.0      # edited in place after being set
+        self.assertTrue(program.changed("model", matrix))
+        self.assertFalse(program.changed("model", matrix.copy()))
+
+        # Uniforms the linker dropped are never uploaded
+        self.assertFalse(program.changed("missing", 1.0))
+        self.assertEqual(program.attribute("position"), 0)
+        self.assertEqual(program.attribute("normal"), -1)
+
+    def test_camera_block_layout(self):
+        # std140: three mat4 of 64 bytes, a vec4 and a float padded to 16 bytes
+        self.assertEqual(CAMERA_BLOCK.itemsize, 224)
+        self.assertEqual(CAMERA_BLOCK.fields['camera_position'][1], 192)
+        self.assertEqual(CAMERA_BLOCK.fields['time'][1], 208)
+
+        eye = np.array([1.0, 2.0, 10.0])
+        view = geometry.get_look_at_matrix(eye, np.zeros(3), np.array([0.0, 1.0, 0.0]))
+        projection = geometry.get_projection_matrix(np.radians(45), 1.5, 0.1, 100.0)
+        block = pack_camera(view, projection, 42.0)
+
+        # Column-major storage: the first 4 floats are the first column
+        floats = np.frombuffer(block.tobytes(), dtype=np.float32)
+        np.testing.assert_allclose(floats[:4], view[:, 0], rtol=1e-6)
+        np.testing.assert_allclose(block['view_projection'].T, projection @ view, rtol=1e-5, atol=1e-6)
+        np.testing.assert_allclose(floats[48:52], [1.0, 2.0, 10.0, 1.0], rtol=1e-5)
+        self.assertEqual(floats[52], 42.0)
+
+class TestGLState(unittest.TestCase):
+
+    def test_redundant_calls_are_skipped(self):
+        # Seed the shadow state instead of binding, no GL context needed
+        state = GLState()
+        state.program = 3
+        state.vertex_array = 7
+        state.textures[(0, 0x0DE1)] = 11
+        state.depth_write = True
+
+        state.use_program(3)
+        state.bind_vertex_array(7)
+        state.bind_texture(0, 0x0DE1, 11)
+        state.depth_mask(True)
+        self.assertEqual(state.end_frame(), (0, 4))
+        self.assertEqual(state.end_frame(), (0, 0))
+
+        # Nothing is known after an invalidate, the next calls go through
+        state.invalidate()
+        self.assertIsNone(state.program)
+        self.assertEqual(state.textures, {})
+
+class TestEphemeris(unittest.TestCase):
+    def test_matches_planet_update(self):
+        earth = Planet("Earth", orbit_radius=35.0, orbit_speed=0.8, spin_speed=1.8)
+        moon = Planet("Moon", orbit_radius=2.1, orbit_speed=2.0, parent=earth)
+
+        ephemeris = Ephemeris()
+        ephemeris.add_body("Earth", 35.0, 0.8, spin_speed=1.8)
+        ephemeris.add_body("Moon", 2.1, 2.0, parent=0)
+
+        for t in [0.0, 1.5, 42.0]:
+            earth.update(t)
+            moon.update(t)
+            ephemeris.update(t)
+            np.testing.assert_allclose(ephemeris.positions, [earth.position, moon.position], atol=1e-9)
+            np.testing.assert_allclose(ephemeris.velocities, [earth.velocity, moon.velocity], atol=1e-9)
+            np.testing.assert_allclose(ephemeris.spin_angles[0], earth.spin_angle)
+
+        earth.attach(ephemeris, 0)
+        self.assertTrue(np.shares_memory(earth.get_model_matrix(), ephemeris.model_matrices))
+
+    def test_parent_after_child(self):
+        earth = Planet("Earth", orbit_radius=35.0, orbit_speed=0.8)
+        moon = Planet("Moon", orbit_radius=2.1, orbit_speed=2.0, parent=earth)
+
+        ephemeris = Ephemeris.from_planets([moon, earth])
+        ephemeris.update(3.0)
+
+        expected = earth.position + [2.1 * np.cos(6.0), 0.0, 2.1 * np.sin(6.0)]
+        np.testing.assert_allclose(moon.position, expected, atol=1e-9)
+
+    def test_kepler_solver(self):
+        M = np.linspace(-10, 10, 1001)
+        for e in [0.0, 0.2, 0.7, 0.97]:
+            E = solve_kepler(M, np.full_like(M, e))
+            residual = np.remainder(E - e * np.sin(E) - M + np.pi, 2 * np.pi) - np.pi
+            np.testing.assert_allclose(residual, 0.0, atol=1e-10)
+
+    def test_elliptical_orbit(self):
+        ephemeris = Ephemeris()
+        ephemeris.add_body("Comet", 10.0, mean_motion=1.0, eccentricity=0.5, inclination=np.radians(30))
+
+        # Periapsis at time 0, apoapsis half an orbit later
+        ephemeris.update(0.0)
+        np.testing.assert_allclose(ephemeris.positions[0], [5.0, 0.0, 0.0], atol=1e-9)
+        ephemeris.update(np.pi)
+        np.testing.assert_allclose(np.linalg.norm(ephemeris.positions[0]), 15.0)
+
+        # Off the line of nodes the body sits on the inclined plane
+        ephemeris.update(np.pi / 2)
+        x, y, z = ephemeris.positions[0]
+        self.assertAlmostEqual(-y / z, np.tan(np.radians(30)))
+
+    def test_velocities_and_accelerations(self):
+        ephemeris = Ephemeris()
+        ephemeris.add_body("Comet", 10.0, mean_motion=0.5, eccentricity=0.6, inclination=0.4, argument_periapsis=1.0)
+        ephemeris.add_body("Moon", 1.5, mean_motion=3.0, eccentricity=0.1, parent=0)
+
+        h = 1e-4
+        for t in [0.0, 0.7, 5.0]:
+            ahead, behind = ephemeris.positions_at([t + h]), ephemeris.positions_at([t - h])
+            ephemeris.update(t)
+            np.testing.assert_allclose(ephemeris.velocities, ((ahead - behind) / (2 * h))[0], atol=1e-6)
+
+            velocities_ahead = ephemeris.states_at([t + h])[1]
+            velocities_behind = ephemeris.states_at([t - h])[1]
+            np.testing.assert_allclose(ephemeris.accelerations(),
+                                       ((velocities_ahead - velocities_behind) / (2 * h))[0], atol=1e-5)
+
+    def test_velocity_vector_when_paused(self):
+        earth = Planet("Earth", orbit_radius=35.0, orbit_speed=0.8)
+        Ephemeris.from_planets([earth])
+        earth.ephemeris.update(1.0)
+        earth.ephemeris.update(1.0)
+        np.testing.assert_allclose(earth.get_velocity_vector(), [-np.sin(0.8), 0.0, np.cos(0.8)], atol=1e-12)
+
+    def test_parent_cycle(self):
+        ephemeris = Ephemeris()
+        ephemeris.add_bodies(["A", "B"], 1.0, parent=[1, 0])
+        with self.assertRaises(ValueError):
+            ephemeris.update(0.0)
+
+
+class TestSceneGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.planets = scene.create_planets()
+        self.ephemeris = Ephemeris.from_planets(self.planets)
+        self.ephemeris.update(2.0)
+        self.graph = SceneGraph.from_ephemeris(self.ephemeris, {7: 1.4})
+
+    def test_matches_ephemeris(self):
+        graph = self.graph
+        np.testing.assert_allclose(graph.world_positions[graph.body_nodes], self.ephemeris.positions)
+        np.testing.assert_allclose(graph.world_positions[graph.anchor_nodes], self.ephemeris.positions)
+        np.testing.assert_allclose(graph.model_matrices[graph.body_nodes], self.ephemeris.model_matrices)
+
+        saturn = self.planets[7]
+        np.testing.assert_allclose(graph.model_matrix(graph.ring_nodes[7]), saturn.get_ring_model_matrix(1.4),
+                                   rtol=1e-6, atol=1e-5)
+
+    def test_only_dirty_subtrees_update(self):
+        graph = self.graph
+        self.assertEqual(graph.update(), 0)
+
+        # Moving Earth refreshes Earth, the Moon and both anchors
+        earth = graph.body_nodes[1]
+        graph.set_translation([earth], [[1.0, 2.0, 3.0]])
+        self.assertEqual(graph.update(), 4)
+        np.testing.assert_allclose(graph.world_positions[graph.anchor_nodes[2]],
+                                   [1.0, 2.0, 3.0] + self.ephemeris.local_positions[2])
+
+        # Spinning only touches the node itself
+        graph.set_spin([earth], 1.0)
+        self.assertEqual(graph.update(), 1)
+
+    def test_nested_dirty_nodes(self):
+        # Moving Earth and the Moon together refreshes each node once
+        graph = self.graph
+        earth, moon = graph.body_nodes[1], graph.body_nodes[2]
+        graph.set_translation([earth, moon], [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+        self.assertEqual(graph.update(), 4)
+        np.testing.assert_allclose(graph.world_positions[graph.anchor_nodes[2]], [1.0, 1.0, 0.0])
+        np.testing.assert_array_equal(graph.subtrees([moon, earth]),
+                                      [earth, moon, graph.anchor_nodes[1], graph.anchor_nodes[2]])
+
+        # Syncing to the same time again moves nothing
+        graph.sync(self.ephemeris)
+        self.assertEqual(graph.sync(self.ephemeris), 0)
+
+class TestBodyRegistry(unittest.TestCase):
+
+    def test_lookups(self):
+        registry = BodyRegistry.from_planets(scene.create_planets())
+
+        self.assertEqual(registry.by_name("Moon").parent.name, "Earth")
+        self.assertEqual(registry.by_id(7).name, "Saturn")
+        self.assertIsNone(registry.by_name("Pluto"))
+        self.assertEqual(registry[0].kind, STAR)
+        np.testing.assert_array_equal(registry.of_kind(MOON), [2])
+        np.testing.assert_array_equal(registry.children(1), [2])
+        self.assertEqual(len(registry.children(2)), 0)
+        self.assertEqual(len(registry.of_kind(STAR, PLANET)), 9)
+
+    def test_long_unicode_name(self):
+        registry = BodyRegistry()
+        name = "(1234) Ünïcödé-Ästéröïd-Nämé"
+        registry.add_bodies([name], MINOR)
+        # Cut on a character boundary, never inside one
+        stored = registry[0].name
+        self.assertLessEqual(len(stored.encode("utf-8")), NAME_LENGTH)
+        self.assertTrue(name.startswith(stored))
+        self.assertEqual(registry.names[0].decode(), stored)
+        self.assertEqual(registry.index_of_name(name), 0)
+
+        # The vectorized encoder cuts the same way, also for 4 byte characters
+        names = [name, "", "a" * 23 + "é", "a" * 22 + "é", "🚀" * 7]
+        self.assertEqual(encode_names(names).tolist(), [encode_name(n) for n in names])
+
+    def test_ray_picks_nearest(self):
+        centers = np.array([[0.0, 0.0, 10.0], [0.0, 0.0, 5.0], [0.0, 0.0, -5.0], [3.0, 0.0, 5.0]])
+        distances = geometry.ray_sphere_distances(np.zeros(3), np.array([0.0, 0.0, 1.0]), centers, [1.0, 1.0, 1.0, 1.0])
+        np.testing.assert_allclose(distances, [9.0, 4.0, np.inf, np.inf])
+
+class TestCatalog(unittest.TestCase):
+
+    @staticmethod
+    def mpc_line(designation, a, e, i, node, peri, M, n, name=""):
+        line = "{:<7s}  3.34  0.15 K2555 {:9.5f}  {:9.5f}  {:9.5f}  {:9.5f}  {:9.7f} {:11.8f} {:11.7f}".format(
+            designation, M, peri, node, i, e, n, a)
+        return line.ljust(166) + name.ljust(28) + "20241101"
+
+    def test_mpcorb(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        path = os.path.join(folder.name, "MPCORB.DAT")
+        with open(path, "w") as file:
+            file.write("MINOR PLANET CENTER ORBIT DATABASE\n" + "-" * 160 + "\n")
+            file.write(self.mpc_line("00001", 2.7660512, 0.0794013, 10.5878, 80.25221, 73.27343, 188.70269,
+                                     0.21424651, "(1) Ceres") + "\n")
+            file.write("\n" + self.mpc_line("K24A00A", 2.5, 0.2, 3.0, 60.0, 50.0, 45.0, 0.25) + "\n")
+
+        rows = catalog.load(path)
+        self.assertEqual(rows['name'].tolist(), [b"(1) Ceres", b"K24A00A"])
+        self.assertEqual(rows['id'][0], 1)
+        self.assertGreaterEqual(rows['id'][1], catalog.UNNUMBERED_ID)
+        np.testing.assert_allclose(rows['semi_major_axis'], [2.7660512, 2.5])
+        np.testing.assert_allclose(rows['inclination'], np.radians([10.5878, 3.0]))
+        np.testing.assert_allclose(rows['epoch'], 2460800.5)  # 2025-05-05
+
+        # The second load comes from the sidecar
+        self.assertTrue(os.path.exists(path + ".npy"))
+        np.testing.assert_array_equal(catalog.load(path), rows)
+
+    def test_csv_populates_registry(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        path = os.path.join(folder.name, "comets.csv")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("name,a,e,i,node,peri,M,id\n")
+            file.write("Vesta,2.36,0.09,7.1,103.8,151.2,26.8,4\n")
+            file.write("Hyperbolic,-1.0,1.2,40,0,0,0,99\n")
+            file.write("Unparsable,nan,0.2,4,0,0,0,98\n")
+            file.write("(1234) Ünïcödé-Ästéröïd-Nämé,3.0,0.1,5.0,0,0,0,5\n")
+
+        planets = scene.create_planets()
+        ephemeris = Ephemeris.from_planets(planets)
+        registry = BodyRegistry.from_planets(planets)
+        rows = catalog.populate(catalog.load(path), ephemeris, registry)
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(len(ephemeris), len(registry))
+        self.assertEqual(registry.by_id(4).name, "Vesta")
+        self.assertTrue("(1234) Ünïcödé-Ästéröïd-Nämé".startswith(registry.by_id(5).name))
+        self.assertAlmostEqual(ephemeris.semi_major_axis[rows[0]], 2.36 * catalog.UNITS_PER_AU)
+
+class TestChebyshev(unittest.TestCase):
+
+    def test_cache_matches_ephemeris(self):
+        ephemeris = Ephemeris.from_planets(scene.create_planets())
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        path = os.path.join(folder.name, "ephemeris.bin")
+        chebyshev.build_cache(ephemeris, path, 0.0, 600.0)
+
+        cache = chebyshev.load_cache(path, ephemeris)
+        self.assertIsNotNone(cache)
+        for time in [0.0, 1.234, 299.9, 600.0]:
+            expected = ephemeris.positions_at(np.array([time]))[0]
+            np.testing.assert_allclose(cache.positions(time), expected, atol=1e-8)
+
+            ephemeris.update(time)
+            _, velocities = cache.local_states(time)
+            np.testing.assert_allclose(velocities, ephemeris.local_velocities, atol=1e-7)
+
+        # Changed elements invalidate the file
+        ephemeris.mean_motion[1] *= 2
+        self.assertIsNone(chebyshev.load_cache(path, ephemeris))
+
+    def test_empty_span(self):
+        ephemeris = Ephemeris.from_planets(scene.create_planets())
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "ephemeris.bin")
+            for end in (600.0, 0.0):
+                with self.assertRaises(ValueError):
+                    chebyshev.build_cache(ephemeris, path, 600.0, end)
+            self.assertFalse(os.path.exists(path))
+
+class TestParallel(unittest.TestCase):
+
+    def test_matches_serial(self):
+        ephemeris = Ephemeris.from_planets(scene.create_planets())
+        times = np.linspace(0.0, 1000.0, 103)
+
+        positions = parallel.generate_positions(ephemeris, times, processes=2, chunk_size=16)
+        np.testing.assert_array_equal(positions, ephemeris.positions_at(times))
+
+        out = np.empty_like(positions)
+        result = parallel.generate_positions(ephemeris, times, processes=2, chunk_size=16, out=out)
+        self.assertIs(result, out)
+        np.testing.assert_array_equal(out, positions)
+
+class TestHeadless(unittest.TestCase):
+
+    def test_chunks_cover_range(self):
+        ephemeris = Ephemeris.from_planets(scene.create_planets())
+        chunks = list(headless.trajectory_chunks(ephemeris, 0.0, 10.0, 0.5, chunk_size=8))
+
+        self.assertEqual([len(times) for times, _, _ in chunks], [8, 8, 5])
+        times = np.concatenate([times for times, _, _ in chunks])
+        np.testing.assert_allclose(times, np.arange(21) * 0.5)
+
+        # Earth on a circular orbit: speed is radius * angular speed
+        _, _, velocities = chunks[0]
+        np.testing.assert_allclose(np.linalg.norm(velocities[:, 1], axis=1), 35.0 * 0.8, rtol=1e-5)
+
+    def test_csv_round_trip(self):
+        ephemeris = Ephemeris.from_planets(scene.create_planets())
+        chunk = next(headless.trajectory_chunks(ephemeris, 0.0, 3.0, 0.7))
+        output = io.StringIO()
+        headless.write_csv(output, ephemeris.names, chunk)
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 5 * len(ephemeris))
+        self.assertEqual(lines[len(ephemeris) + 1].split(",")[0], ephemeris.names[1])
+        values = np.array([line.split(",")[1:] for line in lines], dtype=float)
+        records = headless.to_records(*chunk)
+        np.testing.assert_array_equal(values[:, 0], records['time'])
+        np.testing.assert_array_equal(values[:, 1:4], records['position'])
+        np.testing.assert_array_equal(values[:, 4:], records['velocity'])
+
+class TestTrajectory(unittest.TestCase):
+
+    def setUp(self):
+        self.ephemeris = Ephemeris.from_planets(scene.create_planets())
+        self.times = np.arange(0.0, 50.0, 0.5)
+        self.positions = self.ephemeris.positions_at(self.times)
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.path = os.path.join(folder.name, "test.traj")
+
+        with trajectory.TrajectoryWriter(self.path, self.ephemeris.names, chunk_size=16, dtype=np.float64) as writer:
+            # Blocks that do not line up with chunks
+            for start in range(0, len(self.times), 7):
+                writer.write(self.times[start:start + 7], self.positions[start:start + 7])
+
+    def test_read_slices(self):
+        store = trajectory.TrajectoryStore(self.path)
+        self.assertEqual(store.names, self.ephemeris.names)
+        np.testing.assert_array_equal(store.times, self.times)
+        np.testing.assert_array_equal(store.read(), self.positions)
+        np.testing.assert_array_equal(store.read([1, 2], 3.0, 30.0), self.positions[6:61, [1, 2]])
+
+        # Inside one chunk the slice is a view into the file
+        self.assertTrue(np.shares_memory(store.read(slice(0, 3), 0.0, 5.0), store.chunks))
+
+    def test_playback(self):
+        playback = trajectory.load_playback(self.path, self.ephemeris)
+        self.ephemeris.playback = playback
+        self.ephemeris.update(10.0)
+        np.testing.assert_allclose(self.ephemeris.positions, self.positions[20])
+        np.testing.assert_allclose(self.ephemeris.local_positions[2], self.positions[20, 2] - self.positions[20, 1])
+
+class TestAsteroidBelt(unittest.TestCase):
+
+    def test_phase_at_high_warp(self):
+        # float32 angles from the shader inputs must match the exact orbit
+        belt = AsteroidBelt("Belt", 1000, 10.0, 20.0, 0.01, seed=3)
+        time = 1e9 + 0.5
+        belt.update(time)
+        self.assertTrue(belt.dirty)
+
+        orbit = belt.instances
+        angle = orbit[:, 1] + belt.offsets + orbit[:, 2] * np.float32(belt.time - belt.epoch)
+        exact = orbit[:, 1] + belt.speeds * time
+        error = np.angle(np.exp(1j * (angle - exact)))
+        self.assertLess(np.abs(error).max(), 1e-3)
+
+    def test_rebase_rate(self):
+        # At high warp the epoch moves at most every REBASE_FRAMES updates
+        belt = AsteroidBelt("Belt", 1000, 10.0, 20.0, 0.01, seed=3)
+        rebases = 0
+        for frame in range(1, 61):
+            belt.dirty = False
+            belt.update(frame * 5e5)
+            rebases += belt.dirty
+            angle = belt.speeds.max() * (belt.time - belt.epoch)
+            self.assertLessEqual(angle, 64 * MAX_SHADER_ANGLE)
+        self.assertEqual(rebases, 60 // REBASE_FRAMES)
+
+class TestNBody(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.positions = rng.normal(size=(600, 3))
+        self.masses = rng.uniform(0.5, 1.5, 600)
+        self.reference = brute_force_accelerations(self.positions, self.masses, softening=0.01)
+
+    def test_tree_without_approximation(self):
+        result = barnes_hut_accelerations(self.positions, self.masses, theta=0.0, softening=0.01)
+        np.testing.assert_allclose(result, self.reference, rtol=1e-9, atol=1e-12)
+
+    def test_tree_accuracy(self):
+        result = barnes_hut_accelerations(self.positions, self.masses, theta=0.5, softening=0.01)
+        error = np.linalg.norm(result - self.reference, axis=1) / np.linalg.norm(self.reference, axis=1)
+        self.assertLess(np.median(error), 1e-2)
+
+    def test_tree_refit(self):
+        tree = Octree(self.positions, self.masses)
+        moved = self.positions + 0.01
+        tree.refit(moved)
+        reference = brute_force_accelerations(moved, self.masses, softening=0.01)
+        np.testing.assert_allclose(tree.accelerations(theta=0.0, softening=0.01), reference, rtol=1e-9, atol=1e-12)
+
+    def test_tree_steps_match_direct_sum(self):
+        # Tree reused across sub-steps and kicks reused between steps change nothing without approximation
+        systems = [ParticleSystem("Swarm", self.positions[:200] * 10, np.zeros((200, 3)), self.masses[:200] * 1e-3,
+                                  central_mass=1.0, theta=0.0, tree_threshold=threshold)
+                   for threshold in (0, 10_000)]
+        for system in systems:
+            for _ in range(2):
+                system.step(0.5)
+        self.assertTrue(np.any(systems[0].rungs > 0))
+        np.testing.assert_allclose(systems[0].positions, systems[1].positions, rtol=1e-9)
+
+    def test_interaction_list_growth(self):
+        # Without approximation every group sees every body
+        tree = Octree(self.positions, self.masses)
+        offsets, sources = tree.interaction_lists(0.0)
+        self.assertEqual(len(sources), len(self.positions) * len(tree.group_start))
+
+        # With it the lists grow like log N, a direct sum would grow 8 times
+        rng = np.random.default_rng(3)
+        lengths = []
+        for count in (2000, 16000):
+            tree = Octree(rng.normal(size=(count, 3)), np.ones(count))
+            offsets, sources = tree.interaction_lists(0.5)
+            lengths.append(len(sources) / len(tree.group_start))
+        self.assertLess(lengths[1], 16000 / 4)
+        self.assertLess(lengths[1] / lengths[0], 3.0)
+
+    def test_leapfrog_circular_orbit(self):
+        system = ParticleSystem("Probe", [[10.0, 0.0, 0.0]], [[0.0, 0.0, 1.0]], [0.0],
+                                central_mass=10.0, softening=0.0, max_step=0.05)
+        for _ in range(1257):
+            system.step(0.05)
+        # The orbit stays circular over a full revolution
+        np.testing.assert_allclose(np.linalg.norm(system.positions[0]), 10.0, rtol=1e-3)
+
+    def test_multirate_substeps(self):
+        # Fast eccentric inner body and slow outer body around a central mass
+        system = ParticleSystem("Planets", [[1.0, 0.0, 0.0], [30.0, 0.0, 0.0]],
+                                [[0.0, 0.0, 1.1], [0.0, 0.0, np.sqrt(1 / 30)]], [1e-6, 1e-6],
+                                central_mass=1.0, softening=0.0)
+        start = system.energy()
+        for _ in range(300):
+            system.step(1.0)
+
+        self.assertGreater(system.rungs[0], system.rungs[1])
+        self.assertEqual(system.rungs[1], 0)
+        self.assertLess(abs(system.energy() - start) / abs(start), 1e-2)
+
+    def test_update_carries_remainder(self):
+        def probe():
+            return ParticleSystem("Probe", [[10.0, 0.0, 0.0]], [[0.0, 0.0, 1.0]], [0.0],
+                                  central_mass=10.0, softening=0.0, max_step=0.01)
+
+        system = probe()
+        system.max_update_seconds = np.inf
+        system.update(0.0)
+        system.update(1.0)      # 100 steps needed, 8 allowed
+        self.assertAlmostEqual(system.time, 0.08)
+
+        reference = probe()
+        for _ in range(8):
+            reference.step(0.01)
+        np.testing.assert_allclose(system.positions, reference.positions)
+
+        # Later updates catch up with the clock
+        for _ in range(20):
+            system.update(1.0)
+        self.assertEqual(system.time, 1.0)
+
+        # A spent frame budget still moves one step
+        system = probe()
+        system.update(0.0)
+        system.update(1.0, deadline=0.0)
+        self.assertAlmostEqual(system.time, 0.01)
+
+    def test_backward_steps(self):
+        velocities, accelerations = [[0.0, 0.0, 1.0]], [[-0.1, 0.0, 0.0]]
+        np.testing.assert_array_equal(assign_rungs(velocities, accelerations, -0.5),
+                                      assign_rungs(velocities, accelerations, 0.5))
+
+        # Running the clock backwards still follows the orbit
+        system = ParticleSystem("Probe", [[10.0, 0.0, 0.0]], [[0.0, 0.0, 1.0]], [0.0],
+                                central_mass=10.0, softening=0.0, max_step=0.05)
+        system.max_steps_per_update = 1000
+        system.max_update_seconds = np.inf
+        system.update(0.0)
+        system.update(-20.0)
+        self.assertEqual(system.time, -20.0)
+        np.testing.assert_allclose(np.linalg.norm(system.positions[0]), 10.0, rtol=1e-3)
+        self.assertLess(system.positions[0, 2], 0.0)
+
+
+class TestSimulationClock(unittest.TestCase):
+    def test_fixed_ticks(self):
+        clock = SimulationClock(epoch=0.0, tick=0.25)
+        self.assertEqual(clock.advance(0.625), 2)
+        self.assertEqual(clock.time, 0.5)
+        self.assertEqual(clock.advance(0.125), 1)
+        self.assertEqual(clock.time, 0.75)
+
+    def test_warp_substeps(self):
+        clock = SimulationClock(epoch=0.0, tick=0.1, max_step=1.0)
+        times = []
+        clock.listeners.append(times.append)
+        clock.set_warp(100)
+        clock.advance(0.1)
+        self.assertEqual(len(times), 10)
+        self.assertAlmostEqual(clock.time, 10.0)
+
+    def test_pause_and_single_step(self):
+        clock = SimulationClock(epoch=0.0, tick=0.1)
+        clock.toggle_pause()
+        self.assertEqual(clock.advance(1.0), 0)
+        self.assertEqual(clock.time, 0.0)
+        clock.step()
+        self.assertAlmostEqual(clock.time, 0.1)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,10 +1,57 @@
+import os
+import numpy as np
 import pygame
 from OpenGL.GL import *
+from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QImage
 
 def load_shader_source(path):
+    """Read a shader, replacing #include "file" lines with that file (relative to the shader)."""
     with open(path, 'r') as file:
-        return file.read()
+        lines = file.read().split("\n")
+
+    for i, line in enumerate(lines):
+        if line.strip().startswith("#include"):
+            name = line.split('"')[1]
+            lines[i] = load_shader_source(os.path.join(os.path.dirname(path), name))
+
+    return "\n".join(lines)
+
+def load_image_qt(path, width=None, height=None):
+    """
+    RGBA8 pixels of an image as a (height, width, 4) array, bottom row first
+    like OpenGL. The image is resampled when a size is given.
+    """
+    image = QImage(path)
+
+    if image.isNull():
+        raise RuntimeError(f"Failed to load texture: {path}")
+
+    if width is not None:
+        image = image.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+
+    image = image.convertToFormat(QImage.Format_RGBA8888).mirrored()
+
+    ptr = image.bits()
+    ptr.setsize(image.byteCount())
+    return np.frombuffer(ptr.asstring(), dtype=np.uint8).reshape(image.height(), image.width(), 4)
+
+def create_texture_array(layers):
+    """GL_TEXTURE_2D_ARRAY from equally sized images as returned by load_image_qt."""
+    layers = np.ascontiguousarray(np.stack(layers), dtype=np.uint8)
+    count, height, width, _ = layers.shape
+
+    tex_id = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D_ARRAY, tex_id)
+    glTexImage3D(GL_TEXTURE_2D_ARRAY, 0, GL_RGBA8, width, height, count, 0, GL_RGBA, GL_UNSIGNED_BYTE, layers)
+
+    glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_S, GL_REPEAT)
+    glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+
+    glBindTexture(GL_TEXTURE_2D_ARRAY, 0)
+    return tex_id
 
 def load_texture_qt(path):
     image = QImage(path)